@@ -7,141 +7,552 @@ import sys
 import time
 import heapq
 import argparse
-import csv
+import functools
+import queue
+import multiprocessing
 from datetime import datetime, timezone
-from dateutil.parser import parse as parse_date
+from timestamp_parser import parse_any, parser_for, parser_stats, record_ts_value, register_parser, reset_parsers
+from log_reader import DEFAULT_CHUNK_SIZE, iter_lines, stats_for, reader_stats, register_stats, reset_stats
 try:
     from html_report_generator import simple_html_report
 except ImportError:
     simple_html_report = None
 from bug_detector import BugDetector
-import fcntl  # For file locking on Unix-like systems
+from line_prefilter import LinePrefilter
+from time_index import TimeIndex
+from output_writer import BatchedWriter, DURABILITY_LEVELS
+from checkpoint_journal import CheckpointJournal
+from report_streams import DebugReportWriter, TimelineWriter, StreamedTimeline
+from replay_scheduler import ReplayScheduler
+from http_sink import HttpSink
+from log_follower import LogFollower, resume_offsets
+from external_sort import SORT_MODES, SortPlan
+from compressed_input import codec_for, set_index_dir
+from replay_metrics import GAUGE_EVERY, SamplingProfiler, metrics, reset_metrics
+from live_snapshot import LiveSnapshotWriter
+from log_cache import LogColumns, cache_stats, from_ns, register_cache_stats, reset_cache_stats, FLAG_BAD_JSON, FLAG_BAD_TS
 
 def parse_ts(ts):
     if not ts:
         return None
-    try:
-        # Handle both ISO format and other timestamp formats
-        return parse_date(ts).astimezone(timezone.utc)
-    except (ValueError, TypeError):
-        return None
+    # Handle ISO, epoch and anything else dateutil understands
+    return parse_any(ts)
 
-def load_checkpoint(path):
-    if os.path.exists(path):
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return {}
-    return {}
+_journals = {}
+
+def _journal(path, fsync_every=10, compact_every=1000):
+    j = _journals.get(path)
+    if j is None:
+        j = _journals[path] = CheckpointJournal(path, fsync_every, compact_every)
+    return j
+
+def load_checkpoint(path, fsync_every=10, compact_every=1000):
+    # snapshot (the old replay.checkpoint.json format) + journal records on top
+    try:
+        return _journal(path, fsync_every, compact_every).state
+    except (IOError, OSError) as e:
+        print(f"[ERROR] Failed to load checkpoint: {e}", file=sys.stderr)
+        return {}
 
 def save_checkpoint(path, data):
-    tmp = path + '.tmp'
     try:
-        with open(tmp, 'w', encoding='utf-8') as f:
-            # Acquire an exclusive lock to prevent concurrent writes
-            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-            json.dump(data, f, indent=2)
-            f.flush()
-            os.fsync(f.fileno())
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-        os.replace(tmp, path)
-    except IOError as e:
+        _journal(path).save(data)
+    except (IOError, OSError) as e:
         print(f"[ERROR] Failed to save checkpoint: {e}", file=sys.stderr)
 
-def file_iter(path, offset, errlog):
+def close_checkpoint(path):
+    j = _journals.pop(path, None)
+    if j is not None:
+        j.close()
+
+def _cached_records(path, offset, errlog, cache, window, filters):
+    """
+    Records from the column cache: filters run on the cached columns and only
+    the rows that pass are read back from the raw file. Returns the offset
+    where the cache stops, for the caller to read anything after it.
+    """
+    cache.update()
+    register_cache_stats(path, cache)
+    cols = cache.columns()
+    rows = cache.select(offset, window[0], window[1], *filters)
+    ends, flags, ts_ns, offsets = cols["end"], cols["flags"], cols["ts_ns"], cols["offset"]
+    last = None
+    with open(path, 'rb') as fh:
+        for i in rows:
+            pos, end = int(offsets[i]), int(ends[i])
+            line = cache.read_line(fh, pos, end)
+            last = end
+            if flags[i] & FLAG_BAD_JSON:
+                errlog.write(json.dumps({"file": path, "offset": pos, "err": "bad json"}) + "\n")
+                errlog.flush()
+                continue
+            rec = json.loads(line.decode('utf-8', 'replace'))
+            if flags[i] & FLAG_BAD_TS:
+                errlog.write(json.dumps({"file": path, "offset": pos, "err": "bad ts", "raw": rec}) + "\n")
+                errlog.flush()
+                continue
+            yield from_ns(ts_ns[i]), rec, end
+    if cache.covered > offset and last != cache.covered:
+        # rows after the last one kept were filtered out: consumed all the same
+        yield None, None, cache.covered
+    return max(offset, cache.covered)
+
+def file_iter(path, offset, errlog, chunk_size=DEFAULT_CHUNK_SIZE, use_mmap=False, prefilter=None,
+              index=None, window=(None, None), cache=None, filters=(None, None)):
+    ts_parser = parser_for(path)
+    stats = stats_for(path)
+    m = metrics()
+    # every `every`-th decoded line is timed (see replay_metrics)
+    every = m.sample_every
+    countdown = every or -1
+    decode_stage, parse_stage = m.stage('decode'), m.stage('parse_ts')
+    clock = time.perf_counter
+    if cache is not None:
+        try:
+            offset = yield from _cached_records(path, offset, errlog, cache, window, filters)
+        except (IOError, OSError) as e:
+            errlog.write(json.dumps({"file": path, "err": f"IO error: {str(e)}"}) + "\n")
+            errlog.flush()
+            return
+        index = None  # the cache already covers what the index would skip
+    segments = index.plan(offset, *window) if index is not None else [(offset, None)]
     try:
-        with open(path, 'r', encoding='utf-8', errors='replace') as f:
-            f.seek(offset)
-            while True:
-                pos = f.tell()
-                line = f.readline()
-                if not line:
-                    break
-                try:
-                    rec = json.loads(line)
-                except json.JSONDecodeError:
-                    errlog.write(json.dumps({"file": path, "offset": pos, "err": "bad json"}) + "\n")
-                    errlog.flush()
-                    continue
-                ts = parse_ts(rec.get("time") or rec.get("timestamp") or rec.get("@timestamp"))
-                if not ts:
-                    errlog.write(json.dumps({"file": path, "offset": pos, "err": "bad ts", "raw": rec}) + "\n")
-                    errlog.flush()
-                    continue
-                # Use byte length for accurate offset
-                yield ts, rec, pos + len(line.encode('utf-8'))
+        for seg_no, (seg_start, seg_stop) in enumerate(segments):
+            if seg_no:
+                # the skipped range lies after --end: consumed, as if read and filtered
+                yield None, None, seg_start
+            tracking = index is not None and index.begin(seg_start)
+            screen = prefilter
+            skipped_upto = None
+            try:
+                # Binary chunks: offsets are exact byte positions, even for invalid utf-8
+                for line, pos, end in iter_lines(path, seg_start, chunk_size, use_mmap, stats, seg_stop):
+                    if tracking and end - pos > len(line):
+                        index.advance(end)
+                    if screen is not None and not screen.admits(line):
+                        if tracking:
+                            # the index still sees every timestamp; the prefilter has usually read it already
+                            ts = screen.timestamp(line)
+                            if ts is None:
+                                try:
+                                    ts = ts_parser.parse(record_ts_value(json.loads(line.decode('utf-8', 'replace'))))
+                                except (json.JSONDecodeError, AttributeError):
+                                    ts = None
+                            if ts:
+                                index.observe(ts, pos)
+                        skipped_upto = end
+                        continue
+                    skipped_upto = None
+                    countdown -= 1
+                    timed = not countdown
+                    if timed:
+                        countdown = every
+                        t0 = clock()
+                    try:
+                        rec = json.loads(line.decode('utf-8', 'replace'))
+                    except json.JSONDecodeError:
+                        errlog.write(json.dumps({"file": path, "offset": pos, "err": "bad json"}) + "\n")
+                        errlog.flush()
+                        continue
+                    if timed:
+                        t1 = clock()
+                    ts = ts_parser.parse(record_ts_value(rec)) if isinstance(rec, dict) else None
+                    if timed:
+                        decode_stage.observe(t1 - t0, every)
+                        parse_stage.observe(clock() - t1, every)
+                    if not ts:
+                        errlog.write(json.dumps({"file": path, "offset": pos, "err": "bad ts", "raw": rec}) + "\n")
+                        errlog.flush()
+                        continue
+                    if tracking:
+                        index.observe(ts, pos)
+                    yield ts, rec, end
+            finally:
+                if tracking:
+                    index.save()
+            if skipped_upto is not None:
+                # trailing lines dropped by the prefilter still count as consumed
+                yield None, None, skipped_upto
     except IOError as e:
         errlog.write(json.dumps({"file": path, "err": f"IO error: {str(e)}"}) + "\n")
         errlog.flush()
+    finally:
+        if every:
+            # lines since the last timed one
+            decode_stage.count += every - countdown
+            parse_stage.count += every - countdown
 
-def merged_stream(pattern, checkpoint, errlog):
-    files = sorted(glob.glob(pattern))
-    if not files:
-        print("[WARNING] No files matched the pattern", file=sys.stderr)
-        return
-    iters = [file_iter(f, checkpoint.get(f, 0), errlog) for f in files]
+def _tagged(it, path):
+    for ts, rec, pos in it:
+        yield ts, rec, pos, path
+
+def _file_source(f, offset, errlog, chunk_size, use_mmap, prefilter, index, window, cache, filters, reorder):
+    it = file_iter(f, offset, errlog, chunk_size, use_mmap, prefilter, index, window, cache, filters)
+    return _tagged(reorder(it, offset) if reorder is not None else it, f)
+
+def _kway_merge(sources, rank):
+    """
+    Merge iterators of (ts, rec, pos, file), each already in time order.
+    Yields (ts, seq, rec, pos, file). Equal timestamps are ordered by the file's
+    `rank` and then by position in the file, so the result doesn't depend on how
+    files are grouped into sources.
+    Items with ts None only carry a consumed offset and are passed straight through.
+    """
     heap = []
     seq = 0
-    for i, it in enumerate(iters):
-        try:
-            ts, rec, pos = next(it)
+    for i, it in enumerate(sources):
+        for ts, rec, pos, f in it:
+            if ts is None:
+                yield None, 0, None, pos, f
+                continue
             seq += 1
-            heapq.heappush(heap, (ts, seq, i, rec, pos, files[i]))
-        except StopIteration:
-            pass
+            heapq.heappush(heap, (ts, rank[f], seq, i, rec, pos, f))
+            break
     while heap:
-        ts, seq, i, rec, pos, f = heapq.heappop(heap)
-        checkpoint[f] = pos
-        yield ts, seq, rec, f
+        ts, _r, s, i, rec, pos, f = heapq.heappop(heap)
+        yield ts, s, rec, pos, f
+        for ts2, rec2, pos2, f2 in sources[i]:
+            if ts2 is None:
+                yield None, 0, None, pos2, f2
+                continue
+            seq += 1
+            heapq.heappush(heap, (ts2, rank[f2], seq, i, rec2, pos2, f2))
+            break
+
+class _ErrlogBuffer:
+    """Stands in for errlog inside a worker; lines are shipped back with the next batch."""
+    def __init__(self):
+        self.lines = []
+
+    def write(self, s):
+        self.lines.append(s)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        lines, self.lines = self.lines, []
+        return lines
+
+def _decode_worker(group, offsets, rank, q, batch_size, chunk_size, use_mmap, prefilter, indexes, window,
+                   caches, filters, reorders, sample_every):
+    """Worker process: decode + parse a group of files, merge them locally, ship batches."""
+    reset_metrics(sample_every)
+    errlog = _ErrlogBuffer()
+    sources = [_file_source(f, offsets.get(f, 0), errlog, chunk_size, use_mmap, prefilter,
+                            indexes.get(f), window, caches.get(f), filters, reorders.get(f))
+               for f in group]
+    batch = []
+    try:
+        for ts, _seq, rec, pos, f in _kway_merge(sources, rank):
+            batch.append((ts, rec, pos, f))
+            if len(batch) >= batch_size:
+                q.put(("data", batch, errlog.drain()))
+                batch = []
+        q.put(("data", batch, errlog.drain()))
+        q.put(("done", {f: parser_for(f) for f in group}, {f: stats_for(f) for f in group},
+               prefilter.stats() if prefilter is not None else None, {f: c.stats() for f, c in caches.items()},
+               {f: r.stats() for f, r in reorders.items()}, metrics().state()))
+    except Exception as e:
+        q.put(("error", f"{type(e).__name__}: {e}", errlog.drain()))
+
+def _queue_source(q, proc, errlog, prefilter, reorders):
+    """Main-process side of a worker: yields (ts, rec, pos, file) from its batches."""
+    while True:
         try:
-            ts2, rec2, pos2 = next(iters[i])
+            msg = q.get(timeout=1.0)
+        except queue.Empty:
+            if not proc.is_alive():
+                print(f"[ERROR] decode worker {proc.pid} died (exit code {proc.exitcode})", file=sys.stderr)
+                return
+            continue
+        kind = msg[0]
+        if kind == "data":
+            _, batch, errs = msg
+            if errs:
+                errlog.write("".join(errs))
+                errlog.flush()
+            yield from batch
+        elif kind == "done":
+            _, parsers, rstats, pstats, caches, rstats_reorder, stages = msg
+            reorders.update(rstats_reorder)
+            metrics().merge_state(stages)
+            for f, ps in parsers.items():
+                register_parser(f, ps)
+            for f, c in caches.items():
+                register_cache_stats(f, c)
+            for f, st in rstats.items():
+                register_stats(f, st)
+            if pstats and prefilter is not None:
+                prefilter.checked += pstats["checked"]
+                prefilter.skipped += pstats["skipped"]
+            return
+        else:
+            _, err, errs = msg
+            if errs:
+                errlog.write("".join(errs))
+                errlog.flush()
+            print(f"[ERROR] decode worker failed: {err}", file=sys.stderr)
+            return
+
+def _group_files(files, workers):
+    """Split files into `workers` groups of roughly equal total size (largest first)."""
+    groups = [[] for _ in range(min(workers, len(files)))]
+    loads = [0] * len(groups)
+    for f in sorted(files, key=lambda p: os.path.getsize(p) if os.path.exists(p) else 0, reverse=True):
+        i = loads.index(min(loads))
+        groups[i].append(f)
+        loads[i] += os.path.getsize(f) if os.path.exists(f) else 0
+    return [sorted(g) for g in groups if g]
+
+def merged_stream(pattern, checkpoint, errlog, chunk_size=DEFAULT_CHUNK_SIZE, use_mmap=False,
+                  workers=1, batch_size=1000, prefilter=None, index_opts=None, window=(None, None),
+                  cache_dir=None, filters=(None, None), sort_plan=None):
+    files = sorted(glob.glob(pattern))
+    if not files:
+        print("[WARNING] No files matched the pattern", file=sys.stderr)
+        return
+    reorders = {}
+    if sort_plan is not None and sort_plan.active():
+        # unsorted files are replaced by sorted copies or re-sorted while read
+        files = sort_plan.prepare(files, checkpoint, errlog)
+        reorders = sort_plan.reorders
+    rank = {f: n for n, f in enumerate(files)}
+    # offsets follow files across renames (rotation), not just names
+    keys = resume_offsets(files, checkpoint)
+    # compressed files are read sequentially from their seek points: no time index, no column cache
+    plain = [f for f in files if codec_for(f) is None]
+    indexes = {}
+    if index_opts:
+        indexes = {f: TimeIndex.load(f, **index_opts) for f in plain}
+    caches = {}
+    if cache_dir:
+        # loaded here, brought up to date by whichever process reads the file
+        caches = {f: LogColumns.open(f, cache_dir, update=False) for f in plain}
+    procs = []
+    m = metrics()
+    if workers > 1 and len(files) > 1:
+        # Decoding runs in worker processes; the heap merge (and so ordering and
+        # checkpointing) stays here.
+        offsets = {f: checkpoint.get(f, 0) for f in files}
+        sources = []
+        queues = []
+        for group in _group_files(files, workers):
+            q = multiprocessing.Queue(maxsize=4)
+            proc = multiprocessing.Process(target=_decode_worker,
+                                           args=(group, offsets, rank, q, max(1, batch_size), chunk_size, use_mmap,
+                                                 prefilter, {f: indexes[f] for f in group if f in indexes},
+                                                 window, {f: caches[f] for f in group if f in caches}, filters,
+                                                 {f: reorders[f] for f in group if f in reorders},
+                                                 m.sample_every),
+                                           daemon=True)
+            proc.start()
+            procs.append(proc)
+            queues.append(q)
+            sources.append(_queue_source(q, proc, errlog, prefilter, reorders))
+        m.watch("decode_batches", lambda: sum(q.qsize() for q in queues))
+    else:
+        sources = [_file_source(f, checkpoint.get(f, 0), errlog, chunk_size, use_mmap, prefilter,
+                                indexes.get(f), window, caches.get(f), filters, reorders.get(f))
+                   for f in files]
+        m.merge_in_process = True
+    seq = 0
+    try:
+        for ts, _s, rec, pos, f in _kway_merge(sources, rank):
+            checkpoint[f] = checkpoint[keys.get(f, f)] = pos
+            if ts is None:
+                continue
             seq += 1
-            heapq.heappush(heap, (ts2, seq, i, rec2, pos2, f))
-        except StopIteration:
-            pass
-
-def save_debug_reports(entries, json_path, csv_path):
-    os.makedirs(os.path.dirname(json_path), exist_ok=True)
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(entries, f, indent=2, ensure_ascii=False)
-    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
-        w = csv.writer(f)
-        w.writerow(['log_index', 'file', 'original', 'issues'])
-        for e in entries:
-            w.writerow([e.get('log_index'), e.get('file'), json.dumps(e.get('original', {}), ensure_ascii=False), "; ".join(e.get('issues', []))])
-
-def generate_html_report(events, bugs, summary, corr, outfile):
+            yield ts, seq, rec, f
+    finally:
+        m.unwatch("decode_batches")
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+            proc.join()
+
+def generate_html_report(events, bugs, summary, corr, outfile, max_error_points=None):
     if not simple_html_report:
         print("[ERROR] html_report_generator module not available", file=sys.stderr)
         return
     os.makedirs(os.path.dirname(outfile), exist_ok=True)
-    simple_html_report(events, bugs, summary, corr, outfile)
+    simple_html_report(events, bugs, summary, corr, outfile, max_error_points=max_error_points)
+
+class ReplayProgress:
+    """
+    Feeds replay()'s progress callback at most every `interval` seconds with
+    events, rate, bytes, event-time watermark and an ETA from the share of the
+    input bytes consumed. The callback returns True to stop the replay.
+    """
+    def __init__(self, callback, files, cp, interval=0.5):
+        self.callback = callback
+        self.files = files
+        self.interval = interval
+        self.total_bytes = sum(os.path.getsize(f) for f in files if os.path.exists(f))
+        self.base = sum(cp.get(f, 0) for f in files)
+        self.t0 = time.monotonic()
+        self.due = self.t0
+        self.metrics = None       # a ReplayMetrics: its snapshot goes along with every report
+
+    def report(self, events, watermark, cp, state="running"):
+        now = time.monotonic()
+        self.due = now + self.interval
+        elapsed = now - self.t0
+        consumed = sum(cp.get(f, 0) for f in self.files) - self.base
+        todo = self.total_bytes - self.base
+        fraction = min(1.0, consumed / todo) if todo > 0 else 1.0
+        eta = elapsed * (1 - fraction) / fraction if 0 < fraction < 1 else (0.0 if fraction >= 1 else None)
+        if self.metrics is not None:
+            self.metrics.sample_gauges()
+        return self.callback({
+            "state": state,
+            "events": events,
+            "events_per_sec": round(events / elapsed, 1) if elapsed > 0 else 0.0,
+            "bytes_read": reader_stats()["total"]["bytes_read"],
+            "bytes_consumed": consumed,
+            "bytes_total": todo,
+            "fraction": round(fraction, 4),
+            "watermark": watermark.isoformat() if watermark else None,
+            "elapsed_seconds": round(elapsed, 3),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "metrics": self.metrics.snapshot() if self.metrics is not None else None,
+        })
 
-def replay(args):
+def replay(args, progress=None, progress_interval=0.5):
+    """
+    Run one replay. `progress`, if given, is called with a dict of live
+    counters (see ReplayProgress); returning True from it stops the replay
+    like Ctrl-C would. Returns {"events", "cancelled", "summary_json"}.
+    """
     if args.checkpoint_every <= 0:
         raise ValueError("checkpoint_every must be a positive integer")
 
-    cp = {} if args.no_checkpoint else load_checkpoint(args.checkpoint)
+    # stats registries are per process; start clean when one process runs many replays
+    reset_parsers()
+    reset_stats()
+    reset_cache_stats()
+    m = reset_metrics(args.metrics_sample)
+    set_index_dir(None if args.no_index else args.index_dir)
+    cp = {}
+    if args.checkpoint:
+        state = load_checkpoint(args.checkpoint, args.checkpoint_fsync_every, args.checkpoint_compact_every)
+        if not args.no_checkpoint:
+            cp = state
+    tracker = ReplayProgress(progress, sorted(glob.glob(args.pattern)), cp, progress_interval) if progress else None
+    if tracker is not None:
+        tracker.metrics = m
+    profiler = SamplingProfiler(args.profile, args.profile_interval / 1000.0).start() if args.profile else None
+    profile = None
+    idx = 0
+    ts = None
+    cancelled = False
+    follower = None
+    sort_plan = None
+    out_of_order = 0
     os.makedirs(os.path.dirname(args.errlog), exist_ok=True) if args.errlog else None
     with open(args.errlog, 'a', encoding='utf-8') if args.errlog else sys.stderr as errlog:
         out = None
+        detector = debug_out = timeline = scheduler = sink = live = None
+        t_start = time.time()
+        every = m.sample_every
+        st_input, st_pacing, st_detect, st_output = (m.stage(n) for n in ('input', 'pacing', 'detect', 'output'))
+        pacing = False
         try:
+            debug_out = DebugReportWriter(args.debug_json, args.debug_csv, args.report_buffer)
+            timeline = TimelineWriter(args.timeline, args.report_buffer)
+            if not args.no_live:
+                # next to the summary unless given, where the dashboard looks for it
+                live = LiveSnapshotWriter(args.live_snapshot or os.path.join(os.path.dirname(args.summary_json),
+                                                                             'replay_live.json'),
+                                          args.live_interval)
             if args.output:
                 os.makedirs(os.path.dirname(args.output), exist_ok=True)
-                out = open(args.output, 'a', encoding='utf-8')
+                out = BatchedWriter(args.output, args.output_batch, args.output_flush_ms / 1000.0, args.durability)
+                m.watch("output_lines", out.pending)
+            if args.sink_url:
+                sink = HttpSink(args.sink_url, args.sink_concurrency, args.sink_batch, args.sink_max_pending,
+                                args.sink_retries, args.sink_timeout)
+                m.watch("sink_unacked", sink.pending)
             start = parse_ts(args.start) if args.start else None
             end = parse_ts(args.end) if args.end else None
-            min_gap = 1.0 / args.max_rate if args.max_rate > 0 else 0
-            last_emit = 0
-            last_ts = None
+            prefilter = None
+            if not args.no_pushdown:
+                prefilter = LinePrefilter(args.level, args.source, start, end)
+                if not prefilter.active():
+                    prefilter = None
+            index_opts = None
+            if not args.no_index and not args.cache_dir:
+                index_opts = {"index_dir": args.index_dir, "every_records": args.index_every,
+                              "every_bytes": args.index_bytes}
+            scheduler = ReplayScheduler(args.real_time, args.speed, args.max_rate, args.max_sleep, args.max_lag,
+                                        args.spin_ms / 1000.0)
+
+            if args.flow_spill:
+                os.makedirs(os.path.dirname(args.flow_spill) or '.', exist_ok=True)
+            detector = BugDetector(timeout_threshold=args.timeout, max_flows=args.max_flows,
+                                   flow_idle_timeout=args.flow_idle_timeout, max_flow_events=args.max_flow_events,
+                                   max_bug_samples=args.max_bug_samples, spill_path=args.flow_spill)
+
+            st_checkpoint = m.stage('checkpoint')
+
+            def checkpoint_now():
+                t0 = time.perf_counter()
+                debug_out.flush()
+                timeline.flush()
+                save = functools.partial(save_checkpoint, args.checkpoint, dict(cp))
+                # saved once the sink acknowledged / the writer put on disk everything before it
+                if sink and out:
+                    sink.barrier(functools.partial(out.barrier, save))
+                elif sink:
+                    sink.barrier(save)
+                elif out:
+                    out.barrier(save)
+                else:
+                    save()
+                st_checkpoint.observe(time.perf_counter() - t0)
+
+            if args.follow:
+                saved_at = [idx]
 
-            detector = BugDetector(timeout_threshold=args.timeout)
-            debug_entries = []
-            events_for_report = []
-            idx = 0
+                def on_idle():
+                    nonlocal cancelled
+                    # nothing new to read: checkpoint what was replayed, report, honour cancel
+                    if args.checkpoint and saved_at[0] != idx:
+                        saved_at[0] = idx
+                        checkpoint_now()
+                    if live is not None and time.monotonic() >= live.due:
+                        live.publish()
+                    if tracker is not None and time.monotonic() >= tracker.due and tracker.report(idx, ts, cp):
+                        cancelled = True
+                    return cancelled
 
-            for ts, seq, rec, f in merged_stream(args.pattern, cp, errlog):
+                follower = LogFollower(args.pattern, cp, errlog, args.chunk_size, prefilter, args.follow_lateness,
+                                       args.follow_idle, poll_max=args.follow_poll_max,
+                                       max_buffered=args.follow_buffer, exit_idle=args.follow_exit_idle,
+                                       on_idle=on_idle, use_inotify=not args.no_inotify)
+                m.watch("follow_buffered", lambda: follower.buffered)
+                stream = follower.stream()
+            else:
+                sort_plan = SortPlan(args.sort_mode, args.sort_dir, args.reorder_window, args.reorder_max,
+                                     args.sort_memory, args.chunk_size)
+                stream = merged_stream(args.pattern, cp, errlog, args.chunk_size, args.mmap,
+                                       args.workers, args.batch_size, prefilter,
+                                       index_opts, (start, end), args.cache_dir,
+                                       (args.level, args.source), sort_plan)
+            prev_ts = None
+            # one record in `every` has its stages timed (see replay_metrics)
+            countdown = every or -1
+            input_timed = False
+            pacing = scheduler.active()
+            clock = time.perf_counter
+            for ts, seq, rec, f in stream:
+                if input_timed:
+                    st_input.observe(clock() - t_mark, every)
+                    input_timed = False
+                if prev_ts is not None and ts < prev_ts:
+                    out_of_order += 1
+                else:
+                    prev_ts = ts
                 if start and ts < start:
                     continue
                 if end and ts > end:
@@ -152,81 +563,232 @@ def replay(args):
                     continue
 
                 idx += 1
-                now = time.time()
-                if args.real_time and last_ts:
-                    gap = (ts - last_ts).total_seconds()
-                    if gap > 0:
-                        time.sleep(min(gap, args.max_sleep))
-                elif min_gap and last_emit:
-                    wait = min_gap - (now - last_emit)
-                    if wait > 0:
-                        time.sleep(wait)
+                countdown -= 1
+                timed = not countdown
+                if timed:
+                    countdown = every
+                    t0 = clock()
+                scheduler.wait(ts)
+                if timed:
+                    t1 = clock()
+                    if pacing:
+                        st_pacing.observe(t1 - t0, every)
 
                 # analysis
-                bugs = detector.analyze(ts, rec)
+                bugs = detector.analyze(ts, rec, idx)
+                if timed:
+                    t2 = clock()
+                    st_detect.observe(t2 - t1, every)
                 if bugs:
-                    debug_entries.append({"log_index": idx, "file": f, "original": rec, "issues": bugs})
+                    debug_out.write({"log_index": idx, "file": f, "original": rec, "issues": bugs})
                     for b in bugs:
                         print("[BUG]", b)
+                if live is not None:
+                    live.observe(ts, rec, bugs, idx)
 
                 # output line (optional)
                 line = {"ts": ts.isoformat(), "seq": seq, "file": f, "rec": rec}
                 if out:
                     out.write(json.dumps(line, ensure_ascii=False) + "\n")
-                    out.flush()
-                else:
+                if sink:
+                    sink.send(json.dumps(rec, ensure_ascii=False))
+                if not out and not sink:
                     print(f"[REPLAY] {ts.isoformat()} | {rec.get('level')} | {rec.get('source')} | {rec.get('message')}")
 
-                events_for_report.append({
+                timeline.write({
                     "x": ts.isoformat(),
                     "y": rec.get("source", "unknown"),
                     "level": rec.get("level", "INFO"),
                     "event": rec.get("event_type") or rec.get("event", ""),
                     "message": rec.get("message", "")
                 })
-
-                last_emit = time.time()
-                last_ts = ts
+                if timed:
+                    st_output.observe(clock() - t2, every)
 
                 if args.checkpoint and idx % args.checkpoint_every == 0:
-                    save_checkpoint(args.checkpoint, cp)
+                    checkpoint_now()
+                if idx % GAUGE_EVERY == 0:
+                    m.sample_gauges()
+                if live is not None and time.monotonic() >= live.due:
+                    live.publish()
+
+                if tracker is not None and time.monotonic() >= tracker.due:
+                    if tracker.report(idx, ts, cp):
+                        cancelled = True
+                        print("[INFO] cancelled")
+                        break
+                if timed:
+                    input_timed = True
+                    t_mark = clock()
+            if cancelled and follower is not None:
+                print("[INFO] cancelled")
         except KeyboardInterrupt:
+            cancelled = True
             print("[INFO] interrupted")
         finally:
-            if args.checkpoint:
-                save_checkpoint(args.checkpoint, cp)
+            if every:
+                # stage counts grow in steps of `every`; settle them
+                for st in (st_input, st_detect, st_output) + ((st_pacing,) if pacing else ()):
+                    st.count = idx
+            m.sample_gauges()
+            if profiler is not None:
+                profile = profiler.stop()
+                print(f"[INFO] profile: {profile['samples']} samples written to {profile['file']}", file=sys.stderr)
+            rstats = reader_stats()["total"]
+            elapsed = time.time() - t_start
+            print(f"[INFO] read {rstats['bytes_read'] / 1e6:.1f} MB, reader {rstats['mb_per_sec']} MB/s, "
+                  f"overall {rstats['bytes_read'] / 1e6 / elapsed if elapsed > 0 else 0:.1f} MB/s", file=sys.stderr)
+            stages = m.snapshot()["stages"]
+            if stages:
+                print("[INFO] stages (s): " + ", ".join(f"{name} {st['seconds']:.3f}" for name, st in stages.items()),
+                      file=sys.stderr)
+            if out_of_order:
+                print(f"[WARNING] {out_of_order} events were replayed out of time order"
+                      + ("; try --sort-mode auto" if not (sort_plan and sort_plan.active()) else ""), file=sys.stderr)
+            if follower is not None:
+                st = follower.stats()
+                print(f"[INFO] follow: {st['files_opened']} files, {st['renames']} renames, "
+                      f"{st['truncations']} truncations, {st['late_events']} late, "
+                      f"write-to-detection ms {st['latency_ms']}", file=sys.stderr)
+            if scheduler and scheduler.active():
+                st = scheduler.stats()
+                print(f"[INFO] pacing: {st['batches']} batches, {st['late_batches']} late, "
+                      f"lag ms {st['lag_ms']}, jitter ms {st['jitter_ms']}", file=sys.stderr)
+            output_ok = True
+            if sink:
+                if not sink.close():
+                    output_ok = False
+                    print("[ERROR] some records were not acknowledged by the sink", file=sys.stderr)
+                st = sink.stats()
+                print(f"[INFO] sink: {st['events_acked']} acked, {st['events_failed']} failed, "
+                      f"{st['events_per_sec']} events/s, latency ms {st['latency_ms']}", file=sys.stderr)
             if out:
-                out.close()
+                try:
+                    out.close()
+                except IOError as e:
+                    output_ok = False
+                    print(f"[ERROR] {e}", file=sys.stderr)
+            # only move the checkpoint on if the output it covers was written
+            if args.checkpoint and output_ok:
+                save_checkpoint(args.checkpoint, cp)
+            if args.checkpoint:
+                close_checkpoint(args.checkpoint)
+            for w in (detector, debug_out, timeline):
+                if w:
+                    w.close()
+            if live is not None:
+                live.close("cancelled" if cancelled else "done")
 
-        # save debug reports + html
-        save_debug_reports(debug_entries, args.debug_json, args.debug_csv)
+        # debug reports were streamed during the run; html is built from the timeline file
         summary = detector.error_summary()
         corr = detector.correlation_report()
-        generate_html_report(events_for_report, detector.get_detected_bugs(), summary, corr, args.html_report)
+        generate_html_report(StreamedTimeline(args.timeline, timeline.events), detector.get_detected_bugs(), summary,
+                             corr, args.html_report, args.report_error_points or None)
         os.makedirs(os.path.dirname(args.summary_json), exist_ok=True)
         with open(args.summary_json, 'w', encoding='utf-8') as f:
-            json.dump({"summary": summary, "bugs": detector.get_detected_bugs(), "correlation": corr}, f, indent=2)
+            json.dump({"summary": summary, "bugs": detector.get_detected_bugs(), "correlation": corr,
+                       "timestamp_parsing": parser_stats(), "reader": reader_stats(),
+                       "prefilter": prefilter.stats() if prefilter else None,
+                       "output": out.stats() if out else None,
+                       "cache": cache_stats() if args.cache_dir else None,
+                       "scheduler": scheduler.stats() if scheduler.active() else None,
+                       "sink": sink.stats() if sink else None,
+                       "follow": follower.stats() if follower else None,
+                       "ordering": {"out_of_order_events": out_of_order,
+                                    "sort": sort_plan.stats() if sort_plan and sort_plan.active() else None},
+                       "sampling": detector.sampling_report(),
+                       "metrics": m.snapshot(),
+                       "profile": profile,
+                       "bug_records": detector.get_bug_records(),
+                       "root_cause": detector.root_cause_report()}, f, indent=2)
         print("[INFO] reports saved")
+        if tracker is not None:
+            tracker.report(idx, ts, cp, "cancelled" if cancelled else "done")
+        return {"events": idx, "cancelled": cancelled, "summary_json": args.summary_json}
 
-if __name__ == '__main__':
+def build_parser():
     p = argparse.ArgumentParser()
     p.add_argument('-p', '--pattern', default='logs/events.log*')
     p.add_argument('-c', '--checkpoint', default='logs/replay.checkpoint.json')
     p.add_argument('--no-checkpoint', action='store_true')
     p.add_argument('--errlog', default='logs/replay.errors.log')
     p.add_argument('-o', '--output', default=None)
+    p.add_argument('--output-batch', type=int, default=1000, help='lines per output write batch')
+    p.add_argument('--output-flush-ms', type=float, default=200.0, help='max time a line waits before being written')
+    p.add_argument('--sink-url', default=None, help='POST every replayed record to this http(s) URL')
+    p.add_argument('--sink-concurrency', type=int, default=8, help='keep-alive connections / requests in flight')
+    p.add_argument('--sink-batch', type=int, default=1, help='records per request (>1 sends NDJSON)')
+    p.add_argument('--sink-max-pending', type=int, default=1000, help='unacknowledged records before replay waits')
+    p.add_argument('--sink-retries', type=int, default=3)
+    p.add_argument('--sink-timeout', type=float, default=10.0, help='seconds per request')
+    p.add_argument('--durability', choices=DURABILITY_LEVELS, default='flush',
+                   help='per-batch output durability: none, flush or fsync')
     p.add_argument('--real-time', action='store_true')
     p.add_argument('--max-rate', type=float, default=0.0)
     p.add_argument('--max-sleep', type=float, default=5.0)
+    p.add_argument('--speed', type=float, default=1.0, help='--real-time speed factor (2 = twice as fast)')
+    p.add_argument('--max-lag', type=float, default=None,
+                   help='seconds behind schedule after which the schedule is moved instead of caught up')
+    p.add_argument('--spin-ms', type=float, default=2.0, help='busy-wait this long before each due time')
     p.add_argument('--level', default=None)
     p.add_argument('--source', default=None)
     p.add_argument('--start', default=None)
     p.add_argument('--end', default=None)
     p.add_argument('--timeout', type=float, default=5.0)
     p.add_argument('--checkpoint-every', type=int, default=100)
+    p.add_argument('--max-flows', type=int, default=None, help='keep at most N correlation flows in memory')
+    p.add_argument('--flow-idle-timeout', type=float, default=None,
+                   help='evict correlation flows idle this many seconds of event time')
+    p.add_argument('--max-flow-events', type=int, default=None, help='keep at most N events per correlation flow')
+    p.add_argument('--max-bug-samples', type=int, default=None, help='keep the first N bug strings per kind/service')
+    p.add_argument('--flow-spill', default=None, help='JSONL file that receives evicted correlation flows')
+    p.add_argument('--checkpoint-fsync-every', type=int, default=10,
+                   help='fsync the checkpoint journal every N checkpoints')
+    p.add_argument('--checkpoint-compact-every', type=int, default=1000,
+                   help='fold the journal into the snapshot after N journal records')
+    p.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='reader chunk size in bytes')
+    p.add_argument('--mmap', action='store_true', help='read input files through mmap')
+    p.add_argument('--workers', type=int, default=1, help='decode input files in this many worker processes')
+    p.add_argument('--batch-size', type=int, default=1000, help='records per batch sent by a decode worker')
+    p.add_argument('--no-pushdown', action='store_true', help='disable raw-line pre-screening for the filters')
+    p.add_argument('--index-dir', default='logs/.replay_index', help='where sparse time index sidecars are kept')
+    p.add_argument('--no-index', action='store_true', help='neither use nor build time index sidecars')
+    p.add_argument('--index-every', type=int, default=1000, help='index entry every N records')
+    p.add_argument('--index-bytes', type=int, default=1 << 20, help='index entry at least every N bytes')
+    p.add_argument('--sort-mode', choices=SORT_MODES, default='off',
+                   help='check input files for time order and reorder or externally sort the ones that are not')
+    p.add_argument('--sort-dir', default='logs/.replay_sorted', help='where order scans and sorted copies are kept')
+    p.add_argument('--reorder-window', type=float, default=5.0, help='seconds of disorder the reorder buffer absorbs')
+    p.add_argument('--reorder-max', type=int, default=100000, help='records the reorder buffer may hold')
+    p.add_argument('--sort-memory', type=float, default=256, help='MB of lines per sorted run of the external sort')
+    p.add_argument('--follow', action='store_true', help='keep reading appended data and new or rotated files')
+    p.add_argument('--follow-lateness', type=float, default=2.0,
+                   help='event-time seconds a file may trail the newest event before its records count as late')
+    p.add_argument('--follow-idle', type=float, default=1.0,
+                   help='seconds without new data after which a file no longer holds back the merge')
+    p.add_argument('--follow-poll-max', type=float, default=0.5, help='longest poll interval / inotify wait')
+    p.add_argument('--follow-buffer', type=int, default=100000, help='records held for the merge before forcing release')
+    p.add_argument('--follow-exit-idle', type=float, default=None, help='stop after this many seconds without new data')
+    p.add_argument('--no-inotify', action='store_true', help='poll instead of using inotify')
+    p.add_argument('--metrics-sample', type=int, default=16,
+                   help='time the stages of one record in N (0: no stage timing)')
+    p.add_argument('--profile', default=None, help='sample the replay stack and write folded stacks here')
+    p.add_argument('--profile-interval', type=float, default=5.0, help='milliseconds between profile samples')
+    p.add_argument('--cache-dir', default=None,
+                   help='keep parsed columns of each input file here and replay from them (replaces the time index)')
     p.add_argument('--debug-json', default='reports/debug_report.json')
     p.add_argument('--debug-csv', default='reports/debug_report.csv')
     p.add_argument('--html-report', default='reports/bug_report.html')
     p.add_argument('--summary-json', default='reports/replay_summary.json')
-    args = p.parse_args()
-    replay(args)
\ No newline at end of file
+    p.add_argument('--timeline', default='reports/replay_timeline.jsonl', help='streamed event timeline for the html report')
+    p.add_argument('--report-error-points', type=int, default=0,
+                   help='plot at most N error events in the html report (0: all of them)')
+    p.add_argument('--report-buffer', type=int, default=256, help='report lines buffered before they are written out')
+    p.add_argument('--live-snapshot', default=None,
+                   help='live state for the dashboard (default: replay_live.json next to --summary-json)')
+    p.add_argument('--live-interval', type=float, default=1.0, help='seconds between live deltas')
+    p.add_argument('--no-live', action='store_true', help='do not publish live state')
+    return p
+
+if __name__ == '__main__':
+    replay(build_parser().parse_args())
\ No newline at end of file
@@ -1,93 +1,110 @@
 
-from flask import Flask, request, jsonify
-import subprocess
+from flask import Flask, Response, request, jsonify
 import threading
 import os
-import signal
-import sys
+import queue
 import logging
-import time
+from replay_jobs import FINAL_STATES, ReplayJobManager
+from replay_metrics import prometheus_text
 
 # Configure logging
+os.makedirs('logs', exist_ok=True)
 logging.basicConfig(level=logging.INFO, filename='logs/api_server.log',
                     format='%(asctime)s %(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-proc = None
-proc_lock = threading.Lock()
+MAX_JOBS = int(os.environ.get('API_MAX_JOBS', 2))
+MAX_QUEUED = int(os.environ.get('API_MAX_QUEUED', 100))
+# job paths must stay under DATA_ROOT; sink_url may only name SINK_HOSTS ("host" or "host:port", comma separated)
+DATA_ROOT = os.environ.get('API_DATA_ROOT', '.')
+SINK_HOSTS = [h for h in os.environ.get('API_SINK_HOSTS', '').split(',') if h.strip()]
+manager = None
+manager_lock = threading.Lock()
 
-def get_script_path():
-    """Resolve the path to ReplayEnhanced.py dynamically."""
-    return os.path.join(os.path.dirname(__file__), 'ReplayEnhanced.py')
-
-def terminate_process():
-    """Safely terminate the subprocess."""
-    with proc_lock:
-        global proc
-        if proc and proc.poll() is None:
-            logger.info(f"Terminating process {proc.pid}")
-            try:
-                os.killpg(proc.pid, signal.SIGTERM)  # Terminate process group
-                proc.wait(timeout=5)  # Wait up to 5 seconds
-            except subprocess.TimeoutExpired:
-                logger.warning(f"Process {proc.pid} did not terminate, sending SIGKILL")
-                os.killpg(proc.pid, signal.SIGKILL)
-                proc.wait()
-            except Exception as e:
-                logger.error(f"Failed to terminate process {proc.pid}: {e}")
-            finally:
-                proc = None
+def get_manager():
+    """Create the job manager (and its pre-warmed workers) on first use."""
+    global manager
+    with manager_lock:
+        if manager is None:
+            manager = ReplayJobManager(MAX_JOBS, MAX_QUEUED, data_root=DATA_ROOT, sink_hosts=SINK_HOSTS)
+            logger.info(f"Started {MAX_JOBS} replay workers")
+        return manager
 
 @app.route('/start', methods=['POST'])
 def start_replay():
-    global proc
-    with proc_lock:
-        if proc and proc.poll() is None:
-            logger.info("Replay process already running")
-            return jsonify({'status': 'already_running', 'pid': proc.pid}), 200
-
-        args = request.get_json(silent=True) or {}
-        pattern = args.get('pattern', 'logs/events.log*')
-        if not isinstance(pattern, str) or not pattern.strip():
-            logger.error("Invalid pattern provided")
-            return jsonify({'status': 'error', 'message': 'Pattern must be a non-empty string'}), 400
-
-        cmd = [sys.executable, get_script_path(), '-p', pattern]
-        try:
-            # Use setsid to create a new process group
-            proc = subprocess.Popen(cmd, preexec_fn=os.setsid)
-            logger.info(f"Started replay process with PID {proc.pid}")
-            return jsonify({'status': 'started', 'pid': proc.pid}), 200
-        except (FileNotFoundError, OSError) as e:
-            logger.error(f"Failed to start replay process: {e}")
-            return jsonify({'status': 'error', 'message': str(e)}), 500
+    options = request.get_json(silent=True) or {}
+    if not isinstance(options, dict):
+        return jsonify({'status': 'error', 'message': 'Body must be a JSON object of replay options'}), 400
+    pattern = options.setdefault('pattern', 'logs/events.log*')
+    if not isinstance(pattern, str) or not pattern.strip():
+        logger.error("Invalid pattern provided")
+        return jsonify({'status': 'error', 'message': 'Pattern must be a non-empty string'}), 400
+    try:
+        job = get_manager().submit(options)
+    except ValueError as e:
+        logger.error(f"Invalid replay options: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except queue.Full:
+        logger.warning("Replay queue is full")
+        return jsonify({'status': 'error', 'message': 'Too many queued jobs'}), 429
+    status = 'started' if job['state'] == 'running' else job['state']
+    logger.info(f"Job {job['id']} {status}")
+    return jsonify({'status': status, 'job_id': job['id'], 'pid': job['pid'], 'job': job}), 202
 
 @app.route('/stop', methods=['POST'])
 def stop_replay():
-    global proc
-    with proc_lock:
-        if not proc or proc.poll() is not None:
-            logger.info("No replay process running")
-            return jsonify({'status': 'not_running'}), 200
-        terminate_process()
-        return jsonify({'status': 'stopped'}), 200
+    """Cancel one job ({"job_id": ...}) or, without a job_id, every queued and running job."""
+    job_id = (request.get_json(silent=True) or {}).get('job_id')
+    if job_id is not None:
+        return cancel_job(str(job_id))
+    jobs = get_manager().cancel_all()
+    if not jobs:
+        return jsonify({'status': 'not_running'}), 200
+    logger.info(f"Cancelling {len(jobs)} jobs")
+    return jsonify({'status': 'stopping', 'jobs': [j['id'] for j in jobs]}), 200
+
+@app.route('/cancel/<job_id>', methods=['POST'])
+def cancel_job(job_id):
+    job = get_manager().cancel(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+    logger.info(f"Cancel requested for job {job_id} ({job['state']})")
+    return jsonify({'status': job['state'], 'job': job}), 200
 
 @app.route('/status', methods=['GET'])
 def status():
-    with proc_lock:
-        if not proc:
-            return jsonify({'running': False, 'status': 'not_started'}), 200
-        if proc.poll() is None:
-            return jsonify({'running': True, 'pid': proc.pid}), 200
-        exit_code = proc.poll()
-        logger.info(f"Replay process terminated with exit code {exit_code}")
-        return jsonify({'running': False, 'status': 'terminated', 'exit_code': exit_code}), 200
+    return jsonify(get_manager().overview()), 200
+
+@app.route('/status/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_manager().get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+    return jsonify(job), 200
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify({'jobs': get_manager().jobs()}), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text: per-stage metrics of running jobs plus job and worker counts."""
+    mgr = get_manager()
+    running = [(j['id'], j['progress']) for j in mgr.jobs() if j['state'] not in FINAL_STATES]
+    ov = mgr.overview()
+    text = prometheus_text(running, {
+        'replay_jobs': ('Replay jobs by state.', {(('state', s),): n for s, n in ov['jobs'].items()}),
+        'replay_jobs_queued': ('Jobs waiting for a worker.', {(): ov['queued']}),
+        'replay_workers_idle': ('Idle replay workers.', {(): ov['idle_workers']}),
+    })
+    return Response(text, mimetype='text/plain; version=0.0.4')
 
 def shutdown_hook():
-    """Clean up subprocess on server shutdown."""
-    logger.info("Server shutting down, cleaning up subprocess")
-    terminate_process()
+    """Cancel jobs and stop the workers on server shutdown."""
+    logger.info("Server shutting down, stopping replay workers")
+    if manager is not None:
+        manager.close()
 
 if __name__ == '__main__':
     # Ensure log directory exists
@@ -95,5 +112,6 @@ if __name__ == '__main__':
     # Register shutdown hook
     import atexit
     atexit.register(shutdown_hook)
+    get_manager()
     # Run Flask in non-debug mode for production
-    app.run(host='0.0.0.0', port=6000, debug=False)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=6000, debug=False, threaded=True)
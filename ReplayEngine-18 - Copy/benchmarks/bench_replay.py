@@ -0,0 +1,271 @@
+# app/benchmarks/bench_replay.py
+"""
+Throughput and peak memory of the replay pipeline, on synthetic logs.
+
+    python benchmarks/bench_replay.py                    run everything, compare with baseline.json
+    python benchmarks/bench_replay.py file_iter replay   only these
+    python benchmarks/bench_replay.py --save-baseline    make this run the new baseline
+
+The input is made by synthetic_logs.generate() (kept in --data-dir and
+reused while the parameters match). Each benchmark times its stage alone,
+the median of --repeat runs, then runs it once more under tracemalloc for the
+peak Python memory it allocated; setup (e.g. parsing the records fed to
+BugDetector.analyze) is not counted. MB/s is the size of the raw log the
+stage covers divided by its time; "spread" is (slowest - fastest) / median.
+
+A benchmark regresses when its events/s falls below the baseline by more
+than --tolerance, or by more than the spread of either measurement if that
+is larger (a noisy run can't tell a smaller drop from noise), or when its
+peak memory grows more than --mem-tolerance above it; the run then exits with
+status 1. Baselines are only comparable on the same machine and data, so the
+baseline records both; against another machine's baseline the differences
+are only reported.
+"""
+import argparse
+import contextlib
+import gc
+import glob
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import synthetic_logs
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DATA_PARAMS = {"events": 100000, "files": 3, "services": 6, "ts_formats": ["iso_z", "epoch_ms", "iso_offset"],
+               "seed": 1}
+
+
+def _log_files(data_dir):
+    return sorted(glob.glob(os.path.join(data_dir, 'events.log*')))
+
+
+def _records(data_dir):
+    from ReplayEnhanced import merged_stream
+    stream = merged_stream(os.path.join(data_dir, 'events.log*'), {}, io.StringIO())
+    return [(ts, rec) for ts, _seq, rec, _f in stream]
+
+
+def bench_file_iter(data_dir, work_dir):
+    from ReplayEnhanced import file_iter
+
+    def run():
+        n = 0
+        for path in _log_files(data_dir):
+            for ts, _rec, _end in file_iter(path, 0, io.StringIO()):
+                n += ts is not None
+        return n
+    return run
+
+
+def bench_merged_stream(data_dir, work_dir):
+    from ReplayEnhanced import merged_stream
+
+    def run():
+        return sum(1 for _ in merged_stream(os.path.join(data_dir, 'events.log*'), {}, io.StringIO()))
+    return run
+
+
+def bench_bug_detector(data_dir, work_dir):
+    from bug_detector import BugDetector
+    records = _records(data_dir)
+
+    def run():
+        detector = BugDetector()
+        for n, (ts, rec) in enumerate(records):
+            detector.analyze(ts, rec, n)
+        return len(records)
+    return run
+
+
+def bench_html_report(data_dir, work_dir):
+    from bug_detector import BugDetector
+    from html_report_generator import simple_html_report
+    detector = BugDetector()
+    events = []
+    for n, (ts, rec) in enumerate(_records(data_dir)):
+        detector.analyze(ts, rec, n)
+        events.append({"x": ts.isoformat(), "y": rec.get("source", "unknown"), "level": rec.get("level", "INFO"),
+                       "event": rec.get("event_type", ""), "message": rec.get("message", "")})
+    bugs, summary, corr = detector.get_detected_bugs(), detector.error_summary(), detector.correlation_report()
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            simple_html_report(events, bugs, summary, corr, os.path.join(work_dir, 'report.html'))
+        return len(events)
+    return run
+
+
+def bench_load_logs(data_dir, work_dir):
+    from replay_engine import load_logs
+    jsonl_dir = os.path.join(work_dir, 'jsonl')
+    os.makedirs(jsonl_dir, exist_ok=True)
+    for path in _log_files(data_dir):
+        # load_logs reads *.jsonl; same bytes under that name
+        shutil.copyfile(path, os.path.join(jsonl_dir, os.path.basename(path).replace('.', '_') + '.jsonl'))
+
+    def run():
+        return len(load_logs(jsonl_dir, workers=1))
+    return run
+
+
+def bench_replay(data_dir, work_dir):
+    from ReplayEnhanced import build_parser, replay
+    out = lambda name: os.path.join(work_dir, 'replay', name)
+    args = build_parser().parse_args([
+        '-p', os.path.join(data_dir, 'events.log*'), '-c', out('cp.json'), '--no-checkpoint', '--no-index',
+        '-o', out('out.jsonl'), '--errlog', out('errors.log'), '--debug-json', out('debug.json'),
+        '--debug-csv', out('debug.csv'), '--html-report', out('report.html'), '--summary-json', out('summary.json'),
+        '--timeline', out('timeline.jsonl')])
+
+    def run():
+        shutil.rmtree(os.path.join(work_dir, 'replay'), ignore_errors=True)
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return replay(args)["events"]
+    return run
+
+
+BENCHMARKS = OrderedDict([
+    ("file_iter", bench_file_iter),
+    ("merged_stream", bench_merged_stream),
+    ("bug_detector", bench_bug_detector),
+    ("html_report", bench_html_report),
+    ("load_logs", bench_load_logs),
+    ("replay", bench_replay),
+])
+
+
+def prepare_data(data_dir, params=DATA_PARAMS):
+    """Synthetic input for the benchmarks, regenerated only when `params` changed."""
+    try:
+        with open(os.path.join(data_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if all(manifest["params"].get(k) == v for k, v in params.items()):
+            return manifest
+    except (IOError, ValueError, KeyError):
+        pass
+    shutil.rmtree(data_dir, ignore_errors=True)
+    print(f"[INFO] generating {params['events']} synthetic events in {data_dir}", file=sys.stderr)
+    return synthetic_logs.generate(data_dir, **dict(params, ts_formats=tuple(params["ts_formats"])))
+
+
+def run_benchmark(name, data_dir, work_dir, size, repeat=5):
+    run = BENCHMARKS[name](data_dir, work_dir)
+    times = []
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        t0 = time.perf_counter()
+        events = run()
+        times.append(time.perf_counter() - t0)
+    mid = statistics.median(times)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"events": events, "seconds": round(mid, 4),
+            "events_per_sec": round(events / mid, 1) if mid > 0 else None,
+            "mb_per_sec": round(size / 1e6 / mid, 2) if mid > 0 else None,
+            "spread": round((max(times) - min(times)) / mid, 3) if mid > 0 else None,
+            "peak_mb": round(peak / 1e6, 2)}
+
+
+def host_info():
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+            "cpus": os.cpu_count()}
+
+
+def compare(results, baseline, tolerance=0.25, mem_tolerance=0.25):
+    """Regression messages for `results` against `baseline` (both {"benchmarks": {name: result}})."""
+    regressions = []
+    base = baseline.get("benchmarks", {})
+    for name, r in results["benchmarks"].items():
+        b = base.get(name)
+        if not b:
+            continue
+        allowed = max(tolerance, r.get("spread") or 0, b.get("spread") or 0)
+        if b.get("events_per_sec") and r["events_per_sec"] < b["events_per_sec"] * (1 - allowed):
+            regressions.append(f"{name}: {r['events_per_sec']:.0f} events/s, baseline {b['events_per_sec']:.0f} "
+                               f"({r['events_per_sec'] / b['events_per_sec'] - 1:+.0%}, allowed -{allowed:.0%})")
+        # small peaks are noise; a growth of under 1 MB is never flagged
+        if b.get("peak_mb") is not None and r["peak_mb"] > b["peak_mb"] * (1 + mem_tolerance) \
+                and r["peak_mb"] - b["peak_mb"] >= 1:
+            regressions.append(f"{name}: peak {r['peak_mb']} MB, baseline {b['peak_mb']} MB")
+    return regressions
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='benchmark the replay pipeline on synthetic logs')
+    p.add_argument('names', nargs='*', help=f"benchmarks to run (default all: {', '.join(BENCHMARKS)})")
+    p.add_argument('--events', type=int, default=DATA_PARAMS["events"])
+    p.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark; the median is kept')
+    p.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'replay-bench'))
+    p.add_argument('--baseline', default=BASELINE)
+    p.add_argument('--save-baseline', action='store_true', help='write the results as the baseline')
+    p.add_argument('--tolerance', type=float, default=0.25,
+                   help='allowed events/s drop (0.25 = 25%%), widened to the measured spread')
+    p.add_argument('--mem-tolerance', type=float, default=0.25, help='allowed peak memory growth')
+    p.add_argument('-o', '--output', default=None, help='also write the results to this JSON file')
+    a = p.parse_args(argv)
+    unknown = [n for n in a.names if n not in BENCHMARKS]
+    if unknown:
+        p.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    params = dict(DATA_PARAMS, events=a.events)
+    manifest = prepare_data(os.path.join(a.data_dir, 'data'), params)
+    work_dir = os.path.join(a.data_dir, 'work')
+    os.makedirs(work_dir, exist_ok=True)
+    results = {"host": host_info(), "data": params, "benchmarks": OrderedDict()}
+    for name in a.names or BENCHMARKS:
+        r = results["benchmarks"][name] = run_benchmark(name, os.path.join(a.data_dir, 'data'), work_dir,
+                                                         manifest["bytes"], a.repeat)
+        print(f"{name:<14} {r['events_per_sec']:>12,.0f} events/s {r['mb_per_sec']:>8.2f} MB/s "
+              f"{r['peak_mb']:>8.1f} MB peak  ({r['seconds']}s)")
+    if a.output:
+        with open(a.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if a.save_baseline:
+        baseline = {}
+        if os.path.exists(a.baseline):
+            with open(a.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        if baseline.get("data") != params or baseline.get("host") != results["host"]:
+            baseline = {"benchmarks": {}}   # different data or machine: nothing to keep
+        baseline.update(host=results["host"], data=params)
+        baseline["benchmarks"].update(results["benchmarks"])
+        with open(a.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"[INFO] baseline saved to {a.baseline}")
+        return 0
+    if not os.path.exists(a.baseline):
+        print(f"[WARNING] no baseline at {a.baseline}; run with --save-baseline to create one", file=sys.stderr)
+        return 0
+    with open(a.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get("data") != params:
+        print("[WARNING] the baseline was measured on different data; not compared", file=sys.stderr)
+        return 0
+    same_host = baseline.get("host") == results["host"]
+    if not same_host:
+        print(f"[WARNING] the baseline was measured on another machine ({baseline.get('host')}); "
+              f"differences are reported, not failed", file=sys.stderr)
+    regressions = compare(results, baseline, a.tolerance, a.mem_tolerance)
+    for r in regressions:
+        print(f"[REGRESSION] {r}", file=sys.stderr)
+    return 1 if regressions and same_host else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
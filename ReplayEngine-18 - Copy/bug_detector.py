@@ -1,6 +1,29 @@
 # app/bug_detector.py
-from collections import defaultdict, Counter
+import heapq
+import json
+from collections import defaultdict, Counter, OrderedDict, namedtuple
 from datetime import datetime, timezone
+from root_cause_analyzer import RootCauseEngine
+
+# compact structured form of a detected bug; log_index is the record's 1-based number in the
+# replay (the same log_index the debug output uses), not a byte offset into its file
+BugRecord = namedtuple("BugRecord", "type service ts correlation_id log_index")
+
+ERROR_LEVELS = ("ERROR", "EXCEPTION", "ERR")
+EVICTED_LARGEST = 20                    # evicted flows listed in sampling_report()
+FLOW_SIZE_BUCKETS = ((1, "1"), (5, "2-5"), (20, "6-20"), (100, "21-100"), (None, ">100"))
+
+
+def correlation_id(record):
+    return record.get("correlationId") or record.get("correlation_id") or record.get("traceId")
+
+
+def error_text(svc, ts, msg):
+    return f"[ERROR] {svc} at {ts.isoformat()} -> {msg}"
+
+
+def timeout_text(gap, ts, threshold):
+    return f"[TIMEOUT] gap {gap:.1f}s at {ts.isoformat()} (th={threshold}s)"
 
 class BugDetector:
     """
@@ -8,49 +31,164 @@ class BugDetector:
      - error/exception events
      - timeout gaps between events (threshold seconds)
      - collect correlation flows (per request id)
+
+    By default everything is kept in memory. Setting any of the caps turns on
+    bounded mode:
+     - max_flows / flow_idle_timeout: correlation flows are evicted LRU, or
+       once they've been idle that long in event time; evicted flows are
+       written to `spill_path` (JSONL) if given, and always summarised in
+       memory (counts by source and size, the largest few)
+     - max_flow_events: events kept per flow, the rest are only counted
+     - max_bug_samples: the first N bug strings kept per (kind, service);
+       counts stay exact
+    error_summary() is exact in both modes; sampling_report() says what was cut.
+    A flow that comes back after being evicted is opened (and counted) again.
+
+    Every bug is also kept as a BugRecord next to its string, and failures
+    feed a RootCauseEngine as they are seen (root_cause_report()).
     """
-    def __init__(self, timeout_threshold=5):
+    def __init__(self, timeout_threshold=5, max_flows=None, flow_idle_timeout=None,
+                 max_flow_events=None, max_bug_samples=None, spill_path=None):
         self.timeout_threshold = timeout_threshold
         self.last_ts = None
         self.error_counts = Counter()
         self.event_counts = Counter()
         self.detected_bugs = []          # list[str]
-        self.correlation_flows = defaultdict(list)
+        self.bug_records = []            # list[BugRecord], same sampling as detected_bugs
+        self.root_causes = RootCauseEngine()
+        self.max_flows = max_flows
+        self.flow_idle_timeout = flow_idle_timeout
+        self.max_flow_events = max_flow_events
+        self.max_bug_samples = max_bug_samples
+        self.spill_path = spill_path
+        self.bounded = any(v is not None for v in (max_flows, flow_idle_timeout, max_flow_events, max_bug_samples))
+        if self.bounded:
+            self.correlation_flows = OrderedDict()   # LRU: least recently active first
+        else:
+            self.correlation_flows = defaultdict(list)
+        self._flow_last = {}             # corr -> ts of its latest event (bounded mode)
+        self._flow_dropped = Counter()   # corr -> events not kept (bounded mode)
+        self.bug_counts = Counter()      # (kind, service) -> count
+        self.correlated_events = 0
+        self.flow_events_dropped = 0
+        self.flows_opened = 0
+        self.flows_evicted = 0
+        self.evicted_events = 0
+        self.evicted_sources = Counter()     # source -> evicted flows it took part in
+        self.evicted_sizes = Counter()       # FLOW_SIZE_BUCKETS label -> evicted flows
+        self.evicted_max_seconds = 0.0
+        self._evicted_largest = []           # min-heap (events, n, summary)
+        self._spill = None
 
-    def analyze(self, ts, record):
+    def analyze(self, ts, record, log_index=None):
         """
         ts : datetime (UTC)
         record : dict (parsed JSON log)
+        log_index : number of the record in the replay (kept in bug records)
         returns: list of bug strings detected for this record
         """
         bugs = []
         self.event_counts[record.get("source","unknown")] += 1
+        corr = correlation_id(record)
 
         level = str(record.get("level","")).upper()
-        if level in ("ERROR","EXCEPTION","ERR"):
+        if level in ERROR_LEVELS:
             svc = record.get("source","unknown")
             self.error_counts[svc] += 1
-            msg = record.get("message","")
-            s = f"[ERROR] {svc} at {ts.isoformat()} -> {msg}"
+            s = error_text(svc, ts, record.get("message",""))
             bugs.append(s)
-            self.detected_bugs.append(s)
+            self._record_bug(BugRecord("ERROR", svc, ts, corr, log_index), s)
+            self.root_causes.observe_failure(svc, corr)
 
         # timeout gap
         if self.last_ts:
             gap = (ts - self.last_ts).total_seconds()
             if gap > self.timeout_threshold:
-                s = f"[TIMEOUT] gap {gap:.1f}s at {ts.isoformat()} (th={self.timeout_threshold}s)"
+                s = timeout_text(gap, ts, self.timeout_threshold)
                 bugs.append(s)
-                self.detected_bugs.append(s)
+                self._record_bug(BugRecord("TIMEOUT", None, ts, corr, log_index), s)
 
         # correlation id capture
-        corr = record.get("correlationId") or record.get("correlation_id") or record.get("traceId")
         if corr:
-            self.correlation_flows[corr].append({"ts": ts.isoformat(), "source": record.get("source"), "message": record.get("message")})
+            self.correlated_events += 1
+            event = {"ts": ts.isoformat(), "source": record.get("source"), "message": record.get("message")}
+            if self.bounded:
+                self._track_flow(corr, ts, event)
+            else:
+                if corr not in self.correlation_flows:
+                    self.flows_opened += 1
+                self.correlation_flows[corr].append(event)
 
         self.last_ts = ts
         return bugs
 
+    def _record_bug(self, rec, s):
+        key = (rec.type, rec.service)
+        self.bug_counts[key] += 1
+        if self.max_bug_samples is None or self.bug_counts[key] <= self.max_bug_samples:
+            self.detected_bugs.append(s)
+            self.bug_records.append(rec)
+
+    def _track_flow(self, corr, ts, event):
+        flows = self.correlation_flows
+        flow = flows.get(corr)
+        if flow is None:
+            flow = flows[corr] = []
+            self.flows_opened += 1
+        else:
+            flows.move_to_end(corr)
+        if self.max_flow_events is None or len(flow) < self.max_flow_events:
+            flow.append(event)
+        else:
+            self._flow_dropped[corr] += 1
+            self.flow_events_dropped += 1
+        self._flow_last[corr] = ts
+        # evict idle flows (event time), then least recently active ones over the cap
+        if self.flow_idle_timeout is not None:
+            while flows:
+                oldest = next(iter(flows))
+                if (ts - self._flow_last[oldest]).total_seconds() <= self.flow_idle_timeout:
+                    break
+                self._evict(oldest)
+        if self.max_flows is not None:
+            while len(flows) > self.max_flows:
+                self._evict(next(iter(flows)))
+
+    def _evict(self, corr):
+        flow = self.correlation_flows.pop(corr)
+        last = self._flow_last.pop(corr)
+        dropped = self._flow_dropped.pop(corr, 0)
+        self.flows_evicted += 1
+        events = len(flow) + dropped
+        summary = {
+            "correlation_id": corr,
+            "events": events,
+            "dropped_events": dropped,
+            "first_ts": flow[0]["ts"] if flow else None,
+            "last_ts": last.isoformat(),
+            "sources": sorted({str(e["source"]) for e in flow}),
+        }
+        self.evicted_events += events
+        self.evicted_sources.update(summary["sources"])
+        self.evicted_sizes[next(label for top, label in FLOW_SIZE_BUCKETS if top is None or events <= top)] += 1
+        if flow:
+            seconds = (last - datetime.fromisoformat(flow[0]["ts"])).total_seconds()
+            self.evicted_max_seconds = max(self.evicted_max_seconds, seconds)
+        item = (events, self.flows_evicted, summary)
+        if len(self._evicted_largest) < EVICTED_LARGEST:
+            heapq.heappush(self._evicted_largest, item)
+        elif item[0] > self._evicted_largest[0][0]:
+            heapq.heapreplace(self._evicted_largest, item)
+        if self.spill_path:
+            if self._spill is None:
+                self._spill = open(self.spill_path, 'a', encoding='utf-8')
+            self._spill.write(json.dumps(dict(summary, flow=flow), ensure_ascii=False) + "\n")
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
     def error_summary(self):
         return {
             "total_events": sum(self.event_counts.values()),
@@ -64,3 +202,37 @@ class BugDetector:
 
     def get_detected_bugs(self):
         return list(self.detected_bugs)
+
+    def get_bug_records(self):
+        return [dict(r._asdict(), ts=r.ts.isoformat()) for r in self.bug_records]
+
+    def root_cause_report(self, top=10):
+        return self.root_causes.report(top)
+
+    def sampling_report(self):
+        """What the reports contain versus what was seen (all exact counts)."""
+        bugs_total = sum(self.bug_counts.values())
+        return {
+            "bounded": self.bounded,
+            "bugs_total": bugs_total,
+            "bugs_sampled": len(self.detected_bugs),
+            "bugs_by_kind": {f"{k}:{s}" if s else k: n for (k, s), n in self.bug_counts.items()},
+            "correlated_events": self.correlated_events,
+            "flows_opened": self.flows_opened,
+            "flows_in_report": len(self.correlation_flows),
+            "flows_evicted": self.flows_evicted,
+            "flow_events_dropped": self.flow_events_dropped,
+            "evicted_flows": {
+                "events": self.evicted_events,
+                "by_source": dict(self.evicted_sources.most_common()),
+                "by_size": {label: self.evicted_sizes[label] for _top, label in FLOW_SIZE_BUCKETS
+                            if self.evicted_sizes[label]},
+                "max_seconds": self.evicted_max_seconds,
+                "largest": [s for _n, _i, s in sorted(self._evicted_largest, key=lambda x: (-x[0], x[1]))],
+            } if self.flows_evicted else None,
+            "bug_samples": f"first {self.max_bug_samples} per kind and service"
+                           if self.max_bug_samples is not None else "all",
+            "spill_file": self.spill_path if self.flows_evicted and self.spill_path else None,
+            "sampled": bugs_total != len(self.detected_bugs) or self.flows_evicted > 0
+                       or self.flow_events_dropped > 0,
+        }
@@ -0,0 +1,194 @@
+# app/checkpoint_journal.py
+"""
+Append-only checkpoint journal.
+
+The checkpoint state ({file: offset}) lives in two places:
+  <path>          a snapshot, same JSON format as the old replay.checkpoint.json
+  <path>.journal  one line per save with only the offsets that changed
+
+Each journal line is "<crc32 hex> <compact json>\\n"; a line that is cut short
+or fails its checksum (a torn write from a crash) ends the replay of the
+journal. Once `compact_every` records have been appended the journal is
+rotated to <path>.journal.old and a background thread folds everything into
+a new snapshot. Records hold absolute offsets, so replaying a journal over a
+snapshot that already contains it is harmless.
+"""
+import fcntl
+import json
+import os
+import sys
+import threading
+import zlib
+
+
+def _encode(record):
+    payload = json.dumps(record, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return b'%08x %s\n' % (zlib.crc32(payload), payload)
+
+
+def _replay_journal(path, state):
+    """Apply the valid records of a journal file to `state`. Returns the byte length of the valid prefix."""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return 0
+    good = 0
+    for line in data.split(b'\n')[:-1]:  # the last element never ends with a newline
+        try:
+            crc, payload = line.split(b' ', 1)
+            if int(crc, 16) != zlib.crc32(payload):
+                break
+            record = json.loads(payload)
+        except ValueError:
+            break
+        state.update(record.get('o', {}))
+        for k in record.get('d', []):
+            state.pop(k, None)
+        good += len(line) + 1
+    return good
+
+
+def _read_snapshot(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (json.JSONDecodeError, IOError):
+        return {}
+
+
+def load_state(path):
+    """Latest checkpoint state: snapshot + rotated journal + live journal."""
+    state = _read_snapshot(path)
+    _replay_journal(path + '.journal.old', state)
+    _replay_journal(path + '.journal', state)
+    return state
+
+
+def write_snapshot(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    try:
+        dfd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(dfd)
+        finally:
+            os.close(dfd)
+    except OSError:
+        pass
+
+
+class CheckpointJournal:
+    def __init__(self, path, fsync_every=10, compact_every=1000):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.old_path = path + '.journal.old'
+        self.fsync_every = max(1, int(fsync_every))
+        self.compact_every = max(1, int(compact_every))
+        self._lock = threading.Lock()
+        self._compactor = None
+        self.appends = 0
+        self.fsyncs = 0
+        self.compactions = 0
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._last = load_state(path)
+        if os.path.exists(self.journal_path) or os.path.exists(self.old_path):
+            # start from a clean snapshot; also drops any torn tail
+            write_snapshot(path, self._last)
+            self._remove(self.old_path)
+            self._remove(self.journal_path)
+        self._f = open(self.journal_path, 'ab')
+        self._since_fsync = 0
+        self._since_compact = 0
+
+    @property
+    def state(self):
+        return dict(self._last)
+
+    def save(self, data):
+        """Append the offsets in `data` that changed since the last save."""
+        with self._lock:
+            changed = {k: v for k, v in data.items() if self._last.get(k) != v}
+            removed = [k for k in self._last if k not in data]
+            if not changed and not removed:
+                return
+            record = {'o': changed}
+            if removed:
+                record['d'] = removed
+            fd = self._f.fileno()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                self._f.write(_encode(record))
+                self._f.flush()
+                self._since_fsync += 1
+                if self._since_fsync >= self.fsync_every:
+                    os.fsync(fd)
+                    self.fsyncs += 1
+                    self._since_fsync = 0
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._last.update(changed)
+            for k in removed:
+                del self._last[k]
+            self.appends += 1
+            self._since_compact += 1
+            if self._since_compact >= self.compact_every and self._compactor is None:
+                self._start_compaction()
+
+    def _start_compaction(self):
+        # called with the lock held: rotate the journal, snapshot in the background
+        os.fsync(self._f.fileno())
+        self._f.close()
+        os.replace(self.journal_path, self.old_path)
+        self._f = open(self.journal_path, 'ab')
+        self._since_fsync = 0
+        self._since_compact = 0
+        snapshot = dict(self._last)
+        self._compactor = threading.Thread(target=self._compact, args=(snapshot,),
+                                           name='checkpoint-compactor', daemon=True)
+        self._compactor.start()
+
+    def _compact(self, snapshot):
+        try:
+            write_snapshot(self.path, snapshot)
+            self._remove(self.old_path)
+            self.compactions += 1
+        except (IOError, OSError) as e:
+            print(f"[ERROR] Failed to compact checkpoint journal: {e}", file=sys.stderr)
+        finally:
+            with self._lock:
+                self._compactor = None
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """fsync, fold everything into the snapshot and remove the journal."""
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            try:
+                self._f.flush()
+                os.fsync(self._f.fileno())
+                write_snapshot(self.path, self._last)
+                self._remove(self.old_path)
+                self._f.close()
+                self._remove(self.journal_path)
+            except (IOError, OSError) as e:
+                print(f"[ERROR] Failed to save checkpoint: {e}", file=sys.stderr)
+
+    def stats(self):
+        return {"appends": self.appends, "fsyncs": self.fsyncs, "compactions": self.compactions,
+                "tracked_files": len(self._last)}
@@ -0,0 +1,300 @@
+# app/compressed_input.py
+"""
+Streaming reads of .gz, .bz2 and .zst log files.
+
+log_reader.iter_lines() sends files with one of these extensions here. Offsets
+are positions in the decompressed data, so checkpoints, time windows and
+errlog entries mean the same thing as for plain files.
+
+Resuming needs a place to restart decompression. Every gzip member, bz2
+stream or zstd frame starts a fresh decompressor, so the member starts seen
+while reading are recorded (compressed offset, decompressed offset), at most
+one per `min_spacing` decompressed bytes, in a .zidx.json sidecar in the
+index dir. A restart seeks to the last member at or before the checkpoint
+and decompresses only from there. A file written as one member (plain
+`gzip`) is decompressed from the start and the skipped part thrown away;
+compress_file() below, `pigz -i` or `bgzip` write files with many members.
+
+Decompression runs on a prefetch thread, a few chunks ahead of the parser
+(zlib, bz2 and zstandard release the GIL while they work), so with several
+compressed files each one decompresses alongside the parsing. .zst needs
+the optional zstandard module.
+"""
+import bz2
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = {'.gz': 'gzip', '.bz2': 'bz2', '.zst': 'zstd'}
+INDEX_VERSION = 1
+HEAD_BYTES = 4096
+MIN_SPACING = 4 << 20
+PREFETCH_CHUNKS = 4
+
+_index_dir = None
+_min_spacing = MIN_SPACING
+
+
+def codec_for(path):
+    """'gzip', 'bz2', 'zstd' or None (plain file), from the file extension."""
+    return CODECS.get(os.path.splitext(path)[1].lower())
+
+
+def set_index_dir(index_dir, min_spacing=MIN_SPACING):
+    """Where seek index sidecars are kept (None: in memory only) and how far apart their points are."""
+    global _index_dir, _min_spacing
+    _index_dir = index_dir
+    _min_spacing = min_spacing
+
+
+def _decompressor(codec):
+    if codec == 'gzip':
+        return zlib.decompressobj(wbits=31)
+    if codec == 'bz2':
+        return bz2.BZ2Decompressor()
+    if zstandard is None:
+        raise IOError("reading .zst files needs the zstandard module")
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def _signature(path):
+    st = os.stat(path)
+    with open(path, 'rb') as f:
+        head = f.read(HEAD_BYTES)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "head_crc": zlib.crc32(head)}
+
+
+class SeekIndex:
+    """(compressed offset, decompressed offset) of member starts of one file."""
+    _memory = {}
+
+    def __init__(self, path, index_file, min_spacing=MIN_SPACING):
+        self.path = path
+        self.index_file = index_file
+        self.min_spacing = min_spacing
+        self.points = [(0, 0)]
+        self.size = None            # decompressed size, once read to the end
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path, index_dir=None, min_spacing=MIN_SPACING):
+        if index_dir is None:
+            idx = cls._memory.get(os.path.abspath(path))
+            if idx is None or idx._sig != _signature(path):
+                idx = cls._memory[os.path.abspath(path)] = cls(path, None, min_spacing)
+                idx._sig = _signature(path)
+            return idx
+        key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+        idx = cls(path, os.path.join(index_dir, f"{key}-{os.path.basename(path)}.zidx.json"), min_spacing)
+        try:
+            with open(idx.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return idx
+        sig = _signature(path)
+        if data.get("version") != INDEX_VERSION or data.get("head_crc") != sig["head_crc"] \
+                or data.get("compressed_size", 0) > sig["size"]:
+            print(f"[INFO] seek index for {path} is stale, rebuilding", file=sys.stderr)
+            return idx
+        idx.points = [tuple(p) for p in data["points"]]
+        if data.get("compressed_size") == sig["size"]:
+            idx.size = data.get("size")   # unchanged; a file that grew (appended members) keeps its points
+        return idx
+
+    def start(self, offset):
+        """Latest seek point at or before decompressed `offset`."""
+        best = self.points[0]
+        for p in self.points:
+            if p[1] > offset:
+                break
+            best = p
+        return best
+
+    def add(self, c_off, u_off):
+        if u_off - self.points[-1][1] >= self.min_spacing and c_off > self.points[-1][0]:
+            self.points.append((c_off, u_off))
+            self._dirty = True
+
+    def finished(self, u_size):
+        if self.size != u_size:
+            self.size = u_size
+            self._dirty = True
+
+    def save(self):
+        if not self._dirty or self.index_file is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            sig = _signature(self.path)
+            tmp = self.index_file + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({"version": INDEX_VERSION, "head_crc": sig["head_crc"], "compressed_size": sig["size"],
+                           "size": self.size, "points": self.points}, f)
+            os.replace(tmp, self.index_file)
+            self._dirty = False
+        except (IOError, OSError) as e:
+            print(f"[ERROR] Failed to save seek index for {self.path}: {e}", file=sys.stderr)
+
+
+def _decompressed(path, codec, index, c_off, u_off, chunk_size, stats):
+    """Decompressed chunks from seek point (c_off, u_off) to the end of the file."""
+    clock = time.perf_counter
+    with open(path, 'rb') as f:
+        f.seek(c_off)
+        d = None                # None: between members
+        pos = c_off
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                if d is None:
+                    index.finished(u_off)
+                else:
+                    print(f"[ERROR] {path} ends inside a compressed member", file=sys.stderr)
+                return
+            pos += len(data)
+            if stats is not None:
+                stats.compressed_bytes += len(data)
+            while data:
+                if d is None:
+                    data = data.lstrip(b'\0')   # padding after a member; no format starts with 0
+                    if not data:
+                        break
+                    if pos - len(data) != c_off:
+                        index.add(pos - len(data), u_off)
+                    d = _decompressor(codec)
+                t0 = clock()
+                try:
+                    out = d.decompress(data)
+                except (zlib.error, OSError, EOFError, ValueError) as e:
+                    raise IOError(f"corrupt {codec} data in {path} near byte {pos - len(data)}: {e}")
+                if stats is not None:
+                    stats.decompress_seconds += clock() - t0
+                if out:
+                    yield out
+                    u_off += len(out)
+                if not d.eof:
+                    break
+                data = d.unused_data
+                d = None
+
+
+def _prefetch(chunks, depth=PREFETCH_CHUNKS):
+    """Run the `chunks` generator on a thread, at most `depth` chunks ahead."""
+    q = queue.Queue(depth)
+    stop = threading.Event()
+
+    def put(item):
+        # gives up once the reader has gone away
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run():
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+            put(None)
+        except BaseException as e:
+            put(e)
+        finally:
+            chunks.close()
+
+    t = threading.Thread(target=run, name='decompress', daemon=True)
+    t.start()
+    try:
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        t.join()
+
+
+def compressed_chunks(path, codec, offset, chunk_size, stats=None, stop=None, prefetch=True):
+    """Decompressed bytes of `path` from decompressed `offset` (up to `stop`), in chunks."""
+    index = SeekIndex.load(path, _index_dir, _min_spacing)
+    c_off, u_off = index.start(offset)
+    # compressed reads are smaller: a chunk inflates several times over
+    gen = _decompressed(path, codec, index, c_off, u_off, max(4096, chunk_size // 4), stats)
+    if prefetch:
+        gen = _prefetch(gen)
+    pos = u_off
+    try:
+        for chunk in gen:
+            end = pos + len(chunk)
+            if end <= offset:
+                pos = end
+                continue
+            if pos < offset:
+                chunk = chunk[offset - pos:]
+                pos = offset
+            if stop is not None and pos + len(chunk) > stop:
+                chunk = chunk[:max(0, stop - pos)]
+                if chunk:
+                    yield chunk
+                return
+            yield chunk
+            pos += len(chunk)
+    finally:
+        gen.close()
+        index.save()
+
+
+def compress_file(src, dst, codec='gzip', member_bytes=MIN_SPACING, level=6):
+    """Compress `src` into `dst` as one member per `member_bytes` of input, cut at line ends."""
+    if codec == 'gzip':
+        import gzip
+        compress = lambda b: gzip.compress(b, compresslevel=level)
+    elif codec == 'bz2':
+        compress = lambda b: bz2.compress(b, level)
+    elif zstandard is not None:
+        compress = zstandard.ZstdCompressor(level=level).compress
+    else:
+        raise IOError("writing .zst files needs the zstandard module")
+    tail = b''
+    with open(src, 'rb') as fin, open(dst + '.tmp', 'wb') as fout:
+        while True:
+            data = fin.read(member_bytes)
+            if not data:
+                break
+            data = tail + data
+            cut = data.rfind(b'\n') + 1
+            if cut == 0:
+                tail = data
+                continue
+            tail = data[cut:]
+            fout.write(compress(data[:cut]))
+        if tail:
+            fout.write(compress(tail))
+    os.replace(dst + '.tmp', dst)
+
+
+if __name__ == '__main__':
+    import argparse
+    p = argparse.ArgumentParser(description='compress a log file into independently seekable members')
+    p.add_argument('src')
+    p.add_argument('dst', nargs='?', help='default: src + .gz/.bz2/.zst')
+    p.add_argument('--codec', choices=sorted(set(CODECS.values())), default='gzip')
+    p.add_argument('--member-mb', type=float, default=MIN_SPACING / (1 << 20))
+    a = p.parse_args()
+    ext = {v: k for k, v in CODECS.items()}[a.codec]
+    compress_file(a.src, a.dst or a.src + ext, a.codec, int(a.member_mb * (1 << 20)))
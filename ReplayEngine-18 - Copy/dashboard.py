@@ -1,19 +1,64 @@
 # app/dashboard.py
-import dash, dash_core_components as dcc, dash_html_components as html
+import dash
+from dash import dcc, html
 from dash.dependencies import Output, Input
-import json, os
+import json, os, threading
+from live_snapshot import LiveState
+
+LIVE_PATH = os.environ.get('REPLAY_LIVE', 'reports/replay_live.json')
+SUMMARY_PATH = os.environ.get('REPLAY_SUMMARY', 'reports/replay_summary.json')
+
+# one reader and one rendering per version, shared by every browser session
+live = LiveState(LIVE_PATH, min_interval=1.0)
+_lock = threading.Lock()
+_rendered = {"key": None, "children": None}
+
 app = dash.Dash(__name__)
 app.layout = html.Div([
     html.H2("Replay Engine Dashboard"),
-    dcc.Interval(id='interval', interval=5000),
+    dcc.Interval(id='interval', interval=2000),
     html.Div(id='content')
 ])
+
+
+def _table(header, rows):
+    return html.Table([html.Tr([html.Th(h) for h in header])] + [html.Tr([html.Td(c) for c in r]) for r in rows])
+
+
+def render_live(s):
+    counters = (f"{s['state']} | {s['events']:,} events ({s['events_per_sec']:,.1f}/s) | {s['errors']:,} errors | "
+                f"{s['bugs_total']:,} bugs | event time {s['watermark']} | {s['elapsed_seconds']:.0f}s")
+    services = _table(["service", "events", "errors", "events/s"],
+                      [(svc, f"{c['events']:,}", f"{c['errors']:,}", f"{c['events_per_sec']:,.1f}")
+                       for svc, c in s["services"].items()])
+    bugs = html.Ul([html.Li(f"#{b['log_index']} {b['bug']}") for b in reversed(s["bugs"])])
+    return html.Div([html.P(counters), html.H3("Services"), services, html.H3("Latest bugs"), bugs])
+
+
+def _summary():
+    """The end-of-run summary, for runs that did not publish live state; parsed again only when it changes."""
+    try:
+        mtime = os.stat(SUMMARY_PATH).st_mtime_ns
+    except OSError:
+        return None, None
+    return ("summary", mtime), lambda: html.Pre(json.dumps(json.load(open(SUMMARY_PATH)), indent=2))
+
+
 @app.callback(Output('content','children'), [Input('interval','n_intervals')])
 def update(_):
-    path = 'reports/replay_summary.json'
-    if not os.path.exists(path):
-        return html.Div("No summary yet. Run the replay.")
-    s = json.load(open(path))
-    return html.Pre(json.dumps(s, indent=2))
+    s = live.poll()
+    if s is not None:
+        key, render = (s["run"], s["version"]), lambda: render_live(s)
+    else:
+        key, render = _summary()
+        if key is None:
+            return html.Div("No summary yet. Run the replay.")
+    with _lock:
+        if _rendered["key"] != key:
+            _rendered["children"] = render()
+            _rendered["key"] = key
+        return _rendered["children"]
+
+
 if __name__=='__main__':
-    app.run_server(host='0.0.0.0', port=8050, debug=True)
+    app.run(host='0.0.0.0', port=8050, debug=True)
@@ -0,0 +1,386 @@
+# app/external_sort.py
+"""
+Ordering for input files that are not sorted by time.
+
+The k-way merge in ReplayEnhanced needs every file in time order. With
+--sort-mode, a pre-pass reads each file once and measures its disorder: how
+many records come after a later one and how far (in seconds) the worst of
+them is behind the newest record before it. The result is kept in a sidecar
+under --sort-dir and reused while the file is unchanged (same size, mtime
+and head checksum, like the time index sidecars). Then per file:
+
+  sorted            read as is
+  reorder           every record is at most --reorder-window seconds late and
+                    the reorder buffer would hold at most --reorder-max
+                    records: a heap re-sorts the stream on the fly
+  external          otherwise: sorted runs of at most --sort-memory MB are
+                    written to disk and k-way merged into a sorted copy of
+                    the file, which is replayed (and checkpointed) in its
+                    place
+
+In reorder mode the checkpoint offset is the start of the earliest record
+still held, so a restart may replay up to a window of records again but
+never skips one. Records later than the window are released at once and
+counted as late. Sorted copies keep the original lines; lines without a
+valid timestamp are logged to the errlog while sorting and left out. Ties
+keep file order.
+
+Sorted copies cover complete lines only (a last line without its newline
+waits, as in the column cache). When a file only grew (same head, no
+shorter), just the new tail is sorted and appended to its copy, so the
+checkpoint into the copy stays valid and the new records come after the
+ones already replayed, counted as out of order where they are older. A file
+that was already replayed from its copy keeps being read from it, and one
+already partly replayed as is isn't switched to a copy (it is reordered).
+"""
+import hashlib
+import heapq
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from datetime import timedelta
+
+from log_cache import to_ns
+from log_reader import DEFAULT_CHUNK_SIZE, iter_lines
+from timestamp_parser import parser_for, record_ts_value
+
+SORT_MODES = ('off', 'auto', 'reorder', 'external')
+SCAN_VERSION = 1
+HEAD_BYTES = 4096
+MERGE_FAN_IN = 64
+
+
+def _head_crc(path, n=HEAD_BYTES):
+    with open(path, 'rb') as f:
+        return zlib.crc32(f.read(n))
+
+
+def _sidecar(sort_dir, path, suffix):
+    key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(sort_dir, f"{key}-{os.path.basename(path)}{suffix}")
+
+
+def _signature(path):
+    st = os.stat(path)
+    head_len = min(st.st_size, HEAD_BYTES)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "head_len": head_len,
+            "head_crc": _head_crc(path, head_len)}
+
+
+def _read_sidecar(file):
+    try:
+        with open(file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) and data.get("version") == SCAN_VERSION else None
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _load_sidecar(file, path):
+    data = _read_sidecar(file)
+    try:
+        return data if data is not None and data.get("source") == _signature(path) else None
+    except OSError:
+        return None
+
+
+def _complete_end(path, start=0):
+    """Offset just past the last newline of `path` at or after `start` (or `start`)."""
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > start:
+            n = min(1 << 16, end - start)
+            f.seek(end - n)
+            i = f.read(n).rfind(b'\n')
+            if i >= 0:
+                return end - n + i + 1
+            end -= n
+    return start
+
+
+def _grown(meta, path, sorted_path):
+    """True if `path` only had lines appended since `meta` (a sorted copy's sidecar) was saved."""
+    src = meta.get("source") or {}
+    try:
+        return ("upto" in meta and os.path.getsize(path) >= src["size"]
+                and _head_crc(path, src["head_len"]) == src["head_crc"]
+                and os.path.getsize(sorted_path) == meta.get("bytes"))
+    except (KeyError, OSError):
+        return False
+
+
+def _save_sidecar(file, data):
+    tmp = file + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp, file)
+
+
+def _timed_lines(path, chunk_size, errlog=None, start=0, stop=None):
+    """(ts, line, start, end) for every line with a valid timestamp."""
+    ts_parser = parser_for(path)
+    for line, pos, end in iter_lines(path, start, chunk_size, stop=stop):
+        if not line.strip():
+            continue
+        try:
+            rec = json.loads(line.decode('utf-8', 'replace'))
+            ts = ts_parser.parse(record_ts_value(rec)) if isinstance(rec, dict) else None
+        except ValueError:
+            rec, ts = None, None
+        if not ts:
+            if errlog is not None:
+                errlog.write(json.dumps({"file": path, "offset": pos,
+                                         "err": "bad json" if rec is None else "bad ts"}) + "\n")
+            continue
+        yield ts, line, pos, end
+
+
+def scan_order(path, window, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    One pass over `path`: records, out_of_order (records older than one before
+    them), max_lateness_seconds and the peak size of a `window`-second
+    reorder buffer.
+    """
+    w = timedelta(seconds=window)
+    newest = None
+    records = late = peak = 0
+    max_late = timedelta(0)
+    held = []
+    for ts, _line, _pos, _end in _timed_lines(path, chunk_size):
+        records += 1
+        if newest is None or ts > newest:
+            newest = ts
+        elif ts < newest:
+            late += 1
+            max_late = max(max_late, newest - ts)
+        heapq.heappush(held, ts)
+        while held[0] <= newest - w:
+            heapq.heappop(held)
+        peak = max(peak, len(held))
+    return {"records": records, "out_of_order": late, "max_lateness_seconds": max_late.total_seconds(),
+            "reorder_peak": peak}
+
+
+class Reorder:
+    """Re-sorts a nearly sorted file_iter stream with a bounded heap; see the module docstring."""
+    def __init__(self, window, max_records):
+        self.window = timedelta(seconds=window)
+        self.max_records = max(1, int(max_records))
+        self.held_max = 0
+        self.late = 0
+        self.forced = 0
+
+    def __call__(self, it, offset):
+        heap = []              # (ts, n, rec, start offset)
+        starts = []            # (start offset, n) of held records, lowest first
+        released = set()
+        newest = last_out = None
+        last_end = offset
+        n = 0
+
+        def release():
+            nonlocal last_out
+            ts, k, rec, _start = heapq.heappop(heap)
+            released.add(k)
+            while starts and starts[0][1] in released:
+                released.discard(heapq.heappop(starts)[1])
+            if last_out is not None and ts < last_out:
+                self.late += 1
+            else:
+                last_out = ts
+            return ts, rec, starts[0][0] if starts else last_end
+
+        for ts, rec, end in it:
+            if ts is None:
+                last_end = end
+                if not heap:
+                    yield None, None, end
+                continue
+            n += 1
+            heapq.heappush(heap, (ts, n, rec, last_end))
+            heapq.heappush(starts, (last_end, n))
+            last_end = end
+            if newest is None or ts > newest:
+                newest = ts
+            self.held_max = max(self.held_max, len(heap))
+            while heap and heap[0][0] <= newest - self.window:
+                yield release()
+            while len(heap) > self.max_records:
+                self.forced += 1
+                yield release()
+        while heap:
+            yield release()
+
+    def stats(self):
+        return {"held_max": self.held_max, "late": self.late, "forced": self.forced}
+
+
+def external_sort(path, out_path, memory_bytes, chunk_size=DEFAULT_CHUNK_SIZE, errlog=None, tmp_dir=None,
+                  start=0, append=False):
+    """
+    Write the complete lines of `path` from `start` sorted by (time, offset) to
+    `out_path`, or append them to it. Returns sort stats; "upto" is where the
+    sorted lines end in `path`.
+    """
+    t0 = time.perf_counter()
+    stop = _complete_end(path, start)
+    work = tempfile.mkdtemp(prefix='sort-', dir=tmp_dir or os.path.dirname(out_path))
+    runs = []
+    buf = []
+    used = 0
+    records = 0
+
+    def spill():
+        buf.sort()
+        run = os.path.join(work, f"run{len(runs):05d}")
+        with open(run, 'wb', buffering=1 << 20) as f:
+            for ts_ns, pos, line in buf:
+                f.write(b'%d %d %s\n' % (ts_ns, pos, line))
+        runs.append(run)
+        buf.clear()
+
+    try:
+        for ts, line, pos, _end in _timed_lines(path, chunk_size, errlog, start, stop):
+            buf.append((to_ns(ts), pos, line))
+            used += len(line) + 100     # line + tuple/int overhead
+            records += 1
+            if used >= memory_bytes:
+                spill()
+                used = 0
+        if buf or not runs:
+            spill()
+        initial_runs = len(runs)
+        passes = 1
+        while len(runs) > MERGE_FAN_IN:
+            merged = []
+            for i in range(0, len(runs), MERGE_FAN_IN):
+                group = runs[i:i + MERGE_FAN_IN]
+                target = os.path.join(work, f"pass{passes}-{i // MERGE_FAN_IN:05d}")
+                _merge(group, target, keep_keys=True)
+                for r in group:
+                    os.remove(r)
+                merged.append(target)
+            runs = merged
+            passes += 1
+        tmp = out_path + '.tmp'
+        _merge(runs, tmp, keep_keys=False)
+        if append:
+            with open(tmp, 'rb') as src, open(out_path, 'ab') as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            os.remove(tmp)
+        else:
+            os.replace(tmp, out_path)
+    finally:
+        for name in os.listdir(work):
+            os.remove(os.path.join(work, name))
+        os.rmdir(work)
+    return {"records": records, "runs": initial_runs, "merge_passes": passes,
+            "seconds": round(time.perf_counter() - t0, 6), "upto": stop}
+
+
+def _run_lines(run):
+    with open(run, 'rb', buffering=1 << 20) as f:
+        for raw in f:
+            ts_ns, pos, line = raw.split(b' ', 2)
+            yield int(ts_ns), int(pos), line
+
+
+def _merge(runs, target, keep_keys):
+    with open(target, 'wb', buffering=1 << 20) as out:
+        for ts_ns, pos, line in heapq.merge(*(_run_lines(r) for r in runs)):
+            out.write(b'%d %d %s' % (ts_ns, pos, line) if keep_keys else line)
+
+
+class SortPlan:
+    """Decides, per file, how it is read (see the module docstring) and prepares sorted copies."""
+    def __init__(self, mode='auto', sort_dir='logs/.replay_sorted', window=5.0, max_records=100000,
+                 memory_mb=256, chunk_size=DEFAULT_CHUNK_SIZE):
+        if mode not in SORT_MODES:
+            raise ValueError(f"sort mode must be one of {SORT_MODES}")
+        self.mode = mode
+        self.sort_dir = sort_dir
+        self.window = window
+        self.max_records = max_records
+        self.memory_bytes = int(memory_mb * (1 << 20))
+        self.chunk_size = chunk_size
+        self.files = {}         # original path -> report
+        self.reorders = {}      # path read -> Reorder
+
+    def active(self):
+        return self.mode != 'off'
+
+    def prepare(self, files, checkpoint, errlog):
+        """Returns the paths to read, in the order of `files`; sorted copies replace unsorted files."""
+        os.makedirs(self.sort_dir, exist_ok=True)
+        out = []
+        for path in files:
+            try:
+                out.append(self._prepare(path, checkpoint, errlog))
+            except (IOError, OSError) as e:
+                print(f"[ERROR] could not order {path}, reading it as is: {e}", file=sys.stderr)
+                out.append(path)
+        return out
+
+    def _prepare(self, path, checkpoint, errlog):
+        scan_file = _sidecar(self.sort_dir, path, '.order.json')
+        data = _load_sidecar(scan_file, path)
+        t0 = time.perf_counter()
+        if data is None or data.get("window") != self.window:
+            data = {"version": SCAN_VERSION, "source": _signature(path), "window": self.window,
+                    "scan": scan_order(path, self.window, self.chunk_size)}
+            _save_sidecar(scan_file, data)
+            scanned = round(time.perf_counter() - t0, 6)
+        else:
+            scanned = None
+        scan = data["scan"]
+        if not scan["out_of_order"]:
+            decision = "sorted"
+        elif self.mode == 'reorder' or (self.mode == 'auto' and scan["max_lateness_seconds"] <= self.window
+                                        and scan["reorder_peak"] <= self.max_records):
+            decision = "reorder"
+        else:
+            decision = "external"
+        sorted_path = _sidecar(self.sort_dir, path, '.sorted')
+        meta_file = sorted_path + '.json'
+        meta = _load_sidecar(meta_file, path)
+        prev = _read_sidecar(meta_file) if meta is None else None
+        grown = prev is not None and _grown(prev, path, sorted_path)
+        # switching between the file and its copy would replay what was read from the other again
+        if decision != "external" and (meta is not None or grown) and checkpoint.get(sorted_path):
+            decision = "external"
+        elif decision == "external" and meta is None and not grown and checkpoint.get(path):
+            decision = "reorder"
+        report = {"decision": decision, "scan": scan, "scan_seconds": scanned, "read_from": path}
+        self.files[path] = report
+        if decision == "sorted":
+            return path
+        if decision == "reorder":
+            self.reorders[path] = Reorder(self.window, self.max_records)
+            return path
+        if meta is None or not os.path.exists(sorted_path):
+            if grown:
+                report["sort"] = external_sort(path, sorted_path, self.memory_bytes, self.chunk_size, errlog,
+                                               start=prev["upto"], append=True)
+                report["sort"]["extended_from"] = prev["upto"]
+            else:
+                if checkpoint.pop(sorted_path, None):
+                    print(f"[INFO] {path} changed, its sorted copy is rebuilt and replayed from the start",
+                          file=sys.stderr)
+                report["sort"] = external_sort(path, sorted_path, self.memory_bytes, self.chunk_size, errlog)
+            _save_sidecar(meta_file, {"version": SCAN_VERSION, "source": _signature(path), "sort": report["sort"],
+                                      "upto": report["sort"]["upto"], "bytes": os.path.getsize(sorted_path)})
+        else:
+            report["sort"] = dict(meta["sort"], reused=True)
+        report["read_from"] = sorted_path
+        return sorted_path
+
+    def stats(self):
+        out = {"mode": self.mode, "window_seconds": self.window, "files": dict(self.files)}
+        for path, r in self.reorders.items():
+            # a Reorder, or its stats() from a decode worker
+            out["files"][path]["reorder"] = r if isinstance(r, dict) else r.stats()
+        return out
@@ -1,19 +1,216 @@
 # app/fluentd_integration.py
+"""
+HTTP ingest into logs/events.log.
+
+Requests only parse and queue records; one background writer thread appends
+everything queued in a single write per batch (group commit), then flushes or
+fsyncs it as INGEST_DURABILITY says. The queue holds at most INGEST_QUEUE
+records; a request that doesn't fit is dropped with 503.
+
+Once events.log grows past INGEST_MAX_BYTES it is renamed to events.log.N,
+N one higher than any existing rotated file, so rotated names never change
+afterwards and ReplayEnhanced's events.log* glob picks them up. Replay
+checkpoints follow the renamed file by inode (log_follower.resume_offsets),
+so a replay resumed after a rotation neither repeats nor skips records.
+
+POST /ingest and /ingest/bulk take one JSON object, a JSON array of objects,
+or NDJSON. With ?wait=1 (or INGEST_WAIT=1) the response is sent only after
+the records are written. GET /stats returns the writer counters.
+"""
 from flask import Flask, request, jsonify
-import json, os, datetime
+import json, os, datetime, glob, re, sys, threading
+from output_writer import DURABILITY_LEVELS
 app = Flask(__name__)
-OUT = 'logs/events.log'
+OUT = os.environ.get('INGEST_OUT', 'logs/events.log')
+MAX_BYTES = int(os.environ.get('INGEST_MAX_BYTES', 64 << 20))
+MAX_QUEUE = int(os.environ.get('INGEST_QUEUE', 100000))
+DURABILITY = os.environ.get('INGEST_DURABILITY', 'flush')
+WAIT = os.environ.get('INGEST_WAIT', '0') == '1'
+WAIT_TIMEOUT = float(os.environ.get('INGEST_WAIT_TIMEOUT', 30))
 os.makedirs(os.path.dirname(OUT), exist_ok=True)
 
+
+class IngestWriter:
+    def __init__(self, path, max_bytes=MAX_BYTES, max_queue=MAX_QUEUE, durability=DURABILITY):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"durability must be one of {DURABILITY_LEVELS}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_queue = max_queue
+        self.durability = durability
+        self._cond = threading.Condition()
+        self._pending = []           # (data, records, ticket or None)
+        self._pending_records = 0
+        self._closing = False
+        self._f = open(path, 'ab')
+        self._size = self._f.tell()
+        self._next_n = self._last_rotated() + 1
+        self.counters = {"queued": 0, "written": 0, "dropped": 0, "failed": 0, "bytes": 0,
+                         "batches": 0, "fsyncs": 0, "rotations": 0, "rotation_failures": 0}
+        self._thread = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+        self._thread.start()
+
+    def _last_rotated(self):
+        pat = re.compile(re.escape(os.path.basename(self.path)) + r'\.(\d+)$')
+        ns = [int(m.group(1)) for p in glob.glob(glob.escape(self.path) + '.*')
+              for m in [pat.match(os.path.basename(p))] if m]
+        return max(ns, default=0)
+
+    def submit(self, lines, wait=False):
+        """
+        Queue serialized lines. Returns "queued", "written", "dropped" (queue
+        full), "failed" (write error) or "timeout" (still queued after waiting).
+        """
+        ticket = {"done": threading.Event(), "ok": None} if wait else None
+        with self._cond:
+            if self._pending_records + len(lines) > self.max_queue:
+                self.counters["dropped"] += len(lines)
+                return "dropped"
+            self._pending.append((''.join(lines).encode('utf-8'), len(lines), ticket))
+            self._pending_records += len(lines)
+            self.counters["queued"] += len(lines)
+            self._cond.notify()
+        if ticket is None:
+            return "queued"
+        if not ticket["done"].wait(WAIT_TIMEOUT):
+            return "timeout"
+        return "written" if ticket["ok"] else "failed"
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                batch, self._pending = self._pending, []
+                self._pending_records = 0
+                if not batch and self._closing:
+                    return
+            data = b''.join(d for d, _, _ in batch)
+            records = sum(n for _, n, _ in batch)
+            ok = True
+            try:
+                if self._f.closed:       # a failed rotation couldn't reopen it
+                    self._f = open(self.path, 'ab')
+                self._f.write(data)
+                if self.durability != 'none':
+                    self._f.flush()
+                if self.durability == 'fsync':
+                    os.fsync(self._f.fileno())
+                    self.counters["fsyncs"] += 1
+                self._size += len(data)
+                self.counters["written"] += records
+                self.counters["bytes"] += len(data)
+                self.counters["batches"] += 1
+            except (IOError, OSError) as e:
+                ok = False
+                self.counters["failed"] += records
+                print(f"[ERROR] ingest write failed: {e}", file=sys.stderr)
+            if ok and self._size >= self.max_bytes:
+                self._rotate()
+            for _, _, ticket in batch:
+                if ticket is not None:
+                    ticket["ok"] = ok
+                    ticket["done"].set()
+
+    def _rotate(self):
+        """Move the full file aside. On failure keep appending to it and retry after the next batch."""
+        try:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
+            os.rename(self.path, f"{self.path}.{self._next_n}")
+            self._next_n += 1
+            self._size = 0
+            self.counters["rotations"] += 1
+        except (IOError, OSError) as e:
+            self.counters["rotation_failures"] += 1
+            print(f"[ERROR] ingest rotation failed: {e}", file=sys.stderr)
+        try:
+            if self._f.closed:
+                self._f = open(self.path, 'ab')
+        except (IOError, OSError) as e:
+            print(f"[ERROR] ingest reopen failed: {e}", file=sys.stderr)
+
+    def stats(self):
+        with self._cond:
+            backlog = self._pending_records
+        return dict(self.counters, backlog=backlog, current_file_bytes=self._size,
+                    max_queue=self.max_queue, durability=self.durability)
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join()
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+
+
+writer = IngestWriter(OUT)
+
+
+def _parse_records():
+    """(records, rejected) from an object, an array of objects or NDJSON body."""
+    body = request.get_data()
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = None
+        records, rejected = [], 0
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                rejected += 1
+                continue
+            if isinstance(rec, dict):
+                records.append(rec)
+            else:
+                rejected += 1
+        return records, rejected
+    if isinstance(payload, dict):
+        return [payload], 0
+    if isinstance(payload, list):
+        records = [r for r in payload if isinstance(r, dict)]
+        return records, len(payload) - len(records)
+    return [], 1
+
+
 @app.route('/ingest', methods=['POST'])
+@app.route('/ingest/bulk', methods=['POST'])
 def ingest():
-    payload = request.get_json(silent=True)
-    if not payload:
-        return jsonify({'status':'error','reason':'invalid json'}), 400
-    payload['_received_at'] = datetime.datetime.utcnow().isoformat() + 'Z'
-    with open(OUT,'a', encoding='utf-8') as f:
-        f.write(json.dumps(payload, ensure_ascii=False) + "\\n")
-    return jsonify({'status':'ok'}), 201
+    records, rejected = _parse_records()
+    if not records:
+        return jsonify({'status':'error','reason':'invalid json', 'rejected': rejected}), 400
+    received = datetime.datetime.utcnow().isoformat() + 'Z'
+    lines = []
+    for payload in records:
+        payload['_received_at'] = received
+        lines.append(json.dumps(payload, ensure_ascii=False) + "\n")
+    wait = request.args.get('wait', '1' if WAIT else '0') == '1'
+    result = writer.submit(lines, wait)
+    if result == "dropped":
+        return jsonify({'status':'error','reason':'queue full'}), 503
+    if result == "failed":
+        return jsonify({'status':'error','reason':'write failed'}), 500
+    body = {'status':'ok'}
+    if request.path.endswith('/bulk') or len(records) > 1 or rejected:
+        body.update(accepted=len(records), rejected=rejected)
+    if result == "timeout":
+        body['status'] = 'queued'
+        return jsonify(body), 202
+    return jsonify(body), 201
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify(writer.stats()), 200
+
 
 if __name__=='__main__':
-    app.run(host='0.0.0.0', port=24224)
+    import atexit
+    atexit.register(writer.close)
+    app.run(host='0.0.0.0', port=24224, threaded=True)
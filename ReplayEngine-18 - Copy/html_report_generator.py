@@ -1,29 +1,197 @@
 import json
 import os
+import sys
 import html
+import random
+from datetime import datetime, timezone
 
-def simple_html_report(events, bugs, summary, corr, outfile):
+# bucket widths in seconds; each one divides the next so buckets can be merged
+BUCKET_LADDER = [1, 5, 10, 30, 60, 300, 900, 1800, 3600, 10800, 21600, 43200, 86400, 604800]
+
+
+def _is_error(level):
+    level = str(level or '').upper()
+    return level.startswith('ERR') or level == 'EXCEPTION'
+
+
+def _epoch(x):
+    try:
+        return datetime.fromisoformat(str(x).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+class TimelineAggregator:
+    """
+    One pass over the events: per-service counts and error counts in time
+    buckets, plus a sample of raw points. The bucket width starts at 1s and
+    moves up BUCKET_LADDER whenever there would be more than `max_buckets`
+    buckets. Non-error points are reservoir sampled down to `max_points`;
+    every error point is kept, unless `max_error_points` caps them (the
+    report then says how many were left out).
+    """
+    def __init__(self, max_buckets=300, max_points=2000, max_error_points=None, seed=0):
+        self.max_buckets = max_buckets
+        self.max_points = max_points
+        self.max_error_points = max_error_points
+        self.width_i = 0
+        self.buckets = {}        # bucket start -> {service: [events, errors]}
+        self.services = {}       # service -> [events, errors]
+        self.points = []
+        self.error_points = []
+        self.total = 0
+        self.errors = 0
+        self.seen_points = 0
+        self.unparsed = 0
+        self.min_t = self.max_t = None
+        self._rng = random.Random(seed)
+
+    @property
+    def width(self):
+        return BUCKET_LADDER[self.width_i]
+
+    def add(self, e):
+        self.total += 1
+        svc = e.get('y', 'unknown')
+        err = _is_error(e.get('level'))
+        self.errors += err
+        s = self.services.get(svc)
+        if s is None:
+            s = self.services[svc] = [0, 0]
+        s[0] += 1
+        s[1] += err
+        t = _epoch(e.get('x'))
+        if t is None:
+            self.unparsed += 1
+            return
+        self.min_t = t if self.min_t is None else min(self.min_t, t)
+        self.max_t = t if self.max_t is None else max(self.max_t, t)
+        # coarsen until the span fits, merging existing buckets
+        while (self.max_t - self.min_t) / self.width >= self.max_buckets and self.width_i < len(BUCKET_LADDER) - 1:
+            self._coarsen()
+        key = t - t % self.width
+        b = self.buckets.get(key)
+        if b is None:
+            b = self.buckets[key] = {}
+        c = b.get(svc)
+        if c is None:
+            c = b[svc] = [0, 0]
+        c[0] += 1
+        c[1] += err
+        point = {"x": e.get('x'), "s": svc, "level": e.get('level', 'INFO'),
+                 "event": e.get('event', ''), "message": e.get('message', '')}
+        if err:
+            if self.max_error_points is None or len(self.error_points) < self.max_error_points:
+                self.error_points.append(point)
+            return
+        self.seen_points += 1
+        if len(self.points) < self.max_points:
+            self.points.append(point)
+        else:
+            j = self._rng.randrange(self.seen_points)
+            if j < self.max_points:
+                self.points[j] = point
+
+    def _coarsen(self):
+        self.width_i += 1
+        w = self.width
+        merged = {}
+        for key, b in self.buckets.items():
+            m = merged.setdefault(key - key % w, {})
+            for svc, (n, ne) in b.items():
+                c = m.setdefault(svc, [0, 0])
+                c[0] += n
+                c[1] += ne
+        self.buckets = merged
+
+    def result(self):
+        services = sorted(self.services, key=str)
+        keys = sorted(self.buckets)
+        series = {}
+        for svc in services:
+            series[svc] = [self.buckets[k].get(svc, [0, 0])[0] for k in keys]
+        error_rate = []
+        for k in keys:
+            n = sum(c[0] for c in self.buckets[k].values())
+            ne = sum(c[1] for c in self.buckets[k].values())
+            error_rate.append(round(ne / n, 4) if n else 0)
+        pos = {svc: i for i, svc in enumerate(services)}
+        points = sorted(self.points + self.error_points, key=lambda p: str(p["x"]))
+        for p in points:
+            p["y"] = pos[p.pop("s")]
+        return {
+            "bucket_seconds": self.width,
+            "buckets": [datetime.fromtimestamp(k, timezone.utc).isoformat() for k in keys],
+            "services": services,
+            "series": series,
+            "error_rate": error_rate,
+            "per_service": {svc: {"events": self.services[svc][0], "errors": self.services[svc][1],
+                                  "error_rate": round(self.services[svc][1] / self.services[svc][0], 4)}
+                            for svc in services},
+            "points": points,
+            "total_events": self.total,
+            "total_errors": self.errors,
+            "sampled_points": len(self.points),
+            "error_points": len(self.error_points),
+            "errors_not_plotted": self.errors - len(self.error_points),
+            "unparsed_timestamps": self.unparsed,
+        }
+
+
+def _truncate_bugs(bugs, max_bugs):
+    bugs = list(bugs or [])
+    return bugs[:max_bugs], len(bugs)
+
+
+def _truncate_flows(corr, max_flows, max_flow_events):
+    corr = corr or {}
+    shown = {}
+    for i, (cid, flow) in enumerate(corr.items()):
+        if i >= max_flows:
+            break
+        flow = list(flow)
+        entry = flow[:max_flow_events]
+        if len(flow) > max_flow_events:
+            entry.append(f"... {len(flow) - max_flow_events} more events")
+        shown[cid] = entry
+    return shown, len(corr)
+
+
+def _shown(n, total, what):
+    if n < total:
+        return f'<p class="note">Showing {n} of {total} {what}; the full list is in the JSON reports.</p>'
+    return f'<p class="note">{total} {what}.</p>'
+
+
+def simple_html_report(events, bugs, summary, corr, outfile, max_buckets=300, max_points=2000,
+                       max_bugs=200, max_flows=100, max_flow_events=20, max_error_points=None):
     # Handle directory creation safely
     if os.path.dirname(outfile):
         os.makedirs(os.path.dirname(outfile), exist_ok=True)
-    
-    # Generate services and points
-    services = sorted({e['y'] for e in events}) if events else []
-    points = []
+
+    agg = TimelineAggregator(max_buckets=max_buckets, max_points=max_points, max_error_points=max_error_points)
     for e in events:
-        points.append({
-            "x": e['x'],
-            "y": services.index(e['y']) if services else 0,
-            "level": e.get('level', 'INFO'),
-            "event": e.get('event', ''),
-            "message": e.get('message', '')
-        })
-    
+        agg.add(e)
+    timeline = agg.result()
+    has_events = timeline["total_events"] > 0
+
+    bugs_shown, bugs_total = _truncate_bugs(bugs, max_bugs)
+    flows_shown, flows_total = _truncate_flows(corr, max_flows, max_flow_events)
+
     # Escape JSON for safe HTML rendering
     summary_json = html.escape(json.dumps(summary, indent=2, ensure_ascii=False))
-    bugs_json = html.escape(json.dumps(bugs, indent=2, ensure_ascii=False))
-    corr_json = html.escape(json.dumps(corr, indent=2, ensure_ascii=False))
-    
+    per_service_json = html.escape(json.dumps(timeline["per_service"], indent=2, ensure_ascii=False))
+    bugs_json = html.escape(json.dumps(bugs_shown, indent=2, ensure_ascii=False))
+    corr_json = html.escape(json.dumps(flows_shown, indent=2, ensure_ascii=False))
+    chart_data = json.dumps({k: timeline[k] for k in ("bucket_seconds", "buckets", "services", "series",
+                                                      "error_rate", "points")},
+                            ensure_ascii=False).replace('</', '<\\/')
+    points_note = (f'{timeline["sampled_points"]} sampled of {timeline["total_events"] - timeline["total_errors"]} '
+                   f'non-error events, {timeline["error_points"]} of {timeline["total_errors"]} error events')
+    if timeline["errors_not_plotted"]:
+        points_note += (f'. <b>{timeline["errors_not_plotted"]} error events are not plotted</b> (capped at '
+                        f'{max_error_points}); they are counted in the chart above and listed in the debug report')
+
     # Generate HTML with Chart.js and date adapter
     html_content = f"""
 <!doctype html>
@@ -34,56 +202,76 @@ def simple_html_report(events, bugs, summary, corr, outfile):
     <script src="https://cdn.jsdelivr.net/npm/chart.js@4"></script>
     <script src="https://cdn.jsdelivr.net/npm/chartjs-adapter-date-fns@3"></script>
     <style>
-        #timeline {{ width: 100%; max-width: 1000px; height: 300px; }}
+        .chart {{ width: 100%; max-width: 1000px; height: 300px; }}
+        .note {{ color: #666; font-size: 0.9em; }}
     </style>
 </head>
 <body>
     <h2>Replay Report Dashboard</h2>
-    {'<p>No events to display.</p>' if not events else '<canvas id="timeline"></canvas>'}
+    {'<p>No events to display.</p>' if not has_events else f'''
+    <h3>Events per {timeline["bucket_seconds"]}s by service</h3>
+    <canvas id="volume" class="chart"></canvas>
+    <h3>Events (sample)</h3>
+    <p class="note">{points_note}</p>
+    <canvas id="timeline" class="chart"></canvas>'''}
     <script>
-        const points = {json.dumps(points, ensure_ascii=False)};
-        const serviceLabels = {json.dumps(services, ensure_ascii=False)};
-        const data = {{
-            datasets: [{{
-                label: 'Events',
-                data: points.map(p => ({{
-                    x: p.x,
-                    y: p.y,
-                    level: p.level,
-                    event: p.event,
-                    message: p.message
-                }})),
-                pointRadius: 6,
-                pointBackgroundColor: points.map(p => 
-                    (p.level && p.level.toUpperCase && p.level.toUpperCase().startsWith('ERR')) ? 'red' : 
-                    (p.level && p.level.toUpperCase && p.level.toUpperCase() === 'INFO') ? 'green' : 'orange'
-                )
-            }}]
-        }};
-        const config = {{
-            type: 'scatter',
-            data: data,
-            options: {{
-                scales: {{
-                    x: {{
-                        type: 'time',
-                        time: {{ unit: 'second' }},
-                        title: {{ display: true, text: 'Time' }}
-                    }},
-                    y: {{
-                        ticks: {{ callback: function(v) {{ return serviceLabels[v] || ''; }} }},
-                        title: {{ display: true, text: 'Service' }}
+        const report = {chart_data};
+        function isErr(level) {{
+            level = (level || '').toUpperCase();
+            return level.startsWith('ERR') || level === 'EXCEPTION';
+        }}
+        function drawCharts() {{
+            const volume = {{
+                labels: report.buckets,
+                datasets: report.services.map(s => ({{ type: 'bar', label: s, data: report.series[s], stack: 'events' }}))
+                    .concat([{{ type: 'line', label: 'error rate', data: report.error_rate, yAxisID: 'rate',
+                               borderColor: 'red', pointRadius: 0 }}])
+            }};
+            new Chart(document.getElementById("volume"), {{
+                data: volume,
+                options: {{
+                    animation: false,
+                    scales: {{
+                        x: {{ type: 'time', stacked: true, title: {{ display: true, text: 'Time' }} }},
+                        y: {{ stacked: true, title: {{ display: true, text: 'Events' }} }},
+                        rate: {{ position: 'right', min: 0, max: 1, grid: {{ drawOnChartArea: false }} }}
+                    }}
+                }}
+            }});
+            new Chart(document.getElementById("timeline"), {{
+                type: 'scatter',
+                data: {{
+                    datasets: [{{
+                        label: 'Events',
+                        data: report.points,
+                        pointRadius: 4,
+                        pointBackgroundColor: report.points.map(p =>
+                            isErr(p.level) ? 'red' : ((p.level || '').toUpperCase() === 'INFO' ? 'green' : 'orange'))
+                    }}]
+                }},
+                options: {{
+                    animation: false,
+                    scales: {{
+                        x: {{ type: 'time', title: {{ display: true, text: 'Time' }} }},
+                        y: {{
+                            ticks: {{ stepSize: 1, callback: function(v) {{ return report.services[v] || ''; }} }},
+                            title: {{ display: true, text: 'Service' }}
+                        }}
                     }}
                 }}
-            }}
-        }};
-        {'new Chart(document.getElementById("timeline"), config);' if events else '// No chart data'}
+            }});
+        }}
+        {'drawCharts();' if has_events else '// No chart data'}
     </script>
     <h3>Summary</h3>
     <pre>{summary_json}</pre>
+    <h3>Per service</h3>
+    <pre>{per_service_json}</pre>
     <h3>Detected Bugs</h3>
+    {_shown(len(bugs_shown), bugs_total, 'detected bugs')}
     <pre>{bugs_json}</pre>
     <h3>Correlation Flows</h3>
+    {_shown(len(flows_shown), flows_total, 'correlation flows')}
     <pre>{corr_json}</pre>
 </body>
 </html>
@@ -93,4 +281,4 @@ def simple_html_report(events, bugs, summary, corr, outfile):
             f.write(html_content)
         print("[INFO] wrote", outfile)
     except IOError as e:
-        print(f"[ERROR] Failed to write {outfile}: {e}", file=sys.stderr)
\ No newline at end of file
+        print(f"[ERROR] Failed to write {outfile}: {e}", file=sys.stderr)
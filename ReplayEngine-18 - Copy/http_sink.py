@@ -0,0 +1,319 @@
+# app/http_sink.py
+"""
+Replay sink that POSTs records to an HTTP endpoint.
+
+An asyncio loop on a background thread runs `concurrency` workers, each with
+its own keep-alive HTTP/1.1 connection (so at most `concurrency` requests are
+in flight). With batch_size 1 every record is POSTed as one JSON object
+(what fluentd_integration's /ingest expects); with a larger batch_size
+workers send whatever is queued, up to batch_size records, as one NDJSON
+body. Failed requests (connection errors, timeouts, 429 and 5xx) are retried
+with exponential backoff, so delivery is at-least-once.
+
+send() blocks once `max_pending` records are unacknowledged, which pushes
+back into the replay loop. Records are numbered as they are sent and the
+ack watermark is the highest number up to which every record was
+acknowledged; barrier(callback) runs `callback` once the watermark covers
+everything sent before it. replay() saves checkpoints through it. Once a
+record has failed for good the watermark can't move again: pending barriers
+are dropped, later acknowledgements are only counted, and send() and
+barrier() raise IOError so the replay stops instead of running on without
+checkpoints.
+"""
+import asyncio
+import bisect
+import random
+import ssl
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from replay_scheduler import percentiles
+
+# upper bounds of the latency histogram buckets, in ms (last bucket is open)
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class HttpSink:
+    def __init__(self, url, concurrency=8, batch_size=1, max_pending=1000, retries=3, timeout=10.0,
+                 backoff=0.1, samples=100000):
+        u = urlsplit(url)
+        if u.scheme not in ('http', 'https') or not u.hostname:
+            raise ValueError(f"unsupported sink url: {url}")
+        self.url = url
+        self.host = u.hostname
+        self.port = u.port or (443 if u.scheme == 'https' else 80)
+        self.ssl = ssl.create_default_context() if u.scheme == 'https' else None
+        self.path = (u.path or '/') + (f"?{u.query}" if u.query else '')
+        self.host_header = u.netloc.rsplit('@', 1)[-1]
+        self.concurrency = max(1, int(concurrency))
+        self.batch_size = max(1, int(batch_size))
+        self.retries = max(0, int(retries))
+        self.timeout = timeout
+        self.backoff = backoff
+        self._slots = threading.BoundedSemaphore(max(1, int(max_pending)))
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._watermark = 0
+        self._finished = {}          # seq -> ok, for seqs above the watermark
+        self._blocked = False        # a record failed: the watermark stops there
+        self._settled = 0            # records finished after (or held back by) the failed one
+        self._barriers = []          # (seq, callback)
+        self._error = None
+        self._samples = samples
+        self._rng = random.Random(0)
+        self._lat_seen = 0
+        self.latencies = []
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.requests = 0
+        self.events_sent = 0
+        self.events_acked = 0
+        self.events_failed = 0
+        self.retried = 0
+        self.connects = 0
+        self.bytes = 0
+        self.backpressure_seconds = 0.0
+        self._t0 = time.perf_counter()
+        self._t_end = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='http-sink', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    # -- replay side ------------------------------------------------------
+
+    def send(self, body):
+        """Queue one serialized record (bytes or str); blocks while max_pending are unacknowledged."""
+        self._check()
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        if not self._slots.acquire(blocking=False):
+            t = time.perf_counter()
+            self._slots.acquire()
+            self.backpressure_seconds += time.perf_counter() - t
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (seq, body))
+
+    def barrier(self, callback):
+        """Run `callback` once every record sent so far has been acknowledged."""
+        self._check()
+        with self._lock:
+            if self._watermark >= self._seq:
+                run = True
+            else:
+                run = False
+                self._barriers.append((self._seq, callback))
+        if run:
+            callback()
+
+    def _check(self):
+        if self._error:
+            raise IOError(f"http sink failed: {self._error}")
+        if self._blocked:
+            raise IOError("http sink stopped: a record was not accepted (see the errors above)")
+
+    def close(self):
+        """Wait until every queued record is acknowledged or has failed. Returns True if none failed."""
+        if self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._stop)
+        self._thread.join()
+        self._t_end = time.perf_counter()
+        return not self._blocked and self._error is None
+
+    # -- sink thread ------------------------------------------------------
+
+    def _run(self):
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            self._error = e
+            print(f"[ERROR] http sink failed: {e}", file=sys.stderr)
+            self._ready.set()
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._ready.set()
+        await asyncio.gather(*workers)
+
+    def _stop(self):
+        for _ in range(self.concurrency):
+            self._queue.put_nowait(None)
+
+    async def _worker(self):
+        conn = None
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is None:
+                    return
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    if nxt is None:
+                        self._queue.put_nowait(None)
+                        break
+                    batch.append(nxt)
+                conn, ok = await self._deliver(conn, batch)
+                self._finish([s for s, _ in batch], ok)
+        finally:
+            if conn is not None:
+                conn[1].close()
+
+    async def _deliver(self, conn, batch):
+        if self.batch_size == 1:
+            body, ctype = batch[0][1], 'application/json'
+        else:
+            body, ctype = b''.join(b + b'\n' for _, b in batch), 'application/x-ndjson'
+        head = (f"POST {self.path} HTTP/1.1\r\nHost: {self.host_header}\r\n"
+                f"Content-Type: {ctype}\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: keep-alive\r\n\r\n").encode('latin-1')
+        self.events_sent += len(batch)
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                await asyncio.sleep(self.backoff * (2 ** (attempt - 1)))
+            try:
+                if conn is None:
+                    conn = await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=self.ssl),
+                                                  self.timeout)
+                    self.connects += 1
+                t = time.perf_counter()
+                status, keep = await asyncio.wait_for(self._exchange(conn, head + body), self.timeout)
+                self._record_latency(time.perf_counter() - t)
+                self.requests += 1
+                self.bytes += len(body)
+                if not keep:
+                    conn[1].close()
+                    conn = None
+                if 200 <= status < 300:
+                    return conn, True
+                if status != 429 and status < 500:
+                    print(f"[ERROR] sink rejected {len(batch)} records: HTTP {status}", file=sys.stderr)
+                    return conn, False
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                if conn is not None:
+                    conn[1].close()
+                    conn = None
+                if attempt == self.retries:
+                    print(f"[ERROR] sink request failed: {type(e).__name__}: {e}", file=sys.stderr)
+        return conn, False
+
+    async def _exchange(self, conn, request):
+        reader, writer = conn
+        writer.write(request)
+        await writer.drain()
+        while True:
+            status_line = await reader.readuntil(b'\r\n')
+            parts = status_line.split(None, 2)
+            if len(parts) < 2 or not parts[0].startswith(b'HTTP/'):
+                raise ValueError(f"bad status line {status_line!r}")
+            status = int(parts[1])
+            headers = await self._headers(reader)
+            if status >= 200:
+                break  # 1xx interim responses are followed by the real one
+        if status in (204, 304):
+            pass  # never has a body, whatever the headers say
+        elif 'chunked' in headers.get('transfer-encoding', '').lower():
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    await self._headers(reader)  # trailers, up to the blank line
+                    break
+                await reader.readexactly(size + 2)
+        elif 'content-length' in headers:
+            await reader.readexactly(int(headers['content-length']))
+        else:
+            await reader.read()  # body ends with the connection
+            return status, False
+        keep = headers.get('connection', '').lower() != 'close' and parts[0] != b'HTTP/1.0'
+        return status, keep
+
+    @staticmethod
+    async def _headers(reader):
+        headers = {}
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                return headers
+            k, _, v = line.decode('latin-1').partition(':')
+            headers[k.strip().lower()] = v.strip()
+
+    def _record_latency(self, seconds):
+        ms = seconds * 1000
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self._lat_seen += 1
+        if len(self.latencies) < self._samples:
+            self.latencies.append(seconds)
+        else:
+            j = self._rng.randrange(self._lat_seen)
+            if j < self._samples:
+                self.latencies[j] = seconds
+
+    def _finish(self, seqs, ok):
+        run = []
+        with self._lock:
+            if ok:
+                self.events_acked += len(seqs)
+            else:
+                self.events_failed += len(seqs)
+            if self._blocked:
+                self._settled += len(seqs)
+            else:
+                for s in seqs:
+                    self._finished[s] = ok
+                while not self._blocked and self._watermark + 1 in self._finished:
+                    if self._finished.pop(self._watermark + 1):
+                        self._watermark += 1
+                    else:
+                        self._blocked = True
+                if self._blocked:
+                    # nothing after the failed record can be checkpointed any more
+                    self._settled += 1 + len(self._finished)
+                    self._finished.clear()
+            while self._barriers and self._barriers[0][0] <= self._watermark:
+                run.append(self._barriers.pop(0)[1])
+            if self._blocked:
+                self._barriers.clear()
+        for _ in seqs:
+            self._slots.release()
+        for cb in run:
+            try:
+                cb()
+            except Exception as e:
+                print(f"[ERROR] sink barrier callback failed: {e}", file=sys.stderr)
+
+    def pending(self):
+        """Records sent but not yet acknowledged (or failed)."""
+        return self._seq - self._watermark - len(self._finished) - self._settled
+
+    def stats(self):
+        elapsed = (self._t_end or time.perf_counter()) - self._t0
+        hist = {f"le_{b:g}ms": n for b, n in zip(LATENCY_BUCKETS_MS, self.histogram)}
+        hist["inf"] = self.histogram[-1]
+        return {
+            "url": self.url,
+            "concurrency": self.concurrency,
+            "batch_size": self.batch_size,
+            "requests": self.requests,
+            "events_sent": self.events_sent,
+            "events_acked": self.events_acked,
+            "events_failed": self.events_failed,
+            "ack_watermark": self._watermark,
+            "retries": self.retried,
+            "connections": self.connects,
+            "bytes": self.bytes,
+            "elapsed_seconds": round(elapsed, 6),
+            "events_per_sec": round(self.events_acked / elapsed, 1) if elapsed > 0 else 0,
+            "requests_per_sec": round(self.requests / elapsed, 1) if elapsed > 0 else 0,
+            "backpressure_seconds": round(self.backpressure_seconds, 6),
+            "latency_ms": {k: round(v * 1000, 4) for k, v in percentiles(self.latencies).items()},
+            "latency_histogram": hist,
+        }
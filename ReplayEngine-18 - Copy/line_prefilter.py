@@ -0,0 +1,86 @@
+# app/line_prefilter.py
+"""
+Predicate pushdown for --level/--source/--start/--end.
+
+LinePrefilter looks at a raw line (bytes, before JSON decode) and rejects it
+only when it can't possibly match; anything it is unsure about is admitted and
+confirmed by the full decode + filter in replay(). So a rejected line would
+also have been dropped by the normal filters, never the other way round.
+
+timestamp() is the same cheap extraction on its own; file_iter uses it to
+keep the time index up to date over the lines the prefilter rejects.
+"""
+import re
+from timestamp_parser import TimestampParser
+
+# one top-level timestamp key with a plain string or numeric value
+_TS_RE = re.compile(rb'"(?:time|timestamp|@timestamp)"\s*:\s*(?:"([^"\\]*)"|(-?\d+(?:\.\d+)?))')
+_TS_KEY_RE = re.compile(rb'"(?:time|timestamp|@timestamp)"\s*:')
+
+
+def _needle(value):
+    """
+    Lower-cased JSON string token for an exact (case-insensitive) value match,
+    or None if the value could be written in more than one way in JSON.
+    """
+    if not value:
+        return None
+    v = value.lower()
+    if not v.isascii() or not v.isprintable() or '"' in v or '\\' in v:
+        return None
+    return b'"' + v.encode('ascii') + b'"'
+
+
+class LinePrefilter:
+    def __init__(self, level=None, source=None, start=None, end=None):
+        self.level = _needle(level)
+        self.source = _needle(source)
+        self.start = start
+        self.end = end
+        self._ts = TimestampParser()
+        self._window = bool(start or end)
+        self._last_line = None
+        self._last_ts = None
+        self.checked = 0
+        self.skipped = 0
+
+    def active(self):
+        return bool(self.level or self.source or self._window)
+
+    def timestamp(self, line):
+        """The line's timestamp if it can be read without a JSON decode, else None."""
+        if line is self._last_line:
+            return self._last_ts
+        ts = None
+        if len(_TS_KEY_RE.findall(line)) == 1:
+            m = _TS_RE.search(line)
+            if m:
+                raw = m.group(1)
+                if raw is not None:
+                    value = raw.decode('ascii', 'replace')
+                else:
+                    num = m.group(2)
+                    value = float(num) if b'.' in num else int(num)
+                ts = self._ts.parse(value) if value != "" else None
+        self._last_line, self._last_ts = line, ts
+        return ts
+
+    def admits(self, line):
+        """False only if `line` can't match the filters."""
+        self.checked += 1
+        if self.level or self.source:
+            # escapes or non-ascii could spell the value differently; let those through
+            if line.isascii() and b'\\u' not in line:
+                low = line.lower()
+                if (self.level and self.level not in low) or (self.source and self.source not in low):
+                    self.skipped += 1
+                    return False
+        if self._window:
+            ts = self.timestamp(line)
+            if ts is not None and ((self.start and ts < self.start) or (self.end and ts > self.end)):
+                self.skipped += 1
+                return False
+        return True
+
+    def stats(self):
+        return {"checked": self.checked, "skipped": self.skipped}
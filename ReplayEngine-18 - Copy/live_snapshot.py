@@ -0,0 +1,263 @@
+# app/live_snapshot.py
+"""
+Live, versioned state of a running replay for the dashboard.
+
+LiveSnapshotWriter (replay side) counts events, errors and bugs per service
+and, every `interval` seconds, appends one delta line to <path>.deltas.jsonl:
+
+  {"run", "v", "t", "state", "events", "errors", "bugs_total",
+   "services": {svc: [events, errors]}, "levels": {level: n},
+   "bugs": [latest new bugs], "watermark"}
+
+with the counts since the previous delta (version v - 1). Every
+`snapshot_every` versions, and at the start and the end of the run, the
+totals are also written to <path> (replaced atomically) together with the
+byte offset of the deltas file they cover, so a reader that joins late
+does not have to go through every delta.
+
+LiveState (dashboard side) loads the snapshot once per run and then only
+reads the deltas file from where it stopped, keeping the totals, per
+service rates over the last `window` seconds and the latest bugs. It is
+meant to be shared: polls within `min_interval` of each other return the
+cached state without touching the disk, so the cost of a refresh does not
+grow with the run or with the number of viewers.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from bug_detector import ERROR_LEVELS
+
+
+def deltas_path(path):
+    return path + '.deltas.jsonl'
+
+
+def _write_json(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+class LiveSnapshotWriter:
+    def __init__(self, path, interval=1.0, max_bugs=50, snapshot_every=10):
+        self.path = path
+        self.interval = interval
+        self.max_bugs = max(1, int(max_bugs))
+        self.snapshot_every = max(1, int(snapshot_every))
+        self.run = uuid.uuid4().hex[:12]
+        self.version = 0
+        self.t0 = time.monotonic()
+        self.due = self.t0 + interval
+        self.started = time.time()
+        self.events = self.errors = self.bugs_total = 0
+        self.services = {}          # svc -> [events, errors]
+        self.levels = {}
+        self.latest = deque(maxlen=self.max_bugs)
+        self._d_events = self._d_errors = self._d_bugs = 0
+        self._d_services = {}
+        self._d_levels = {}
+        self._d_new = deque(maxlen=self.max_bugs)
+        self._watermark = None
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        # deltas of an earlier run go first, so no reader pairs them with this run's snapshot
+        self._deltas = open(deltas_path(path), 'w', encoding='utf-8')
+        self._snapshot("running")
+
+    def observe(self, ts, rec, bugs, log_index):
+        """Count one replayed record and the bugs the detector found on it."""
+        self._d_events += 1
+        svc = rec.get("source") or "unknown"
+        level = str(rec.get("level", "")).upper()
+        c = self._d_services.get(svc)
+        if c is None:
+            c = self._d_services[svc] = [0, 0]
+        c[0] += 1
+        if level in ERROR_LEVELS:
+            c[1] += 1
+            self._d_errors += 1
+        self._d_levels[level] = self._d_levels.get(level, 0) + 1
+        if bugs:
+            self._d_bugs += len(bugs)
+            stamp = ts.isoformat()
+            for b in bugs:
+                self._d_new.append({"log_index": log_index, "ts": stamp, "source": svc, "bug": b})
+        self._watermark = ts
+
+    def publish(self, state="running"):
+        """Append the delta since the last publish; also rewrite the snapshot when due."""
+        now = time.monotonic()
+        self.due = now + self.interval
+        self.version += 1
+        wm = self._watermark.isoformat() if self._watermark else None
+        delta = {"run": self.run, "v": self.version, "t": round(now - self.t0, 3), "state": state,
+                 "events": self._d_events, "errors": self._d_errors, "bugs_total": self._d_bugs,
+                 "services": self._d_services, "levels": self._d_levels, "bugs": list(self._d_new),
+                 "watermark": wm}
+        self._deltas.write(json.dumps(delta, separators=(',', ':')) + "\n")
+        self._deltas.flush()
+        self.events += self._d_events
+        self.errors += self._d_errors
+        self.bugs_total += self._d_bugs
+        for svc, (n, e) in self._d_services.items():
+            c = self.services.setdefault(svc, [0, 0])
+            c[0] += n
+            c[1] += e
+        for level, n in self._d_levels.items():
+            self.levels[level] = self.levels.get(level, 0) + n
+        self.latest.extend(self._d_new)
+        self._d_events = self._d_errors = self._d_bugs = 0
+        self._d_services = {}
+        self._d_levels = {}
+        self._d_new.clear()
+        if state != "running" or self.version % self.snapshot_every == 0:
+            self._snapshot(state)
+
+    def _snapshot(self, state):
+        _write_json(self.path, {
+            "run": self.run, "version": self.version, "deltas_offset": self._deltas.tell(), "state": state,
+            "started": self.started, "t": round(time.monotonic() - self.t0, 3),
+            "events": self.events, "errors": self.errors, "bugs_total": self.bugs_total,
+            "services": self.services, "levels": self.levels, "bugs": list(self.latest),
+            "watermark": self._watermark.isoformat() if self._watermark else None})
+
+    def close(self, state="done"):
+        if self._deltas.closed:
+            return
+        self.publish(state)
+        self._deltas.close()
+
+
+class LiveState:
+    def __init__(self, path, min_interval=1.0, window=10.0, max_bugs=50):
+        self.path = path
+        self.min_interval = min_interval
+        self.window = window
+        self.max_bugs = max_bugs
+        self._lock = threading.Lock()
+        self._checked = None
+        self._snap_mtime = None
+        self._reset(None)
+        self.bytes_read = 0        # deltas bytes read over the reader's life
+
+    def _reset(self, snap):
+        snap = snap or {}
+        self.run = snap.get("run")
+        self.version = snap.get("version", 0)
+        self.offset = snap.get("deltas_offset", 0)
+        self.t = snap.get("t", 0.0)
+        self.state = snap.get("state")
+        self.started = snap.get("started")
+        self.events = snap.get("events", 0)
+        self.errors = snap.get("errors", 0)
+        self.bugs_total = snap.get("bugs_total", 0)
+        self.services = {svc: list(c) for svc, c in snap.get("services", {}).items()}
+        self.levels = dict(snap.get("levels", {}))
+        self.bugs = deque(snap.get("bugs", []), maxlen=self.max_bugs)
+        self.watermark = snap.get("watermark")
+        # (t, events, {svc: events}) of the recent deltas, for the rates
+        self._history = deque([(self.t, self.events, {s: c[0] for s, c in self.services.items()})])
+
+    def _load_snapshot(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._snap_mtime:
+            return True
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                snap = json.load(f)
+        except (IOError, ValueError):
+            return False        # being replaced; next poll
+        self._snap_mtime = mtime
+        # a newer snapshot of the run being followed adds nothing the deltas do not
+        if snap.get("run") != self.run:
+            self._reset(snap)
+        return True
+
+    def _apply(self, d):
+        self.version = d["v"]
+        self.t = d["t"]
+        self.state = d["state"]
+        self.events += d["events"]
+        self.errors += d["errors"]
+        self.bugs_total += d["bugs_total"]
+        for svc, (n, e) in d["services"].items():
+            c = self.services.setdefault(svc, [0, 0])
+            c[0] += n
+            c[1] += e
+        for level, n in d["levels"].items():
+            self.levels[level] = self.levels.get(level, 0) + n
+        self.bugs.extend(d["bugs"])
+        if d["watermark"]:
+            self.watermark = d["watermark"]
+        self._history.append((self.t, self.events, {s: c[0] for s, c in self.services.items()}))
+        while len(self._history) > 2 and self.t - self._history[1][0] >= self.window:
+            self._history.popleft()
+
+    def _read_deltas(self):
+        try:
+            with open(deltas_path(self.path), 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < self.offset:
+                    return False            # truncated: a new run started
+                f.seek(self.offset)
+                data = f.read()
+        except IOError:
+            return True
+        end = data.rfind(b"\n") + 1         # a half written last line waits for the next poll
+        for line in data[:end].splitlines():
+            try:
+                d = json.loads(line)
+            except ValueError:
+                return False
+            if d.get("run") != self.run or d.get("v", 0) > self.version + 1:
+                return False
+            if d["v"] == self.version + 1:     # older ones are in the snapshot already
+                self._apply(d)
+        self.offset += end
+        self.bytes_read += end
+        return True
+
+    def poll(self):
+        """Current state (see state()), reading only what was appended since the last poll."""
+        with self._lock:
+            now = time.monotonic()
+            if self._checked is not None and now - self._checked < self.min_interval:
+                return self.state_dict()
+            self._checked = now
+            if self._load_snapshot() and not self._read_deltas():
+                # out of step with the file (new run or a gap): start over from the snapshot
+                self._snap_mtime = None
+                self.run = None
+                if self._load_snapshot():
+                    self._read_deltas()
+            return self.state_dict()
+
+    def rates(self):
+        """Events per second overall and per service over the last `window` seconds."""
+        t0, e0, s0 = self._history[0]
+        dt = self.t - t0
+        if dt <= 0:
+            return 0.0, {}
+        return round((self.events - e0) / dt, 1), {svc: round((c[0] - s0.get(svc, 0)) / dt, 1)
+                                                   for svc, c in self.services.items()}
+
+    def state_dict(self):
+        if self.run is None:
+            return None
+        rate, per_service = self.rates()
+        return {"run": self.run, "version": self.version, "state": self.state, "started": self.started,
+                "elapsed_seconds": self.t, "events": self.events, "errors": self.errors,
+                "bugs_total": self.bugs_total, "events_per_sec": rate, "watermark": self.watermark,
+                "levels": dict(self.levels),
+                "services": {svc: {"events": c[0], "errors": c[1], "events_per_sec": per_service.get(svc, 0.0)}
+                             for svc, c in sorted(self.services.items())},
+                "bugs": list(self.bugs)}
@@ -0,0 +1,303 @@
+# app/log_cache.py
+"""
+Columnar cache of parsed log files.
+
+For every log file a directory under the cache dir holds one raw NumPy array
+per column (np.memmap-able) and a meta.json:
+
+  ts_ns   int64   event time, epoch nanoseconds (parsed once, see FLAG_BAD_TS)
+  level   int32   code into meta["dicts"]["level"]   (-1: missing)
+  source  int32   code into meta["dicts"]["source"]  (-1: missing)
+  corr    int32   code into meta["dicts"]["corr"]    (-1: missing)
+  offset  int64   byte offset of the line in the raw file
+  end     int64   byte offset just past the line's newline
+  flags   uint8   FLAG_* bits
+
+Only complete (newline-terminated) lines are cached. Like the time index
+sidecars, the cache remembers size, mtime and a checksum of the head of the
+file: a file that only grew is extended from where the cache stopped, one
+that shrank or was rewritten is cached again from scratch. Filters on time,
+level and source run on the arrays; raw records are read back by offset only
+for the rows a caller actually wants.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from log_reader import iter_lines
+from timestamp_parser import parser_for, record_ts_value
+
+CACHE_VERSION = 1
+HEAD_BYTES = 4096
+BUILD_BATCH = 100000
+
+FLAG_BAD_JSON = 1
+FLAG_BAD_TS = 2
+FLAG_TIMEOUT = 4   # message mentions "timeout" (used by replay_engine)
+
+NO_CODE = -1
+COLUMNS = (("ts_ns", "<i8"), ("level", "<i4"), ("source", "<i4"), ("corr", "<i4"),
+           ("offset", "<i8"), ("end", "<i8"), ("flags", "u1"))
+DICT_FIELDS = ("level", "source", "corr")
+CORRELATION_KEYS = ('request_id', 'correlationId', 'correlation_id', 'traceId')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+
+
+def to_ns(dt):
+    return (dt - EPOCH) // _US * 1000
+
+
+def from_ns(ns):
+    return EPOCH + timedelta(microseconds=int(ns) // 1000)
+
+
+def _head_crc(path, n=HEAD_BYTES):
+    with open(path, 'rb') as f:
+        return zlib.crc32(f.read(n))
+
+
+def cache_path(cache_dir, path):
+    key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{key}-{os.path.basename(path)}.cols")
+
+
+def _corr_value(rec):
+    for k in CORRELATION_KEYS:
+        v = rec.get(k)
+        if v:
+            return str(v)
+    return None
+
+
+class LogColumns:
+    def __init__(self, path, cache_dir):
+        self.path = path
+        self.dir = cache_path(cache_dir, path)
+        self.rows = 0
+        self.covered = 0        # every complete line before this offset is cached
+        self.dicts = {k: [] for k in DICT_FIELDS}
+        self._codes = None
+        self.rebuilt = False
+        self.reused_rows = 0
+        self.built_rows = 0
+        self.build_seconds = 0.0
+        self.fetched = 0
+
+    @classmethod
+    def open(cls, path, cache_dir, update=True):
+        """Load the cache for `path` (fresh if missing or stale); extend it to EOF if `update`."""
+        c = cls(path, cache_dir)
+        c._load()
+        if update:
+            c.update()
+        return c
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (IOError, ValueError):
+            return
+        try:
+            st = os.stat(self.path)
+            stale = (meta.get("version") != CACHE_VERSION
+                     or st.st_size < meta["covered"]
+                     or (st.st_size == meta["size"] and st.st_mtime_ns != meta["mtime_ns"])
+                     or _head_crc(self.path, meta["head_len"]) != meta["head_crc"])
+        except (OSError, KeyError):
+            stale = True
+        if stale:
+            self.rebuilt = True
+            print(f"[INFO] column cache for {self.path} is stale, rebuilding", file=sys.stderr)
+            shutil.rmtree(self.dir, ignore_errors=True)
+            return
+        self.rows = meta["rows"]
+        self.covered = meta["covered"]
+        self.dicts = meta["dicts"]
+        self.reused_rows = self.rows
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_codes'] = None
+        return state
+
+    # -- building ---------------------------------------------------------
+
+    def update(self):
+        """Parse and append the complete lines after `covered`."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size <= self.covered:
+            return
+        t0 = time.perf_counter()
+        os.makedirs(self.dir, exist_ok=True)
+        self._truncate_columns()
+        codes = self._code_maps()
+        ts_parser = parser_for(self.path)
+        buf = {name: [] for name, _ in COLUMNS}
+        added = 0
+        for line, pos, end in iter_lines(self.path, self.covered):
+            if end - pos == len(line):
+                break  # no newline yet: left for the next update
+            flags = 0
+            ts_ns = 0
+            level = source = corr = None
+            try:
+                rec = json.loads(line.decode('utf-8', 'replace'))
+                if not isinstance(rec, dict):
+                    raise ValueError("not an object")
+            except ValueError:
+                flags |= FLAG_BAD_JSON
+            else:
+                ts = ts_parser.parse(record_ts_value(rec))
+                if ts:
+                    ts_ns = to_ns(ts)
+                else:
+                    flags |= FLAG_BAD_TS
+                level, source, corr = rec.get('level'), rec.get('source'), _corr_value(rec)
+                msg = rec.get('message')
+                if isinstance(msg, str) and 'timeout' in msg.lower():
+                    flags |= FLAG_TIMEOUT
+            buf["ts_ns"].append(ts_ns)
+            buf["level"].append(self._code(codes, "level", level))
+            buf["source"].append(self._code(codes, "source", source))
+            buf["corr"].append(self._code(codes, "corr", corr))
+            buf["offset"].append(pos)
+            buf["end"].append(end)
+            buf["flags"].append(flags)
+            added += 1
+            if added % BUILD_BATCH == 0:
+                self._append(buf, end)
+        if buf["offset"]:
+            self._append(buf, buf["end"][-1])
+        self.built_rows += added
+        self.build_seconds += time.perf_counter() - t0
+
+    def _code_maps(self):
+        if self._codes is None:
+            self._codes = {k: {v: i for i, v in enumerate(self.dicts[k])} for k in DICT_FIELDS}
+        return self._codes
+
+    def _code(self, codes, field, value):
+        if value is None:
+            return NO_CODE
+        value = str(value)
+        c = codes[field].get(value)
+        if c is None:
+            c = codes[field][value] = len(self.dicts[field])
+            self.dicts[field].append(value)
+        return c
+
+    def _truncate_columns(self):
+        # columns may hold rows past meta["rows"] if a build was interrupted
+        for name, dtype in COLUMNS:
+            p = os.path.join(self.dir, name)
+            want = self.rows * np.dtype(dtype).itemsize
+            if os.path.exists(p) and os.path.getsize(p) != want:
+                with open(p, 'r+b') as f:
+                    f.truncate(want)
+
+    def _append(self, buf, covered):
+        n = len(buf["offset"])
+        for name, dtype in COLUMNS:
+            with open(os.path.join(self.dir, name), 'ab') as f:
+                np.asarray(buf[name], dtype=dtype).tofile(f)
+            buf[name] = []
+        self.rows += n
+        self.covered = covered
+        self._save_meta()
+
+    def _save_meta(self):
+        st = os.stat(self.path)
+        head_len = min(st.st_size, HEAD_BYTES)
+        meta = {
+            "version": CACHE_VERSION,
+            "path": self.path,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "head_len": head_len,
+            "head_crc": _head_crc(self.path, head_len),
+            "rows": self.rows,
+            "covered": self.covered,
+            "dicts": self.dicts,
+        }
+        tmp = os.path.join(self.dir, 'meta.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, separators=(',', ':'))
+        os.replace(tmp, os.path.join(self.dir, 'meta.json'))
+
+    # -- reading ----------------------------------------------------------
+
+    def columns(self):
+        """name -> read-only array of length `rows` (memory mapped)."""
+        cols = {}
+        for name, dtype in COLUMNS:
+            if self.rows:
+                cols[name] = np.memmap(os.path.join(self.dir, name), dtype=dtype, mode='r', shape=(self.rows,))
+            else:
+                cols[name] = np.zeros(0, dtype=dtype)
+        return cols
+
+    def codes_matching(self, field, value):
+        """Codes whose value equals `value`, ignoring case."""
+        value = str(value).lower()
+        return [i for i, v in enumerate(self.dicts[field]) if v.lower() == value]
+
+    def select(self, offset=0, start=None, end=None, level=None, source=None):
+        """
+        Row numbers at or after byte `offset` that pass the filters, in file
+        order. Rows that failed to parse always pass, so callers can report them.
+        """
+        cols = self.columns()
+        first = int(np.searchsorted(cols["offset"], offset, side='left'))
+        flags = cols["flags"][first:]
+        bad = (flags & (FLAG_BAD_JSON | FLAG_BAD_TS)) != 0
+        keep = np.ones(len(flags), dtype=bool)
+        ts = cols["ts_ns"][first:]
+        if start is not None:
+            keep &= ts >= to_ns(start)
+        if end is not None:
+            keep &= ts <= to_ns(end)
+        for field, value in (("level", level), ("source", source)):
+            if value:
+                keep &= np.isin(cols[field][first:], self.codes_matching(field, value))
+        return np.flatnonzero(keep | bad) + first
+
+    def read_line(self, f, offset, end):
+        """Raw bytes of one cached line from the open raw file `f`."""
+        if f.tell() != offset:
+            f.seek(offset)
+        self.fetched += 1
+        return f.read(end - offset)
+
+    def stats(self):
+        return {"rows": self.rows, "reused_rows": self.reused_rows, "built_rows": self.built_rows,
+                "build_seconds": round(self.build_seconds, 6), "records_fetched": self.fetched,
+                "rebuilt": self.rebuilt}
+
+
+_stats = {}
+
+
+def register_cache_stats(path, cache):
+    """Record the cache used for `path`: a LogColumns, or its stats() from a worker."""
+    _stats[path] = cache
+
+
+def cache_stats():
+    return {p: c if isinstance(c, dict) else c.stats() for p, c in _stats.items()}
+
+
+def reset_cache_stats():
+    _stats.clear()
@@ -0,0 +1,473 @@
+# app/log_follower.py
+"""
+--follow: keep replaying files that are still being written.
+
+LogFollower tracks every file matching the pattern by (device, inode), so a
+file renamed by rotation (events.log -> events.log.3) keeps being read from
+the same open handle until it is drained, and a new events.log is picked up
+as a new file. A file that shrinks below the read position was truncated in
+place and is read again from the start. Only complete lines are consumed; a
+partial last line is read again once its newline arrives.
+
+Wakeups come from inotify (through ctypes, on the directories the pattern
+covers) where available; otherwise the files are polled with an interval that
+starts at `poll_min` and doubles while nothing changes, up to `poll_max`.
+
+Lines from each file are queued in file order and merged on event time. A
+record is released once it is at or below the watermark:
+
+  watermark = max(min(last time read from each active file), newest time seen - lateness)
+
+Files with no new data for `idle` seconds don't hold the watermark back, and
+when every file is idle everything queued is released. So files advancing at
+different rates merge in order as long as they are at most `lateness` apart;
+records later than that are released at once and counted as late. Queued
+records are bounded by `max_buffered`.
+
+Checkpoint offsets only cover released (or skipped) lines, and are stored
+under the file name and under "inode:<dev>:<ino>", which is what a restart
+uses to find its place in files that were renamed in between.
+
+Compressed files (rotated files that were compressed afterwards) are
+skipped; replay them without --follow.
+
+Latency is measured per record from when it was written (its _received_at
+stamp from fluentd_integration, otherwise the file's mtime when it was read)
+to when the replay loop is done with it and asks for the next one.
+"""
+import collections
+import ctypes
+import ctypes.util
+import glob
+import heapq
+import json
+import os
+import random
+import select
+import struct
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from compressed_input import codec_for
+from log_reader import DEFAULT_CHUNK_SIZE, split_chunks, stats_for
+from replay_scheduler import percentiles
+from timestamp_parser import parser_for, record_ts_value
+
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+RESCAN_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ATTRIB
+_EVENT = struct.Struct('iIII')
+
+RESCAN_INTERVAL = 2.0
+HEAD_BYTES = 4096
+
+
+def inode_key(st):
+    return f"inode:{st.st_dev}:{st.st_ino}"
+
+
+def _head_crc(path, n=HEAD_BYTES):
+    with open(path, 'rb') as f:
+        return zlib.crc32(f.read(n))
+
+
+def resume_offsets(files, checkpoint):
+    """
+    Set checkpoint[path] to where each of `files` resumes, and return
+    {path: inode key} for the keys the reader moves along with the name.
+
+    Offsets are found by (device, inode), so a file renamed by rotation since
+    the checkpoint resumes where it was and a new file that took its name
+    starts from 0. "head:<dev>:<ino>" holds [length, crc32] of the file's
+    first bytes, so an inode reused by a deleted file is not mistaken for it.
+    Checkpoints without inode keys (older runs) fall back to the file name.
+    """
+    by_name = not any(k.startswith("inode:") for k in checkpoint)
+    keys = {}
+    for path in files:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        key, head = inode_key(st), "head:" + inode_key(st)[6:]
+        if key in checkpoint:
+            seen = checkpoint.get(head)   # --follow saves no head
+            same = seen is None or (seen[0] <= st.st_size and _head_crc(path, seen[0]) == seen[1])
+            pos = checkpoint[key] if same else 0
+        else:
+            pos = checkpoint.get(path, 0) if by_name else 0
+        if pos > st.st_size and codec_for(path) is None:
+            pos = 0   # truncated in place (compressed offsets count decompressed bytes)
+        head_len = min(st.st_size, HEAD_BYTES)
+        checkpoint[path] = checkpoint[key] = pos
+        checkpoint[head] = [head_len, _head_crc(path, head_len)]
+        keys[path] = key
+    # files that are gone (or no longer match) keep no identity entries
+    live = {k for key in keys.values() for k in (key, "head:" + key[6:])}
+    for k in [k for k in checkpoint if k.startswith(("inode:", "head:")) and k not in live]:
+        del checkpoint[k]
+    return keys
+
+
+class Inotify:
+    """Minimal inotify binding: watch directories, wait for any change."""
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add = libc.inotify_add_watch
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watched = set()
+
+    def watch(self, directory):
+        if directory in self.watched:
+            return
+        if self._add(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            print(f"[ERROR] inotify watch on {directory} failed: {os.strerror(ctypes.get_errno())}",
+                  file=sys.stderr)
+            return
+        self.watched.add(directory)
+
+    def wait(self, timeout):
+        """Block up to `timeout` seconds. Returns (woken, rescan needed)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False, False
+        rescan = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos + _EVENT.size <= len(data):
+                _wd, mask, _cookie, length = _EVENT.unpack_from(data, pos)
+                rescan = rescan or bool(mask & RESCAN_MASK)
+                pos += _EVENT.size + length
+        return True, rescan
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Followed:
+    def __init__(self, path, fh, st, pos, rank):
+        self.path = path
+        self.fh = fh
+        self.key = inode_key(st)
+        self.pos = pos              # next byte to read
+        self.rank = rank
+        self.queue = collections.deque()   # (ts, rec, end, written)
+        self.last_ts = None
+        self.last_data = time.monotonic()
+        self.detached = False       # no longer matched by the pattern: drain, then close
+        self.behind = True          # unread data left after the last read
+        self.live = False           # has reached EOF once: later records count for latency
+        self.parser = parser_for(path)
+        self.stats = stats_for(path)
+
+
+class LogFollower:
+    def __init__(self, pattern, checkpoint, errlog, chunk_size=DEFAULT_CHUNK_SIZE, prefilter=None,
+                 lateness=2.0, idle=1.0, poll_min=0.01, poll_max=0.5, max_buffered=100000,
+                 exit_idle=None, on_idle=None, use_inotify=True, samples=100000):
+        self.pattern = pattern
+        self.cp = checkpoint
+        self.errlog = errlog
+        self.chunk_size = max(4096, int(chunk_size))
+        self.prefilter = prefilter
+        self.lateness = timedelta(seconds=lateness)
+        self.idle = idle
+        self.poll_min = poll_min
+        self.poll_max = max(poll_min, poll_max)
+        self.max_buffered = max(1, int(max_buffered))
+        self.exit_idle = exit_idle
+        self.on_idle = on_idle      # called on every wakeup; returning True stops following
+        self.files = {}             # inode key -> _Followed
+        self._heap = []             # (ts, rank, seq, key): head of each non-empty file queue
+        self._seq = 0
+        self._rank = 0
+        self.buffered = 0
+        self.max_seen = None
+        self.last_emitted = None
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = Inotify()
+            except (OSError, AttributeError) as e:
+                print(f"[INFO] inotify unavailable ({e}), polling", file=sys.stderr)
+        self._samples = samples
+        self._rng = random.Random(0)
+        self._lat_seen = 0
+        self.latencies = []
+        self.counters = {"files_opened": 0, "files_closed": 0, "renames": 0, "truncations": 0,
+                         "late_events": 0, "forced_releases": 0, "wakeups": 0, "polls": 0, "rescans": 0,
+                         "max_buffered": 0}
+
+    # -- files ------------------------------------------------------------
+
+    def _start_offset(self, path, st, initial):
+        key = inode_key(st)
+        if key in self.cp:
+            pos = self.cp[key]
+        elif initial and not any(k.startswith("inode:") for k in self.cp):
+            pos = self.cp.get(path, 0)   # checkpoint from a non-follow run
+        else:
+            pos = 0
+        return pos if pos <= st.st_size else 0
+
+    def _scan(self, initial=False):
+        self.counters["rescans"] += 1
+        found = {}
+        for path in sorted(glob.glob(self.pattern)):
+            if codec_for(path) is not None:
+                continue   # compressed after rotation: already followed as the plain file
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            found[inode_key(st)] = (path, st)
+        if self.inotify is not None:
+            for d in {os.path.dirname(p) or '.' for p, _ in found.values()} | \
+                     {d for d in glob.glob(os.path.dirname(self.pattern) or '.') if os.path.isdir(d)}:
+                self.inotify.watch(d)
+        # renames first, so a new file that took an old name doesn't lose its offset
+        for key, f in self.files.items():
+            if key not in found:
+                f.detached = True
+            elif found[key][0] != f.path:
+                old, f.path = f.path, found[key][0]
+                self.counters["renames"] += 1
+                if not any(g.path == old for g in self.files.values()):
+                    self.cp.pop(old, None)
+                self.cp[f.path] = self.cp.get(key, f.pos)
+        for key, (path, st) in found.items():
+            if key in self.files:
+                continue
+            try:
+                fh = open(path, 'rb')
+            except OSError as e:
+                self.errlog.write(json.dumps({"file": path, "err": f"IO error: {str(e)}"}) + "\n")
+                self.errlog.flush()
+                continue
+            if inode_key(os.fstat(fh.fileno())) != key:
+                fh.close()   # replaced between stat and open; the next scan gets it
+                continue
+            pos = self._start_offset(path, st, initial)
+            self.files[key] = _Followed(path, fh, st, pos, self._rank)
+            self._rank += 1
+            self.cp[path] = self.cp[key] = pos
+            self.counters["files_opened"] += 1
+
+    def _close_drained(self):
+        for key, f in list(self.files.items()):
+            if f.detached and not f.queue and os.fstat(f.fh.fileno()).st_size <= f.pos:
+                f.fh.close()
+                del self.files[key]
+                self.cp.pop(key, None)
+                if not any(g.path == f.path for g in self.files.values()):
+                    self.cp.pop(f.path, None)
+                self.counters["files_closed"] += 1
+
+    def _read(self, f):
+        """Queue the complete lines appended to `f`. Returns the number of bytes consumed."""
+        st = os.fstat(f.fh.fileno())
+        if st.st_size < f.pos:
+            self.counters["truncations"] += 1
+            print(f"[INFO] {f.path} was truncated, reading it from the start", file=sys.stderr)
+            f.pos = 0
+        if st.st_size == f.pos:
+            return 0
+        f.fh.seek(f.pos)
+        data = f.fh.read(min(st.st_size - f.pos, self.chunk_size))
+        cut = data.rfind(b'\n')
+        if cut < 0:
+            return 0 if len(data) < self.chunk_size else self._oversized(f)
+        data = data[:cut + 1]
+        written = st.st_mtime if f.live else None
+        was_empty = not f.queue
+        added = 0
+        for line, pos, end in split_chunks([data], f.pos, f.stats):
+            if self.prefilter is not None and not self.prefilter.admits(line):
+                continue
+            try:
+                rec = json.loads(line.decode('utf-8', 'replace'))
+            except json.JSONDecodeError:
+                self.errlog.write(json.dumps({"file": f.path, "offset": pos, "err": "bad json"}) + "\n")
+                self.errlog.flush()
+                continue
+            ts = f.parser.parse(record_ts_value(rec)) if isinstance(rec, dict) else None
+            if not ts:
+                self.errlog.write(json.dumps({"file": f.path, "offset": pos, "err": "bad ts", "raw": rec}) + "\n")
+                self.errlog.flush()
+                continue
+            f.queue.append((ts, rec, end, written))
+            added += 1
+            f.last_ts = ts
+            if self.max_seen is None or ts > self.max_seen:
+                self.max_seen = ts
+        f.pos += len(data)
+        f.last_data = time.monotonic()
+        f.behind = f.pos < st.st_size
+        f.live = f.live or not f.behind
+        self.buffered += added
+        if was_empty and f.queue:
+            self._push(f)
+        elif not f.queue:
+            self.cp[f.path] = self.cp[f.key] = f.pos   # everything read was skipped
+        return len(data)
+
+    def _oversized(self, f):
+        # a single line longer than chunk_size: read up to its newline
+        f.fh.seek(f.pos)
+        line = f.fh.readline()
+        if not line.endswith(b'\n'):
+            return 0
+        f.fh.seek(f.pos)
+        saved, self.chunk_size = self.chunk_size, len(line)
+        try:
+            return self._read(f)
+        finally:
+            self.chunk_size = saved
+
+    def _push(self, f):
+        self._seq += 1
+        heapq.heappush(self._heap, (f.queue[0][0], f.rank, self._seq, f.key))
+
+    # -- merging ----------------------------------------------------------
+
+    def watermark(self, now):
+        """Event time up to which queued records are released; None releases everything."""
+        # a file with a backlog still to read holds the watermark at its position;
+        # files waiting for new data hold it back by at most `lateness`
+        behind = [f.last_ts for f in self.files.values() if f.behind and f.last_ts is not None]
+        active = [f.last_ts for f in self.files.values()
+                  if not f.behind and f.last_ts is not None and now - f.last_data < self.idle]
+        wm = max(min(active), self.max_seen - self.lateness) if active else None
+        if behind:
+            wm = min(behind) if wm is None else min(wm, min(behind))
+        return wm
+
+    def _release(self, flush=False, force_first=False):
+        wm = None if flush else self.watermark(time.monotonic())
+        while self._heap:
+            ts, _rank, _s, key = self._heap[0]
+            forced = self.buffered > self.max_buffered or force_first
+            force_first = False
+            if not flush and wm is not None and ts > wm and not forced:
+                return
+            heapq.heappop(self._heap)
+            f = self.files[key]
+            ts, rec, end, written = f.queue.popleft()
+            self.buffered -= 1
+            if f.queue:
+                self._push(f)
+            if forced and wm is not None and ts > wm:
+                self.counters["forced_releases"] += 1
+            if self.last_emitted is not None and ts < self.last_emitted:
+                self.counters["late_events"] += 1
+            else:
+                self.last_emitted = ts
+            self.cp[f.path] = self.cp[f.key] = end if f.queue else max(end, f.pos)
+            yield ts, rec, f.path, written
+
+    def _written_at(self, rec, mtime):
+        received = rec.get('_received_at')
+        if isinstance(received, str):
+            try:
+                return datetime.fromisoformat(received.replace('Z', '+00:00')).timestamp()
+            except ValueError:
+                pass
+        return mtime
+
+    def _record_latency(self, seconds):
+        self._lat_seen += 1
+        if len(self.latencies) < self._samples:
+            self.latencies.append(seconds)
+        else:
+            j = self._rng.randrange(self._lat_seen)
+            if j < self._samples:
+                self.latencies[j] = seconds
+
+    # -- main loop --------------------------------------------------------
+
+    def stream(self):
+        """Yield (ts, seq, rec, file) like merged_stream, until stopped or idle for `exit_idle` seconds."""
+        seq = 0
+        self._scan(initial=True)
+        poll = self.poll_min
+        last_scan = last_data = time.monotonic()
+        stalled = False
+        try:
+            while True:
+                got = 0
+                # a file far ahead in event time waits while the others catch up
+                cap = max(1000, self.max_buffered // max(1, len(self.files)))
+                for f in list(self.files.values()):
+                    if len(f.queue) >= cap:
+                        continue
+                    try:
+                        got += self._read(f)
+                    except OSError as e:
+                        self.errlog.write(json.dumps({"file": f.path, "err": f"IO error: {str(e)}"}) + "\n")
+                        self.errlog.flush()
+                now = time.monotonic()
+                if got:
+                    last_data = now
+                    poll = self.poll_min
+                idle_out = self.exit_idle is not None and now - last_data >= self.exit_idle
+                released = 0
+                for ts, rec, path, written in self._release(idle_out, stalled):
+                    released += 1
+                    seq += 1
+                    if written is not None:
+                        written = self._written_at(rec, written)
+                    yield ts, seq, rec, path
+                    if written is not None:
+                        self._record_latency(max(0.0, time.time() - written))
+                self.counters["max_buffered"] = max(self.counters["max_buffered"], self.buffered)
+                behind = any(f.behind for f in self.files.values())
+                # a backlogged file whose queue is full and can't be released (its times go backwards)
+                stalled = behind and not got and not released
+                if got or behind:
+                    continue   # more may be waiting: read before sleeping
+                self._close_drained()
+                if idle_out:
+                    return
+                if self.on_idle is not None and self.on_idle():
+                    return
+                # wake in time to release queued records once their files go idle
+                timeout = self.poll_max if self.inotify is not None else poll
+                if self._heap:
+                    timeout = min(timeout, max(self.poll_min, self.idle - (now - last_data)))
+                rescan = now - last_scan >= RESCAN_INTERVAL
+                if self.inotify is not None:
+                    woken, changed = self.inotify.wait(timeout)
+                    self.counters["wakeups"] += woken
+                    rescan = rescan or changed
+                else:
+                    time.sleep(timeout)
+                    self.counters["polls"] += 1
+                    poll = min(self.poll_max, poll * 2)
+                    rescan = rescan or poll >= self.poll_max
+                if rescan:
+                    self._scan()
+                    last_scan = time.monotonic()
+        finally:
+            for f in self.files.values():
+                f.fh.close()
+            if self.inotify is not None:
+                self.inotify.close()
+
+    def stats(self):
+        return dict(self.counters, inotify=self.inotify is not None, files=len(self.files),
+                    buffered=self.buffered, lateness_seconds=self.lateness.total_seconds(),
+                    latency_ms={k: round(v * 1000, 3) for k, v in percentiles(self.latencies).items()})
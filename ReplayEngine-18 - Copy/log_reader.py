@@ -0,0 +1,156 @@
+# app/log_reader.py
+"""
+Binary chunked line reader.
+
+Reads a file in large binary chunks (or through mmap), splits on b'\n' and
+yields every line together with its exact start/end byte offsets, so callers
+never need tell() or to re-encode lines to know where they are. Compressed
+files (.gz, .bz2, .zst) are decompressed on the fly by compressed_input;
+their offsets are positions in the decompressed data.
+"""
+import mmap
+import time
+
+from compressed_input import codec_for, compressed_chunks
+
+DEFAULT_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+
+class ReaderStats:
+    """Bytes and time spent reading one file (time covers I/O + line splitting only)."""
+    def __init__(self):
+        self.bytes_read = 0
+        self.lines = 0
+        self.seconds = 0.0
+        self.compressed_bytes = 0
+        self.decompress_seconds = 0.0
+
+    def bytes_per_sec(self):
+        return self.bytes_read / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self):
+        out = {
+            "bytes_read": self.bytes_read,
+            "lines": self.lines,
+            "seconds": round(self.seconds, 6),
+            "mb_per_sec": round(self.bytes_per_sec() / 1e6, 2),
+        }
+        if self.compressed_bytes:
+            # decompression runs ahead on its own thread; `seconds` is what the reader waited
+            out["compressed_bytes"] = self.compressed_bytes
+            out["compression_ratio"] = round(self.bytes_read / self.compressed_bytes, 2)
+            out["decompress_seconds"] = round(self.decompress_seconds, 6)
+            out["decompress_mb_per_sec"] = round(self.bytes_read / self.decompress_seconds / 1e6, 2) \
+                if self.decompress_seconds > 0 else 0.0
+        return out
+
+
+def _chunks_read(f, chunk_size, remaining=None):
+    while remaining is None or remaining > 0:
+        chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+        if not chunk:
+            return
+        if remaining is not None:
+            remaining -= len(chunk)
+        yield chunk
+
+
+def _chunks_mmap(f, offset, chunk_size, stop=None):
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:  # empty file can't be mapped
+        return
+    try:
+        size = len(mm) if stop is None else min(len(mm), stop)
+        pos = offset
+        while pos < size:
+            yield mm[pos:min(pos + chunk_size, size)]
+            pos += chunk_size
+    finally:
+        mm.close()
+
+
+def split_chunks(chunks, offset, stats=None):
+    """
+    Split an iterable of byte chunks into (line, start, end) tuples.
+
+    `offset` is the byte position of the first chunk. Lines are yielded
+    without their trailing newline; `end` is the offset just past the newline,
+    i.e. where reading should resume. A final line without newline is still
+    yielded (as readline() would).
+    """
+    pos = offset
+    tail = b""
+    clock = time.perf_counter
+    t0 = clock()
+    for chunk in chunks:
+        buf = tail + chunk if tail else chunk
+        lines = buf.split(b"\n")
+        tail = lines.pop()
+        if stats is not None:
+            stats.bytes_read += len(chunk)
+            stats.lines += len(lines)
+            stats.seconds += clock() - t0
+        for line in lines:
+            end = pos + len(line) + 1
+            yield line, pos, end
+            pos = end
+        t0 = clock()
+    if stats is not None:
+        stats.seconds += clock() - t0
+    if tail:
+        if stats is not None:
+            stats.lines += 1
+        yield tail, pos, pos + len(tail)
+
+
+def iter_lines(path, offset=0, chunk_size=DEFAULT_CHUNK_SIZE, use_mmap=False, stats=None, stop=None):
+    """
+    Yield (line_bytes, start_offset, end_offset) for every line of `path` from
+    `offset`. With `stop` (a line start) nothing at or after it is read.
+    """
+    chunk_size = max(4096, int(chunk_size))
+    codec = codec_for(path)
+    if codec is not None:
+        yield from split_chunks(compressed_chunks(path, codec, offset, chunk_size, stats, stop), offset, stats)
+        return
+    with open(path, "rb") as f:
+        if use_mmap:
+            chunks = _chunks_mmap(f, offset, chunk_size, stop)
+        else:
+            f.seek(offset)
+            chunks = _chunks_read(f, chunk_size, None if stop is None else max(0, stop - offset))
+        yield from split_chunks(chunks, offset, stats)
+
+
+_stats = {}
+
+
+def stats_for(path):
+    s = _stats.get(path)
+    if s is None:
+        s = _stats[path] = ReaderStats()
+    return s
+
+
+def register_stats(path, stats):
+    """Adopt stats collected elsewhere (e.g. in a decode worker)."""
+    _stats[path] = stats
+
+
+def reader_stats():
+    """Per-file reader statistics plus a 'total' entry."""
+    out = {path: s.as_dict() for path, s in _stats.items()}
+    total = ReaderStats()
+    for s in _stats.values():
+        total.bytes_read += s.bytes_read
+        total.lines += s.lines
+        total.seconds += s.seconds
+        total.compressed_bytes += s.compressed_bytes
+        total.decompress_seconds += s.decompress_seconds
+    out["total"] = total.as_dict()
+    return out
+
+
+def reset_stats():
+    _stats.clear()
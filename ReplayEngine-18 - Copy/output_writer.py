@@ -0,0 +1,130 @@
+# app/output_writer.py
+"""
+Group-commit writer for the -o/--output file.
+
+The replay loop only appends serialized lines to an in-memory buffer; a
+background thread writes them in batches once `batch_lines` lines are waiting
+or `flush_interval` seconds have passed. Durability per batch:
+
+  none  - write only, let the OS decide
+  flush - flush Python's buffer to the OS after every batch
+  fsync - flush and fsync after every batch
+
+barrier(callback) runs `callback` on the writer thread once everything
+written before it is flushed and fsynced, whatever the durability level.
+replay() saves checkpoints through it, so a checkpoint never points past
+output that isn't on disk yet.
+"""
+import os
+import sys
+import threading
+import time
+
+DURABILITY_LEVELS = ('none', 'flush', 'fsync')
+
+
+class BatchedWriter:
+    def __init__(self, path, batch_lines=1000, flush_interval=0.2, durability='flush', max_pending=None):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"durability must be one of {DURABILITY_LEVELS}")
+        self.path = path
+        self.batch_lines = max(1, int(batch_lines))
+        self.flush_interval = max(0.001, float(flush_interval))
+        self.durability = durability
+        # producers block once this many lines are waiting (backpressure)
+        self.max_pending = max_pending or self.batch_lines * 8
+        self._f = open(path, 'ab')
+        self._cond = threading.Condition()
+        self._buf = []
+        self._barriers = []
+        self._closing = False
+        self._error = None
+        self.lines = 0
+        self.batches = 0
+        self.bytes = 0
+        self.fsyncs = 0
+        self._thread = threading.Thread(target=self._run, name='output-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, line):
+        with self._cond:
+            if self._error:
+                raise IOError(f"output writer failed: {self._error}")
+            self._buf.append(line)
+            if len(self._buf) >= self.batch_lines:
+                self._cond.notify_all()
+                while len(self._buf) >= self.max_pending and not self._error:
+                    self._cond.wait()
+
+    def barrier(self, callback):
+        """Run `callback` once all lines written so far are durable."""
+        with self._cond:
+            if self._error:
+                raise IOError(f"output writer failed: {self._error}")
+            self._barriers.append(callback)
+            self._cond.notify_all()
+
+    def _run(self):
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            with self._cond:
+                while (len(self._buf) < self.batch_lines and not self._barriers and not self._closing
+                       and time.monotonic() < deadline):
+                    self._cond.wait(max(0.0, deadline - time.monotonic()))
+                batch, self._buf = self._buf, []
+                barriers, self._barriers = self._barriers, []
+                closing = self._closing
+                self._cond.notify_all()
+            deadline = time.monotonic() + self.flush_interval
+            try:
+                if batch:
+                    data = ''.join(batch).encode('utf-8')
+                    self._f.write(data)
+                    self.lines += len(batch)
+                    self.bytes += len(data)
+                    self.batches += 1
+                    if self.durability != 'none':
+                        self._f.flush()
+                    if self.durability == 'fsync':
+                        os.fsync(self._f.fileno())
+                        self.fsyncs += 1
+                if barriers:
+                    if not (batch and self.durability == 'fsync'):
+                        self._f.flush()
+                        os.fsync(self._f.fileno())
+                        self.fsyncs += 1
+                    for cb in barriers:
+                        cb()
+            except Exception as e:
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                print(f"[ERROR] output writer failed: {e}", file=sys.stderr)
+                return
+            if closing:
+                with self._cond:
+                    if not self._buf and not self._barriers:
+                        return
+
+    def close(self):
+        """Write everything still buffered, fsync and close the file."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+        try:
+            if self._error is None:
+                self._f.flush()
+                os.fsync(self._f.fileno())
+        finally:
+            self._f.close()
+        if self._error is not None:
+            raise IOError(f"output writer failed: {self._error}")
+
+    def pending(self):
+        """Lines written but not yet handed to the file."""
+        return len(self._buf)
+
+    def stats(self):
+        return {"lines": self.lines, "batches": self.batches, "bytes": self.bytes,
+                "fsyncs": self.fsyncs, "durability": self.durability}
@@ -1,25 +1,134 @@
 import os
 import json
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pandas.api.types import union_categoricals
 from datetime import datetime
 from jinja2 import Template
 from flask import Flask  # Simple web server for report
+from log_cache import LogColumns, FLAG_BAD_JSON, FLAG_BAD_TS, FLAG_TIMEOUT, _corr_value, to_ns
+from timestamp_parser import parser_for, record_ts_value
+from log_reader import iter_lines
+from compressed_input import CODECS, codec_for
 
 app = Flask(__name__)
 
-def load_logs(input_dir):
-    """Load and merge all JSONL logs"""
-    all_logs = []
-    for file in os.listdir(input_dir):
-        if file.endswith('.jsonl'):
-            with open(os.path.join(input_dir, file), 'r') as f:
-                for line in f:
-                    try:
-                        all_logs.append(json.loads(line.strip()))
-                    except json.JSONDecodeError:
-                        pass
-    
-    # ← ADD THIS BLOCK HERE (before return)
+COLUMNS = ('timestamp', 'level', 'source', 'request_id', 'message')
+CATEGORICAL = ('level', 'source', 'request_id')
+CHUNK_LINES = 100000
+
+
+def _batch_frame(cols):
+    """Typed DataFrame for one batch of parsed lines ('timestamp' holds epoch ns or None)"""
+    data = {'timestamp': pd.Series(pd.to_datetime(pd.array(cols['timestamp'], dtype='Int64'), unit='ns', utc=True))}
+    for c in CATEGORICAL:
+        data[c] = pd.Categorical(cols[c])
+    data['message'] = pd.Series(cols['message'], dtype=object)
+    return pd.DataFrame(data)
+
+
+def empty_frame():
+    return _batch_frame({c: [] for c in COLUMNS})
+
+
+def concat_frames(frames):
+    """Concatenate typed batches; categoricals are merged with union_categoricals"""
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return empty_frame()
+    if len(frames) == 1:
+        return frames[0]
+    data = {}
+    for c in frames[0].columns:
+        if isinstance(frames[0][c].dtype, pd.CategoricalDtype):
+            data[c] = union_categoricals([f[c] for f in frames])
+        else:
+            data[c] = pd.concat([f[c] for f in frames], ignore_index=True)
+    return pd.DataFrame(data)
+
+
+def iter_batches(path, chunk_lines=CHUNK_LINES):
+    """
+    Parse a JSONL file (plain, .gz, .bz2 or .zst) into typed column batches of
+    at most `chunk_lines` rows. Timestamps, levels, sources and correlation ids
+    are read exactly as the column cache reads them, so load_logs() gives the
+    same frame with or without cache_dir.
+    """
+    ts_parser = parser_for(path)
+    cols = {c: [] for c in COLUMNS}
+    n = 0
+    for line, _pos, _end in iter_lines(path):
+        try:
+            rec = json.loads(line.decode('utf-8', 'replace'))
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(rec, dict):
+            continue
+        ts = ts_parser.parse(record_ts_value(rec))
+        cols['timestamp'].append(to_ns(ts) if ts else None)
+        for c in ('level', 'source'):
+            v = rec.get(c)
+            cols[c].append(None if v is None else str(v))
+        cols['request_id'].append(_corr_value(rec))
+        cols['message'].append(rec.get('message'))
+        n += 1
+        if n >= chunk_lines:
+            yield _batch_frame(cols)
+            cols = {c: [] for c in COLUMNS}
+            n = 0
+    if n:
+        yield _batch_frame(cols)
+
+
+def load_file(path, chunk_lines=CHUNK_LINES):
+    return concat_frames(list(iter_batches(path, chunk_lines)))
+
+
+def load_cached_file(path, cache_dir):
+    """
+    Typed frame straight from the column cache (built or extended first).
+    There is no message column: 'timeout' holds the message check and
+    'file'/'offset' let attach_messages() read messages back when needed.
+    """
+    cache = LogColumns.open(path, cache_dir)
+    cols = cache.columns()
+    ok = (cols['flags'] & FLAG_BAD_JSON) == 0
+    flags = np.asarray(cols['flags'][ok])
+    ts = pd.Series(pd.to_datetime(np.asarray(cols['ts_ns'][ok]), unit='ns', utc=True))
+    data = {'timestamp': ts.mask((flags & FLAG_BAD_TS) != 0)}
+    for c, field in (('level', 'level'), ('source', 'source'), ('request_id', 'corr')):
+        data[c] = pd.Categorical.from_codes(np.asarray(cols[field][ok]), categories=cache.dicts[field])
+    data['timeout'] = (flags & FLAG_TIMEOUT) != 0
+    data['file'] = pd.Categorical.from_codes(np.zeros(int(ok.sum()), dtype=np.int8), categories=[path])
+    data['offset'] = np.asarray(cols['offset'][ok])
+    return pd.DataFrame(data)
+
+
+def attach_messages(df):
+    """Fill in 'message' for a (small) cached frame by reading the raw records"""
+    if 'message' in df or 'offset' not in df:
+        return df
+    messages = []
+    handles = {}
+    try:
+        for path, offset in zip(df['file'], df['offset']):
+            f = handles.get(path)
+            if f is None:
+                f = handles[path] = open(path, 'rb')
+            f.seek(int(offset))
+            try:
+                messages.append(json.loads(f.readline()).get('message'))
+            except (json.JSONDecodeError, AttributeError):
+                messages.append(None)
+    finally:
+        for f in handles.values():
+            f.close()
+    return df.assign(message=pd.Series(messages, index=df.index, dtype=object))
+
+
+def load_logs(input_dir, workers=None, chunk_lines=CHUNK_LINES, cache_dir=None):
+    """Load and merge all JSONL logs into one typed DataFrame, one process per file"""
     # Auto-export from Fluentd if no local files
     import subprocess
     if not os.listdir(input_dir):
@@ -27,26 +136,49 @@ def load_logs(input_dir):
         with open(os.path.join(input_dir, 'auto_export.jsonl'), 'w') as f:
             f.write(result.stdout)
         print("Auto-exported logs from Fluentd")
-        # Re-load the auto-exported file
-        with open(os.path.join(input_dir, 'auto_export.jsonl'), 'r') as f:
-            for line in f:
-                try:
-                    all_logs.append(json.loads(line.strip()))
-                except json.JSONDecodeError:
-                    pass
-    
-    return pd.DataFrame(all_logs)
-
-def detect_bugs(df):
-    """Detect bugs: ERROR logs, timeouts (message contains 'timeout')"""
-    bugs = df[df['level'] == 'ERROR'] | df[df['message'].str.contains('timeout', case=False, na=False)]
-    return bugs
+
+    suffixes = ('.jsonl',) + tuple('.jsonl' + ext for ext in CODECS)
+    files = sorted(os.path.join(input_dir, n) for n in os.listdir(input_dir) if n.endswith(suffixes))
+    if workers is None:
+        workers = min(len(files), os.cpu_count() or 1)
+    # compressed files can't be read back by offset, so with any of them the column cache is skipped
+    if cache_dir and all(codec_for(p) is None for p in files):
+        load, extra = load_cached_file, cache_dir
+    else:
+        load, extra = load_file, chunk_lines
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(load, files, [extra] * len(files)))
+    else:
+        frames = [load(p, extra) for p in files]
+    return concat_frames(frames)
+
+
+def detect_bugs(df, gap_threshold=None):
+    """
+    Detect bugs: ERROR logs, timeouts (message contains 'timeout') and, with
+    gap_threshold, events that come more than that many seconds after the
+    previous one (df sorted by timestamp). The kind is in the 'bug' column.
+    """
+    is_error = (df['level'] == 'ERROR').to_numpy(dtype=bool)
+    if 'message' in df:
+        is_timeout = df['message'].str.contains('timeout', case=False, na=False).to_numpy(dtype=bool)
+    else:
+        is_timeout = df['timeout'].to_numpy(dtype=bool)
+    is_gap = np.zeros(len(df), dtype=bool)
+    if gap_threshold is not None and len(df):
+        is_gap = (df['timestamp'].diff().dt.total_seconds() > gap_threshold).to_numpy(dtype=bool)
+    kind = np.select([is_error, is_timeout, is_gap], ['ERROR', 'TIMEOUT', 'GAP'], default='')
+    mask = is_error | is_timeout | is_gap
+    return df[mask].assign(bug=pd.Categorical(kind[mask]))
+
 
 def group_by_correlation(df):
     """Group by request_id (correlation)"""
-    return df.groupby('request_id')
+    return df.groupby('request_id', observed=True, sort=False)
+
 
-def generate_html_report(df, bugs, groups):
+def generate_html_report(df, bugs, groups, outfile='/app/output/report.html'):
     """Generate simple HTML report"""
     html_template = """
     <!DOCTYPE html>
@@ -56,17 +188,17 @@ def generate_html_report(df, bugs, groups):
     <h2>Bugs Detected: {{ bugs_count }}</h2>
     <ul>{% for bug in bugs %}<li>{{ bug.timestamp }}: {{ bug.message }} (ID: {{ bug.request_id }})</li>{% endfor %}</ul>
     <h2>Correlated Groups:</h2>
-    <ul>{% for gid, group in groups.items() %}<li>Group {{ gid }}: {{ group.shape[0] }} events</li>{% endfor %}</ul>
+    <ul>{% for gid, size in groups.items() %}<li>Group {{ gid }}: {{ size }} events</li>{% endfor %}</ul>
     </body></html>
     """
     t = Template(html_template)
     output = t.render(
         total=len(df),
         bugs_count=len(bugs),
-        bugs=bugs.to_dict('records')[:10],  # Top 10 bugs
-        groups={gid: len(g) for gid, g in groups}
+        bugs=attach_messages(bugs.head(10)).to_dict('records'),  # Top 10 bugs
+        groups=groups.size().to_dict()
     )
-    with open('/app/output/report.html', 'w') as f:
+    with open(outfile, 'w') as f:
         f.write(output)
 
 @app.route('/')
@@ -76,15 +208,15 @@ def serve_report():
 if __name__ == '__main__':
     # Run replay
     print("Starting replay...")
-    df = load_logs('/app/logs')
+    df = load_logs(os.environ.get('INPUT_DIR', '/app/logs'), cache_dir=os.environ.get('CACHE_DIR') or None)
     if not df.empty:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp')  # Deterministic replay order
-        bugs = detect_bugs(df)
+        if not df['timestamp'].is_monotonic_increasing:
+            df = df.sort_values('timestamp', kind='stable', ignore_index=True)  # Deterministic replay order
+        bugs = detect_bugs(df, float(os.environ.get('GAP_THRESHOLD', 5)))
         groups = group_by_correlation(df)
-        generate_html_report(df, bugs, groups)
+        generate_html_report(df, bugs, groups, os.path.join(os.environ.get('OUTPUT_DIR', '/app/output'), 'report.html'))
         print(f"Replayed {len(df)} events. {len(bugs)} bugs detected.")
         print("Serving report at http://localhost:8080")
     else:
         print("No logs found. Add sample logs to /logs/")
-    app.run(host='0.0.0.0', port=8080)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=8080)
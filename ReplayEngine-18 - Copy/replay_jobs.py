@@ -0,0 +1,366 @@
+# app/replay_jobs.py
+"""
+Replay jobs for api_server.
+
+ReplayJobManager keeps `max_jobs` worker processes alive. Each one imports
+ReplayEnhanced once at startup and then runs jobs one after another by
+calling replay() in-process, so a job pays neither interpreter start nor
+imports. Jobs beyond the free workers wait in a FIFO queue of at most
+`max_queued` entries; a queued job whose checkpoint file is in use by a
+running job waits until that job ends, so two replays never write the same
+checkpoint.
+
+A job's options are ReplayEnhanced's command line options with underscores
+(e.g. {"pattern": "logs/*.log", "max_rate": 500, "real_time": true}), limited
+to JOB_OPTIONS; they are checked with its argument parser before the job is
+queued. Every path (PATH_OPTIONS, given or defaulted) is taken relative to
+`data_root` and must stay inside it, symlinks resolved; so must the files
+the pattern matches. sink_url is only accepted for hosts in `sink_hosts`
+("host" or "host:port"), so jobs can't be pointed at internal services.
+Reports, summary and the job's stdout/stderr (job.log) default to
+reports/jobs/<id>/.
+
+Workers send progress (see ReplayEnhanced.ReplayProgress) and results to the
+manager over one queue. Cancelling a running job sets its worker's cancel
+event, which replay() sees on its next progress check; the replay stops like
+on Ctrl-C, saving its checkpoint and reports. A worker that dies is replaced
+and its job marked failed; idle workers exit once the server process is gone.
+"""
+import collections
+import contextlib
+import glob
+import io
+import itertools
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+JOB_ROOT = os.path.join('reports', 'jobs')
+# report options that default into the job's own directory
+JOB_FILES = {"html_report": "bug_report.html", "summary_json": "replay_summary.json",
+             "debug_json": "debug_report.json", "debug_csv": "debug_report.csv",
+             "timeline": "replay_timeline.jsonl", "errlog": "replay.errors.log"}
+# options that name files or directories: confined to the data root
+PATH_OPTIONS = ("pattern", "checkpoint", "errlog", "output", "flow_spill", "index_dir", "sort_dir", "cache_dir",
+                "debug_json", "debug_csv", "html_report", "summary_json", "timeline", "live_snapshot")
+# everything a job may set; profiling and reader/journal internals are left to the command line
+JOB_OPTIONS = PATH_OPTIONS + (
+    "no_checkpoint", "checkpoint_every", "output_batch", "output_flush_ms", "durability",
+    "sink_url", "sink_concurrency", "sink_batch", "sink_max_pending", "sink_retries", "sink_timeout",
+    "real_time", "max_rate", "max_sleep", "speed", "max_lag", "level", "source", "start", "end", "timeout",
+    "max_flows", "flow_idle_timeout", "max_flow_events", "max_bug_samples",
+    "workers", "batch_size", "no_pushdown", "no_index", "index_every",
+    "sort_mode", "reorder_window", "reorder_max", "sort_memory",
+    "follow", "follow_lateness", "follow_idle", "follow_poll_max", "follow_buffer", "follow_exit_idle",
+    "report_error_points", "report_buffer", "live_interval", "no_live")
+FINAL_STATES = ("done", "failed", "cancelled")
+PROGRESS_INTERVAL = 0.5
+
+
+def options_to_argv(options):
+    """{"max_rate": 10, "real_time": True} -> ['--max-rate', '10', '--real-time']"""
+    argv = []
+    for key, value in options.items():
+        if value is None or value is False:
+            continue
+        flag = '--' + key.replace('_', '-')
+        if value is True:
+            argv.append(flag)
+        else:
+            argv += [flag, str(value)]
+    return argv
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _worker_main(inbox, events, cancel, interval):
+    import ReplayEnhanced  # the expensive imports happen once, before the first job
+    parent = os.getppid()
+    events.put((None, "ready", os.getpid()))
+    while True:
+        try:
+            job = inbox.get(timeout=1.0)
+        except queue.Empty:
+            if os.getppid() != parent:
+                return  # the server went away without closing us
+            continue
+        if job is None:
+            return
+        job_id, argv, log_path = job
+
+        def progress(p):
+            events.put((job_id, "progress", p))
+            return cancel.is_set()
+
+        with open(log_path, 'a', encoding='utf-8', buffering=1) as log, \
+                contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            try:
+                args = ReplayEnhanced.build_parser().parse_args(argv)
+                result = ReplayEnhanced.replay(args, progress, interval)
+                events.put((job_id, "cancelled" if result["cancelled"] else "done", result))
+            except BaseException as e:
+                print(f"[ERROR] job {job_id} failed: {type(e).__name__}: {e}", file=sys.stderr)
+                events.put((job_id, "failed", {"error": f"{type(e).__name__}: {e}"}))
+
+
+class _Worker:
+    def __init__(self, ctx, events, interval):
+        self.inbox = ctx.Queue()
+        self.cancel = ctx.Event()
+        self.proc = ctx.Process(target=_worker_main, args=(self.inbox, events, self.cancel, interval),
+                                name='replay-worker')
+        self.proc.start()
+        self.job = None
+
+
+class ReplayJobManager:
+    def __init__(self, max_jobs=2, max_queued=100, job_root=JOB_ROOT, history=200,
+                 progress_interval=PROGRESS_INTERVAL, data_root='.', sink_hosts=()):
+        if max_jobs < 1:
+            raise ValueError("max_jobs must be at least 1")
+        from ReplayEnhanced import build_parser
+        self._parser = build_parser()
+        self._defaults = vars(self._parser.parse_args([]))
+        self.max_jobs = max_jobs
+        self.max_queued = max_queued
+        self.data_root = os.path.realpath(data_root)
+        self.sink_hosts = {h.strip().lower() for h in sink_hosts if h.strip()}
+        self.job_root = self._confine('job_root', job_root)
+        self.history = history
+        self.interval = progress_interval
+        self._ctx = multiprocessing.get_context('spawn')
+        self._events = self._ctx.Queue()
+        self._lock = threading.Lock()
+        self._jobs = collections.OrderedDict()   # id -> job dict, oldest first
+        self._pending = collections.deque()
+        self._seq = itertools.count(1)
+        self.respawned = 0
+        self._closing = False
+        self._workers = [_Worker(self._ctx, self._events, self.interval) for _ in range(max_jobs)]
+        self._thread = threading.Thread(target=self._run, name='replay-jobs', daemon=True)
+        self._thread.start()
+
+    # -- submitting -------------------------------------------------------
+
+    def _argv(self, options):
+        if not isinstance(options, dict):
+            raise ValueError("options must be an object")
+        unknown = sorted(k for k in options if k not in JOB_OPTIONS)
+        if unknown:
+            raise ValueError(f"options not allowed: {', '.join(unknown)}")
+        for k, v in options.items():
+            if not (v is None or isinstance(v, (str, int, float, bool))):
+                raise ValueError(f"option {k} must be a string, number or boolean")
+        for k in PATH_OPTIONS:
+            value = options.get(k, self._defaults[k])
+            if value is not None:
+                options[k] = self._confine(k, value)
+        if options.get('sink_url') is not None:
+            self._check_sink(options['sink_url'])
+        argv = options_to_argv(options)
+        err = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(err):
+                args = self._parser.parse_args(argv)
+        except SystemExit:
+            raise ValueError(err.getvalue().strip().splitlines()[-1] if err.getvalue().strip() else "invalid options")
+        return argv, args
+
+    def _confine(self, key, value):
+        """Absolute path for `value` (relative to data_root); ValueError if it leads outside data_root."""
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"option {key} must be a non-empty path")
+        path = os.path.realpath(os.path.join(self.data_root, value))
+        paths = [path] + ([os.path.realpath(p) for p in glob.glob(path)] if key == 'pattern' else [])
+        for p in paths:
+            if os.path.commonpath([self.data_root, p]) != self.data_root:
+                raise ValueError(f"option {key} must stay under {self.data_root}")
+        return path
+
+    def _check_sink(self, url):
+        u = urlsplit(str(url))
+        try:
+            port = u.port or (443 if u.scheme == 'https' else 80)
+        except ValueError:
+            raise ValueError("sink_url has an invalid port")
+        host = (u.hostname or '').lower()
+        if u.scheme not in ('http', 'https') or not host:
+            raise ValueError("sink_url must be an http(s) url")
+        if host not in self.sink_hosts and f"{host}:{port}" not in self.sink_hosts:
+            raise ValueError(f"sink_url host {host}:{port} is not in the allowed sink hosts")
+
+    def submit(self, options=None):
+        """Validate and queue a job. Returns its status; raises ValueError or queue.Full."""
+        options = dict(options or {})
+        job_id = f"{next(self._seq)}-{uuid.uuid4().hex[:8]}"
+        job_dir = os.path.join(self.job_root, job_id)
+        for key, name in JOB_FILES.items():
+            options.setdefault(key, os.path.join(job_dir, name))
+        argv, args = self._argv(options)
+        with self._lock:
+            idle = any(w.job is None for w in self._workers)
+            if not idle and len(self._pending) >= self.max_queued:
+                raise queue.Full("job queue is full")
+            os.makedirs(job_dir, exist_ok=True)
+            job = {"id": job_id, "state": "queued", "options": options, "argv": argv, "dir": job_dir,
+                   "log": os.path.join(job_dir, 'job.log'),
+                   "checkpoint": os.path.abspath(args.checkpoint) if args.checkpoint else None,
+                   "created": _now(), "started": None, "finished": None, "pid": None,
+                   "progress": None, "result": None, "error": None, "cancel_requested": False}
+            self._jobs[job_id] = job
+            self._pending.append(job_id)
+            self._dispatch()
+            self._trim()
+            return self._view(job)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job. Returns its status, or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            self._cancel(job)
+            return self._view(job)
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if j["state"] not in FINAL_STATES]
+            for job in jobs:
+                self._cancel(job)
+            return [self._view(j) for j in jobs]
+
+    def _cancel(self, job):
+        if job["state"] == "queued":
+            self._pending.remove(job["id"])
+            self._finish(job, "cancelled")
+        elif job["state"] == "running":
+            job["cancel_requested"] = True
+            for w in self._workers:
+                if w.job == job["id"]:
+                    w.cancel.set()
+
+    # -- status -----------------------------------------------------------
+
+    def _view(self, job):
+        view = {k: v for k, v in job.items() if k not in ("argv", "checkpoint")}
+        if job["state"] == "queued":
+            view["queue_position"] = list(self._pending).index(job["id"]) + 1
+        return view
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._view(job) if job else None
+
+    def jobs(self):
+        with self._lock:
+            return [self._view(j) for j in self._jobs.values()]
+
+    def overview(self):
+        with self._lock:
+            states = collections.Counter(j["state"] for j in self._jobs.values())
+            return {"running": states["running"] > 0, "jobs": dict(states),
+                    "max_jobs": self.max_jobs, "max_queued": self.max_queued,
+                    "queued": len(self._pending),
+                    "idle_workers": sum(1 for w in self._workers if w.job is None),
+                    "workers_respawned": self.respawned}
+
+    # -- manager thread ---------------------------------------------------
+
+    def _run(self):
+        while not self._closing:
+            try:
+                msg = self._events.get(timeout=0.2)
+            except queue.Empty:
+                msg = None
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                if msg is not None:
+                    self._apply(*msg)
+                self._reap()
+                self._dispatch()
+
+    def _apply(self, job_id, kind, payload):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        if kind == "progress":
+            job["progress"] = payload
+            return
+        if kind == "failed":
+            job["error"] = payload.get("error")
+        else:
+            job["result"] = payload
+        for w in self._workers:
+            if w.job == job_id:
+                w.job = None
+        self._finish(job, kind)
+
+    def _reap(self):
+        for i, w in enumerate(self._workers):
+            if w.proc.exitcode is None or self._closing:
+                continue
+            print(f"[ERROR] replay worker {w.proc.pid} exited with {w.proc.exitcode}", file=sys.stderr)
+            if w.job is not None:
+                job = self._jobs.get(w.job)
+                if job is not None and job["state"] not in FINAL_STATES:
+                    job["error"] = f"worker exited with code {w.proc.exitcode}"
+                    self._finish(job, "failed")
+            self._workers[i] = _Worker(self._ctx, self._events, self.interval)
+            self.respawned += 1
+
+    def _dispatch(self):
+        busy = {self._jobs[w.job]["checkpoint"] for w in self._workers if w.job in self._jobs}
+        for job_id in list(self._pending):
+            worker = next((w for w in self._workers if w.job is None and w.proc.exitcode is None), None)
+            if worker is None:
+                return
+            job = self._jobs[job_id]
+            if job["checkpoint"] is not None and job["checkpoint"] in busy:
+                continue
+            self._pending.remove(job_id)
+            busy.add(job["checkpoint"])
+            worker.cancel.clear()
+            worker.job = job_id
+            job["state"] = "running"
+            job["started"] = _now()
+            job["pid"] = worker.proc.pid
+            worker.inbox.put((job_id, job["argv"], job["log"]))
+
+    def _finish(self, job, state):
+        job["state"] = state
+        job["finished"] = _now()
+
+    def _trim(self):
+        done = [k for k, j in self._jobs.items() if j["state"] in FINAL_STATES]
+        for k in done[:max(0, len(done) - self.history)]:
+            del self._jobs[k]
+
+    def close(self, timeout=10.0):
+        """Cancel everything, let running jobs save their state, then stop the workers."""
+        self.cancel_all()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if all(w.job is None for w in self._workers):
+                    break
+            time.sleep(0.05)
+        self._closing = True
+        self._thread.join()
+        for w in self._workers:
+            if w.proc.exitcode is None:
+                w.inbox.put(None)
+        for w in self._workers:
+            w.proc.join(max(0.1, deadline - time.monotonic()))
+            if w.proc.exitcode is None:
+                w.proc.terminate()
+                w.proc.join()
@@ -0,0 +1,327 @@
+# app/replay_metrics.py
+"""
+Per-stage metrics of a replay, cheap enough to leave on.
+
+Stages (each with items processed, estimated seconds and a latency histogram):
+
+  read        I/O and line splitting (from log_reader's exact counters)
+  decode      json.loads of a line             } timed in file_iter, also
+  parse_ts    timestamp parsing                } inside decode workers
+  input       waiting for the next record of the merged stream: read,
+              decode, parse_ts, the heap merge and, with --follow, waiting
+              for new data
+  merge       single process only: input minus read, decode and parse_ts,
+              i.e. the heap merge and generator overhead (derived)
+  pacing      --real-time / --max-rate waits
+  detect      BugDetector.analyze
+  output      output line, sink and report writes
+  checkpoint  checkpoint saves (every one is timed)
+
+Only one record in `sample_every` is timed; its time stands for that many
+records, so a stage's seconds are an estimate and its histogram holds the
+sampled per-record latencies. Item counts are exact (decode and parse_ts
+add up in steps of sample_every and settle the rest when a file ends). Queue depths (decode
+worker queues, output writer, sink, follow buffer) are gauges read every
+GAUGE_EVERY records and on every progress report: last, max and mean.
+
+One registry per process (metrics()); reset_metrics() starts it over for a
+replay and decode workers ship theirs back to be merged. snapshot() is what
+goes into replay_summary.json and the job progress, prometheus_text() renders
+snapshots in the Prometheus text format for api_server's /metrics.
+
+SamplingProfiler is the opt-in profiler (--profile): it records the replay
+thread's stack every `interval` seconds and writes them folded
+("outer;inner;leaf count" lines), the input of flamegraph.pl and speedscope.
+"""
+import bisect
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+from log_reader import reader_stats
+
+SAMPLE_EVERY = 16
+GAUGE_EVERY = 1024
+# histogram upper bounds in seconds, like Prometheus' `le`
+BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+           1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGES = ('read', 'decode', 'parse_ts', 'input', 'merge', 'pacing', 'detect', 'output', 'checkpoint')
+TIMED_STAGES = ('decode', 'parse_ts', 'input', 'pacing', 'detect', 'output', 'checkpoint')
+
+
+class Stage:
+    """Exact item count plus sampled latencies of one stage."""
+    __slots__ = ('count', 'sampled', 'sampled_seconds', 'max_seconds', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.sampled = 0
+        self.sampled_seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds, items=1):
+        """One timed item standing for `items` items."""
+        self.count += items
+        self.sampled += 1
+        self.sampled_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.sampled += other.sampled
+        self.sampled_seconds += other.sampled_seconds
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def seconds(self):
+        return self.sampled_seconds * self.count / self.sampled if self.sampled else 0.0
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile of the sampled latencies."""
+        if not self.sampled:
+            return None
+        want = q * self.sampled
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= want:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max_seconds
+        return self.max_seconds
+
+    def as_dict(self):
+        p50, p99 = self.quantile(0.5), self.quantile(0.99)
+        return {"count": self.count, "sampled": self.sampled, "seconds": round(self.seconds(), 6),
+                "mean_us": round(self.sampled_seconds / self.sampled * 1e6, 2) if self.sampled else None,
+                "p50_ms": round(p50 * 1e3, 4) if p50 is not None else None,
+                "p99_ms": round(p99 * 1e3, 4) if p99 is not None else None,
+                "max_ms": round(self.max_seconds * 1e3, 4),
+                "histogram": {"sum": self.sampled_seconds, "buckets": list(self.buckets)}}
+
+
+class Gauge:
+    __slots__ = ('last', 'max', 'total', 'n')
+
+    def __init__(self):
+        self.last = self.max = self.total = self.n = 0
+
+    def set(self, value):
+        self.last = value
+        self.max = max(self.max, value)
+        self.total += value
+        self.n += 1
+
+    def as_dict(self):
+        return {"last": self.last, "max": self.max, "mean": round(self.total / self.n, 2) if self.n else 0}
+
+
+class ReplayMetrics:
+    def __init__(self, sample_every=SAMPLE_EVERY):
+        # 0 turns stage timing off; gauges are still read
+        self.sample_every = max(0, int(sample_every))
+        self.stages = {name: Stage() for name in TIMED_STAGES}
+        self.gauges = {}
+        self._watches = {}
+        self.merge_in_process = False
+
+    def stage(self, name):
+        return self.stages[name]
+
+    def watch(self, name, fn):
+        """Read gauge `name` from `fn()` on every sample_gauges()."""
+        self._watches[name] = fn
+        self.gauges.setdefault(name, Gauge())
+
+    def unwatch(self, name):
+        self._watches.pop(name, None)
+
+    def sample_gauges(self):
+        for name, fn in list(self._watches.items()):
+            try:
+                value = fn()
+            except (NotImplementedError, OSError, ValueError, AttributeError):
+                continue   # e.g. Queue.qsize() on macOS
+            self.gauges[name].set(value)
+
+    def merge_state(self, stages):
+        """Adds the stages of another process (state())."""
+        for name, st in stages.items():
+            self.stages[name].merge(st)
+
+    def state(self):
+        return self.stages
+
+    def snapshot(self):
+        st = self.stages
+        total = reader_stats()["total"]
+        stages = {}
+        for name in STAGES:
+            if name == "read":
+                if total["lines"]:
+                    stages[name] = {"count": total["lines"], "seconds": total["seconds"]}
+            elif name == "merge":
+                if self.merge_in_process and st["input"].sampled:
+                    upstream = total["seconds"] + st["decode"].seconds() + st["parse_ts"].seconds()
+                    stages[name] = {"count": st["input"].count, "derived": True,
+                                    "seconds": round(max(0.0, st["input"].seconds() - upstream), 6)}
+            elif st[name].count:
+                stages[name] = st[name].as_dict()
+        return {"sample_every": self.sample_every, "stages": stages,
+                "gauges": {name: g.as_dict() for name, g in self.gauges.items() if g.n}}
+
+
+_metrics = ReplayMetrics()
+
+
+def metrics():
+    """This process' registry."""
+    return _metrics
+
+
+def reset_metrics(sample_every=SAMPLE_EVERY):
+    global _metrics
+    _metrics = ReplayMetrics(sample_every)
+    return _metrics
+
+
+# -- Prometheus text format ---------------------------------------------------
+
+def _labels(**kw):
+    esc = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in kw.items()) + "}" if kw else ""
+
+
+def prometheus_text(jobs, extra_gauges=None):
+    """
+    `jobs`: [(job_id, progress dict with a "metrics" snapshot)]; `extra_gauges`:
+    {name: (help, {label tuple: value})} for server-level values.
+    """
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        if not samples:
+            return
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+
+    progress = [(job_id, p) for job_id, p in jobs if p]
+    family("replay_events_total", "counter", "Events replayed by the job.",
+           [(_labels(job=j), p["events"]) for j, p in progress])
+    family("replay_events_per_second", "gauge", "Average replay rate of the job.",
+           [(_labels(job=j), p["events_per_sec"]) for j, p in progress])
+    family("replay_bytes_read_total", "counter", "Input bytes read by the job.",
+           [(_labels(job=j), p["bytes_read"]) for j, p in progress])
+    family("replay_progress_ratio", "gauge", "Share of the input consumed.",
+           [(_labels(job=j), p["fraction"]) for j, p in progress])
+    snaps = [(j, p["metrics"]) for j, p in progress if p.get("metrics")]
+    family("replay_stage_items_total", "counter", "Items processed per replay stage.",
+           [(_labels(job=j, stage=s), st["count"]) for j, m in snaps for s, st in m["stages"].items()])
+    family("replay_stage_seconds_total", "counter", "Time spent per replay stage (estimated from samples).",
+           [(_labels(job=j, stage=s), st["seconds"]) for j, m in snaps for s, st in m["stages"].items()])
+    hist = []
+    for j, m in snaps:
+        for s, st in m["stages"].items():
+            h = st.get("histogram")
+            if not h:
+                continue
+            cum = 0
+            for le, n in zip(BUCKETS + ("+Inf",), h["buckets"]):
+                cum += n
+                hist.append(f"replay_stage_latency_seconds_bucket{_labels(job=j, stage=s, le=le)} {cum}")
+            hist.append(f"replay_stage_latency_seconds_sum{_labels(job=j, stage=s)} {h['sum']}")
+            hist.append(f"replay_stage_latency_seconds_count{_labels(job=j, stage=s)} {st['sampled']}")
+    if hist:
+        lines.append("# HELP replay_stage_latency_seconds Sampled per-item latency per replay stage.")
+        lines.append("# TYPE replay_stage_latency_seconds histogram")
+        lines.extend(hist)
+    family("replay_queue_depth", "gauge", "Last sampled depth of a replay queue.",
+           [(_labels(job=j, queue=q), g["last"]) for j, m in snaps for q, g in m["gauges"].items()])
+    family("replay_queue_depth_max", "gauge", "Largest sampled depth of a replay queue.",
+           [(_labels(job=j, queue=q), g["max"]) for j, m in snaps for q, g in m["gauges"].items()])
+    for name, (help_text, samples) in (extra_gauges or {}).items():
+        family(name, "gauge", help_text, [(_labels(**dict(k)), v) for k, v in samples.items()])
+    return "\n".join(lines) + "\n"
+
+
+# -- sampling profiler -------------------------------------------------------
+
+class SamplingProfiler:
+    """
+    Samples the calling thread's stack every `interval` seconds (wall clock);
+    writes folded stacks on stop().
+
+    On the main thread of a Unix process a SIGALRM interval timer interrupts
+    the replay wherever it is. Elsewhere a helper thread reads the stack with
+    sys._current_frames(); it only gets to run when the replay thread lets go
+    of the GIL, so those samples lean towards I/O and lock waits.
+    """
+    def __init__(self, path, interval=0.005):
+        self.path = path
+        self.interval = max(0.0005, float(interval))
+        self.thread_id = threading.get_ident()
+        self.use_signal = hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._previous = None
+        self._running = False
+        self._t0 = None
+
+    def start(self):
+        self._t0 = time.monotonic()
+        self._running = True
+        if self.use_signal:
+            self._previous = signal.signal(signal.SIGALRM, self._on_signal)
+            signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+        else:
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+        return self
+
+    def _record(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _on_signal(self, _signum, frame):
+        self._record(frame)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._record(frame)
+
+    def stop(self):
+        """Stops sampling and writes the folded stacks. Returns profile stats."""
+        if not self._running:
+            return None
+        self._running = False
+        if self.use_signal:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._previous if self._previous is not None else signal.SIG_DFL)
+        else:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                for stack, n in sorted(self.stacks.items()):
+                    f.write(f"{stack} {n}\n")
+        except (IOError, OSError) as e:
+            print(f"[ERROR] Failed to write profile {self.path}: {e}", file=sys.stderr)
+        return {"file": self.path, "samples": self.samples, "interval_ms": self.interval * 1e3,
+                "mode": "signal" if self.use_signal else "thread",
+                "seconds": round(time.monotonic() - self._t0, 3), "stacks": len(self.stacks)}
@@ -0,0 +1,146 @@
+# app/replay_scheduler.py
+"""
+Pacing for --real-time and --max-rate.
+
+Every event gets a due time on a monotonic clock, computed from an anchor
+taken at the first event instead of from the previous sleep, so processing
+time and sleep overshoot don't add up:
+
+  real time : due = wall0 + (event_time - event0) / speed
+  max rate  : due = wall0 + n / max_rate
+
+Events that share a timestamp are released together (only the first one of
+the batch waits). If the replay falls behind (a slow consumer, a GC pause),
+events go out without waiting until the schedule is met again; with
+`max_lag` the anchor is moved instead once the lag exceeds it. A gap longer
+than `max_sleep` wall seconds is shortened to `max_sleep` by moving the
+anchor. The wait sleeps until `spin` seconds before the due time and then
+busy-waits, which keeps the error well under a millisecond.
+"""
+import random
+import time
+
+
+def percentiles(values, ps=(50, 90, 99, 99.9)):
+    if not values:
+        return {}
+    s = sorted(values)
+    out = {}
+    for p in ps:
+        k = min(len(s) - 1, int(round(p / 100.0 * (len(s) - 1))))
+        out[f"p{p:g}"] = s[k]
+    out["max"] = s[-1]
+    return out
+
+
+class ReplayScheduler:
+    def __init__(self, real_time=False, speed=1.0, max_rate=0.0, max_sleep=None, max_lag=None,
+                 spin=0.002, samples=100000, clock=time.perf_counter, sleep=time.sleep):
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        self.real_time = real_time
+        self.speed = float(speed)
+        self.max_rate = float(max_rate or 0)
+        self.max_sleep = max_sleep
+        self.max_lag = max_lag
+        self.spin = spin
+        self.clock = clock
+        self.sleep = sleep
+        self._wall0 = None
+        self._ev0 = None
+        self._last_t = None
+        self._n = 0
+        self._prev_lag = None
+        self._samples = samples
+        self._rng = random.Random(0)
+        self._seen = 0
+        self.lags = []          # reservoir of per-batch lag (seconds, >= 0 once due)
+        self.jitter = []        # reservoir of |lag - previous lag|
+        self.events = 0
+        self.batches = 0
+        self.late_batches = 0
+        self.reanchors = 0
+        self.capped_gaps = 0
+        self.slept = 0.0
+
+    def active(self):
+        return self.real_time or self.max_rate > 0
+
+    def _due(self, ts, now):
+        if self.real_time:
+            t = ts.timestamp()
+            if self._wall0 is None:
+                self._wall0, self._ev0, self._last_t = now, t, t
+                return now
+            if t == self._last_t:
+                return None  # same timestamp: part of the batch already released
+            gap = (t - self._last_t) / self.speed
+            if self.max_sleep is not None and gap > self.max_sleep:
+                self._wall0 -= gap - self.max_sleep
+                self.capped_gaps += 1
+            self._last_t = t
+            return self._wall0 + (t - self._ev0) / self.speed
+        if self._wall0 is None:
+            self._wall0 = now
+        due = self._wall0 + self._n / self.max_rate
+        self._n += 1
+        return due
+
+    def wait(self, ts):
+        """Block until the event with time `ts` is due."""
+        if not self.active():
+            return
+        self.events += 1
+        now = self.clock()
+        due = self._due(ts, now)
+        if due is None:
+            return
+        self.batches += 1
+        if self.max_lag is not None and now - due > self.max_lag:
+            # too far behind: drop the backlog from the schedule instead of bursting
+            self._wall0 += now - due
+            due = now
+            self.reanchors += 1
+        remaining = due - now
+        if remaining > 0:
+            if remaining > self.spin:
+                self.sleep(remaining - self.spin)
+            now = self.clock()
+            while now < due:
+                now = self.clock()
+            self.slept += remaining
+        lag = now - due
+        if lag > 0.001:
+            self.late_batches += 1
+        self._record(lag)
+
+    def _record(self, lag):
+        jit = abs(lag - self._prev_lag) if self._prev_lag is not None else None
+        self._prev_lag = lag
+        self._seen += 1
+        if len(self.lags) < self._samples:
+            self.lags.append(lag)
+            if jit is not None:
+                self.jitter.append(jit)
+            return
+        j = self._rng.randrange(self._seen)
+        if j < self._samples:
+            self.lags[j] = lag
+            if jit is not None and j < len(self.jitter):
+                self.jitter[j] = jit
+
+    def stats(self):
+        ms = lambda d: {k: round(v * 1000, 4) for k, v in d.items()}
+        return {
+            "mode": "real_time" if self.real_time else ("max_rate" if self.max_rate > 0 else "off"),
+            "speed": self.speed if self.real_time else None,
+            "max_rate": self.max_rate or None,
+            "events": self.events,
+            "batches": self.batches,
+            "late_batches": self.late_batches,
+            "reanchors": self.reanchors,
+            "capped_gaps": self.capped_gaps,
+            "slept_seconds": round(self.slept, 6),
+            "lag_ms": ms(percentiles(self.lags)),
+            "jitter_ms": ms(percentiles(self.jitter)),
+        }
@@ -0,0 +1,140 @@
+# app/report_streams.py
+"""
+Report files written while the replay runs instead of at the end.
+
+  DebugReportWriter  the debug JSON + CSV; JSONL if the JSON path ends in
+                     .jsonl, otherwise a JSON array that is closed on close()
+  TimelineWriter     one JSON line per replayed event for the HTML report
+  StreamedTimeline   re-iterable view over a timeline file
+
+Each writer holds at most `buffer_lines` lines before writing them out, so
+memory stays flat and an interrupted run leaves everything up to the last
+flush on disk (a JSONL debug report is then complete up to that point; an
+array one is only missing its closing bracket).
+"""
+import csv
+import io
+import json
+import os
+
+
+def _makedirs_for(path):
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+
+
+class DebugReportWriter:
+    def __init__(self, json_path, csv_path, buffer_lines=256):
+        self.json_path = json_path
+        self.csv_path = csv_path
+        self.buffer_lines = max(1, int(buffer_lines))
+        self.jsonl = json_path.endswith('.jsonl')
+        self.entries = 0
+        self._json_buf = []
+        self._csv_buf = io.StringIO()
+        self._csv = csv.writer(self._csv_buf)
+        self._pending = 0
+        _makedirs_for(json_path)
+        _makedirs_for(csv_path)
+        self._jf = open(json_path, 'w', encoding='utf-8')
+        self._cf = open(csv_path, 'w', encoding='utf-8', newline='')
+        if not self.jsonl:
+            self._jf.write('[')
+        self._csv.writerow(['log_index', 'file', 'original', 'issues'])
+
+    def write(self, entry):
+        if self.jsonl:
+            self._json_buf.append(json.dumps(entry, ensure_ascii=False) + '\n')
+        else:
+            sep = ',\n' if self.entries else '\n'
+            self._json_buf.append(sep + json.dumps(entry, indent=2, ensure_ascii=False))
+        self._csv.writerow([entry.get('log_index'), entry.get('file'),
+                            json.dumps(entry.get('original', {}), ensure_ascii=False),
+                            "; ".join(entry.get('issues', []))])
+        self.entries += 1
+        self._pending += 1
+        if self._pending >= self.buffer_lines:
+            self.flush()
+
+    def flush(self):
+        if self._json_buf:
+            self._jf.write(''.join(self._json_buf))
+            self._json_buf = []
+        data = self._csv_buf.getvalue()
+        if data:
+            self._cf.write(data)
+            self._csv_buf.seek(0)
+            self._csv_buf.truncate()
+        self._jf.flush()
+        self._cf.flush()
+        self._pending = 0
+
+    def close(self):
+        if self._jf.closed:
+            return
+        try:
+            self.flush()
+            if not self.jsonl:
+                self._jf.write('\n]\n' if self.entries else ']\n')
+        finally:
+            self._jf.close()
+            self._cf.close()
+
+
+class TimelineWriter:
+    def __init__(self, path, buffer_lines=1000):
+        self.path = path
+        self.buffer_lines = max(1, int(buffer_lines))
+        self.events = 0
+        self._buf = []
+        _makedirs_for(path)
+        self._f = open(path, 'w', encoding='utf-8')
+
+    def write(self, event):
+        self._buf.append(json.dumps(event, ensure_ascii=False) + '\n')
+        self.events += 1
+        if len(self._buf) >= self.buffer_lines:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            self._f.write(''.join(self._buf))
+            self._buf = []
+        self._f.flush()
+
+    def close(self):
+        if not self._f.closed:
+            try:
+                self.flush()
+            finally:
+                self._f.close()
+
+    def timeline(self):
+        return StreamedTimeline(self.path, self.events)
+
+
+class StreamedTimeline:
+    """Iterates the events of a timeline file; each iteration re-reads the file."""
+    def __init__(self, path, count=None):
+        self.path = path
+        self._count = count
+
+    def __iter__(self):
+        try:
+            f = open(self.path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # cut short by an interrupted run
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def __len__(self):
+        if self._count is None:
+            self._count = sum(1 for _ in self)
+        return self._count
@@ -1,16 +1,78 @@
 # app/root_cause_analyzer.py
+from collections import Counter, OrderedDict
+
+
+class RootCauseEngine:
+    """
+    Incremental root-cause ranking over correlation flows.
+
+    Only failures are fed in (observe_failure), in replay order. The first
+    failing service of a correlation flow is taken as the root of that chain;
+    every later failure in the same flow counts as a downstream failure of
+    that root. Candidates are ranked by downstream failures, then by chains
+    rooted. Failures without a correlation id only count as failures.
+    At most `max_flows` flows are remembered (least recently failing dropped).
+    """
+    def __init__(self, max_flows=100000):
+        self.max_flows = max_flows
+        self._roots = OrderedDict()      # corr -> root service
+        self.failures = Counter()        # service -> failures seen
+        self.chains = Counter()          # service -> chains it rooted
+        self.downstream = Counter()      # root service -> later failures in its chains
+        self.affected = {}               # root service -> Counter(downstream service)
+        self.flows_forgotten = 0
+
+    def observe_failure(self, service, correlation_id=None):
+        self.failures[service] += 1
+        if not correlation_id:
+            return
+        root = self._roots.get(correlation_id)
+        if root is None:
+            self._roots[correlation_id] = service
+            self.chains[service] += 1
+            if self.max_flows is not None and len(self._roots) > self.max_flows:
+                self._roots.popitem(last=False)
+                self.flows_forgotten += 1
+            return
+        self._roots.move_to_end(correlation_id)
+        self.downstream[root] += 1
+        aff = self.affected.get(root)
+        if aff is None:
+            aff = self.affected[root] = Counter()
+        aff[service] += 1
+
+    def ranking(self, top=None):
+        rows = [{"service": svc,
+                 "downstream_failures": self.downstream[svc],
+                 "chains_rooted": self.chains[svc],
+                 "failures": n,
+                 "affected_services": dict(self.affected.get(svc, {}))}
+                for svc, n in self.failures.items()]
+        rows.sort(key=lambda r: (-r["downstream_failures"], -r["chains_rooted"], -r["failures"], str(r["service"])))
+        return rows[:top] if top else rows
+
+    def report(self, top=10):
+        if not self.failures:
+            return {"result": "no_root_found"}
+        ranking = self.ranking(top)
+        best = ranking[0]
+        return {"root_service": best["service"], "count": best["failures"],
+                "downstream_failures": best["downstream_failures"],
+                "ranking": ranking, "flows_forgotten": self.flows_forgotten}
+
+
 def find_root_cause(detected_bugs):
-    # detected_bugs: list of strings where each begins with "[ERROR] service ..."
-    counts = {}
+    # detected_bugs: structured bug records (dicts with type/service/correlation_id)
+    # or the older strings where each begins with "[ERROR] service ..."
+    engine = RootCauseEngine()
     for b in detected_bugs:
-        if b.startswith("[ERROR] "):
+        if isinstance(b, dict):
+            if b.get("type") == "ERROR":
+                engine.observe_failure(b.get("service"), b.get("correlation_id"))
+        elif b.startswith("[ERROR] "):
             try:
                 rest = b[len("[ERROR] "):]
-                svc = rest.split()[0]
-                counts[svc] = counts.get(svc,0) + 1
-            except:
+                engine.observe_failure(rest.split()[0])
+            except IndexError:
                 pass
-    if not counts:
-        return {"result":"no_root_found"}
-    top = max(counts, key=lambda k:counts[k])
-    return {"root_service": top, "count": counts[top]}
+    return engine.report()
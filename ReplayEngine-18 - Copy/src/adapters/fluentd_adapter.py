@@ -1,44 +1,145 @@
 """Adapter to read logs from Universal Logging Microservice"""
 import subprocess
 import json
-from datetime import datetime
+import sys
+import tempfile
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+DEFAULT_COMMAND = ("docker", "logs")
+
+
+def parse_docker_ts(text):
+    """Nanoseconds since the epoch from a `docker logs --timestamps` prefix (RFC 3339, trailing zeros trimmed)."""
+    if text.endswith('Z'):
+        text = text[:-1]
+    whole, _, frac = text.partition('.')
+    secs = datetime.strptime(whole, '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+    return int(secs) * 1_000_000_000 + int((frac + '000000000')[:9])
+
 
 class FluentdLogAdapter:
-    """Reads logs from Fluentd container"""
-    
-    def __init__(self):
-        self.logs = []
-    
+    """
+    Reads logs from Fluentd container.
+
+    Each poll() asks only for what was logged since the last line seen
+    (`docker logs --timestamps --since <cursor>`), so a poll costs as much as
+    the new output. --since is inclusive; lines at the cursor timestamp that
+    were already returned are recognised by their text and skipped, as many
+    times as each text was seen there (two identical lines at one timestamp
+    are two records).
+
+    The newest `max_logs` records are kept in self.logs, indexed by
+    session_id and source; older ones are dropped from both. `command` is
+    the program run with the container name and the docker logs options,
+    e.g. a stand-in script in tests.
+    """
+
+    def __init__(self, container="universal-logging-fluentd", command=DEFAULT_COMMAND, max_logs=100000):
+        self.container = container
+        self.command = list(command)
+        self.max_logs = max_logs
+        self.logs = deque()
+        self.by_session = {}
+        self.by_source = {}
+        self.cursor = None           # (ns, timestamp text) of the newest line seen
+        self._boundary = Counter()   # times each line was seen at the cursor timestamp
+        self.counters = {"polls": 0, "lines_read": 0, "duplicates": 0, "records": 0, "skipped": 0,
+                         "evicted": 0}
+
+    def _args(self, limit):
+        args = self.command + [self.container, "--timestamps"]
+        if self.cursor is not None:
+            return args + ["--since", self.cursor[1]]
+        return args + (["--tail", str(limit)] if limit else [])
+
+    def _index(self, log):
+        self.logs.append(log)
+        for index, key in ((self.by_session, log.get('session_id')), (self.by_source, log.get('source'))):
+            if key is not None:
+                index.setdefault(key, deque()).append(log)
+        while len(self.logs) > self.max_logs:
+            old = self.logs.popleft()
+            self.counters["evicted"] += 1
+            # the oldest record overall is also the oldest under its keys
+            for index, key in ((self.by_session, old.get('session_id')), (self.by_source, old.get('source'))):
+                if key is not None:
+                    bucket = index[key]
+                    bucket.popleft()
+                    if not bucket:
+                        del index[key]
+
+    def poll(self, limit=None):
+        """
+        Yield the records logged since the last poll, oldest first. `limit`
+        caps the first poll (docker's --tail); later polls return everything
+        new. The cursor only moves past records that were yielded.
+        """
+        self.counters["polls"] += 1
+        with tempfile.TemporaryFile() as err:
+            try:
+                proc = subprocess.Popen(self._args(limit), stdout=subprocess.PIPE, stderr=err, text=True,
+                                        encoding='utf-8', errors='replace')
+            except OSError as e:
+                print(f"❌ Error fetching logs: {e}", file=sys.stderr)
+                return
+            repeats = Counter()          # lines at the cursor timestamp seen in this poll
+            try:
+                for line in proc.stdout:
+                    self.counters["lines_read"] += 1
+                    stamp, _, body = line.rstrip('\r\n').partition(' ')
+                    try:
+                        ns = parse_docker_ts(stamp)
+                    except ValueError:
+                        self.counters["skipped"] += 1
+                        continue
+                    if self.cursor is not None and ns < self.cursor[0]:
+                        self.counters["duplicates"] += 1
+                        continue
+                    if self.cursor is not None and ns == self.cursor[0]:
+                        repeats[body] += 1
+                        if repeats[body] <= self._boundary[body]:
+                            self.counters["duplicates"] += 1
+                            continue
+                        self._boundary[body] += 1
+                    else:
+                        self.cursor = (ns, stamp)
+                        self._boundary = Counter({body: 1})
+                        repeats = Counter({body: 1})
+                    try:
+                        log = json.loads(body) if body.strip() else None
+                    except json.JSONDecodeError:
+                        log = None
+                    if not isinstance(log, dict):
+                        self.counters["skipped"] += 1
+                        continue
+                    self._index(log)
+                    self.counters["records"] += 1
+                    yield log
+                if proc.wait() != 0:
+                    err.seek(0)
+                    msg = err.read().decode('utf-8', 'replace').strip()
+                    print(f"❌ Error fetching logs: exit {proc.returncode}: {msg}", file=sys.stderr)
+            finally:
+                if proc.poll() is None:
+                    proc.kill()
+                proc.stdout.close()
+                proc.wait()
+
     def fetch_logs(self, limit=1000):
-        """Fetch logs from Fluentd Docker container"""
-        try:
-            result = subprocess.run(
-                ["docker", "logs", "universal-logging-fluentd", "--tail", str(limit)],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            
-            # Parse JSON logs
-            for line in result.stdout.strip().split('\n'):
-                try:
-                    if line.strip():
-                        log = json.loads(line)
-                        self.logs.append(log)
-                except json.JSONDecodeError:
-                    continue
-            
-            print(f"✅ Fetched {len(self.logs)} logs from Universal Logging")
-            return self.logs
-            
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Error fetching logs: {e}")
-            return []
-    
+        """Fetch new logs from Fluentd Docker container; returns all retained logs"""
+        new = sum(1 for _ in self.poll(limit))
+        print(f"✅ Fetched {new} new logs from Universal Logging ({len(self.logs)} kept)")
+        return list(self.logs)
+
     def get_logs_by_session(self, session_id):
         """Get all logs for a specific session"""
-        return [log for log in self.logs if log.get('session_id') == session_id]
-    
+        return list(self.by_session.get(session_id, ()))
+
     def get_logs_by_source(self, source):
         """Get logs from specific source"""
-        return [log for log in self.logs if log.get('source') == source]
\ No newline at end of file
+        return list(self.by_source.get(source, ()))
+
+    def stats(self):
+        return dict(self.counters, kept=len(self.logs), sessions=len(self.by_session), sources=len(self.by_source),
+                    cursor=self.cursor[1] if self.cursor else None)
@@ -0,0 +1,188 @@
+# app/synthetic_logs.py
+"""
+Deterministic synthetic logs shaped like events.log.
+
+generate() writes `files` files (events.log, events.log.1, ...) holding
+`events` records in all, or about `size_mb` MB. The same arguments and seed
+always give the same bytes. Records look like the real ones (timestamp,
+event_type, amount, level, source, message, correlationId):
+
+  services        how many "<name>-service" sources write
+  fanout          events per correlation flow; `concurrency` flows are open
+                  at once, and `uncorrelated` is the share of events without
+                  a correlation id
+  error_rate      chance an event is an ERROR; once a flow has failed, each of
+                  its later events fails with chance `cascade` (root causes)
+  gap_rate        chance of a `gap_seconds` pause before an event (TIMEOUTs)
+  ts_formats      timestamp formats, one per file in turn (iso_z, iso_offset,
+                  epoch_s, epoch_ms, or mixed: a random one per record)
+  disorder        share of events written up to `max_lateness` seconds late
+  layout          interleave: each file gets the events of some services, so
+                  all files cover the whole time range (like per-service
+                  logs); rotate: consecutive time slices, newest in events.log
+"""
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+TS_FORMATS = ('iso_z', 'iso_offset', 'epoch_s', 'epoch_ms', 'mixed')
+LAYOUTS = ('interleave', 'rotate')
+START = datetime(2025, 10, 4, tzinfo=timezone.utc)
+SERVICE_NAMES = ('auth', 'cart', 'payment', 'inventory', 'shipping', 'search', 'user', 'notification',
+                 'pricing', 'review')
+EVENT_TYPES = ('login', 'fetch_cart', 'payment_request', 'inventory_check', 'ship_order', 'search',
+               'update_profile', 'notify', 'price_quote', 'post_review')
+INFO_MESSAGES = ('request handled', 'cache hit', 'cache miss, loaded from db', 'user login successful',
+                 'item reserved', 'order confirmed')
+ERROR_MESSAGES = ('Database connection timeout', 'Upstream returned 503', 'NullPointerException in handler',
+                  'Payment gateway declined', 'Connection reset by peer')
+_OFFSET = timezone(timedelta(hours=5, minutes=30))
+
+
+def _format_ts(ts, fmt, rnd):
+    if fmt == 'mixed':
+        fmt = rnd.choice(TS_FORMATS[:-1])
+    if fmt == 'iso_z':
+        return ts.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    if fmt == 'iso_offset':
+        return ts.astimezone(_OFFSET).isoformat(timespec='milliseconds')
+    if fmt == 'epoch_s':
+        return round(ts.timestamp(), 3)
+    return int(ts.timestamp() * 1000)
+
+
+def file_names(files, prefix='events.log'):
+    return [prefix] + [f"{prefix}.{i}" for i in range(1, files)]
+
+
+def _events(rnd, services, fanout, concurrency, uncorrelated, error_rate, cascade, gap_rate, gap_seconds,
+            interval):
+    """Endless (ts, service index, record) in time order."""
+    ts = START
+    flows = []           # [corr, events left, failed]
+    next_flow = 0
+    names = [f"{SERVICE_NAMES[i % len(SERVICE_NAMES)]}-service" + (f"-{i // len(SERVICE_NAMES)}"
+                                                                   if i >= len(SERVICE_NAMES) else "")
+             for i in range(services)]
+    while True:
+        ts += timedelta(seconds=gap_seconds if rnd.random() < gap_rate else rnd.expovariate(1.0 / interval))
+        svc = rnd.randrange(services)
+        rec = {"timestamp": None, "event_type": EVENT_TYPES[svc % len(EVENT_TYPES)],
+               "amount": rnd.choice((0, 0, 0, rnd.randrange(1, 1000))), "level": "INFO", "source": names[svc],
+               "message": None}
+        failed = rnd.random() < error_rate
+        if rnd.random() >= uncorrelated:
+            if len(flows) < concurrency:
+                flows.append([f"req-{next_flow}", fanout, False])
+                next_flow += 1
+            i = rnd.randrange(len(flows))
+            flow = flows[i]
+            failed = failed or (flow[2] and rnd.random() < cascade)
+            flow[2] = flow[2] or failed
+            rec["correlationId"] = flow[0]
+            flow[1] -= 1
+            if flow[1] <= 0:
+                flows[i] = flows[-1]
+                flows.pop()
+        if failed:
+            rec["level"] = "ERROR"
+            rec["message"] = rnd.choice(ERROR_MESSAGES)
+        else:
+            rec["level"] = rnd.choice(("INFO", "INFO", "INFO", "DEBUG", "WARN"))
+            rec["message"] = rnd.choice(INFO_MESSAGES)
+        yield ts, svc, rec
+
+
+def generate(out_dir, events=100000, size_mb=None, files=3, services=6, fanout=5, concurrency=50,
+             uncorrelated=0.2, error_rate=0.02, cascade=0.5, gap_rate=0.0005, gap_seconds=10.0, interval=0.05,
+             ts_formats=('iso_z',), disorder=0.0, max_lateness=2.0, layout='interleave', prefix='events.log',
+             seed=1):
+    """Write the files into `out_dir`; returns a manifest of what was written (also saved as manifest.json)."""
+    for fmt in ts_formats:
+        if fmt not in TS_FORMATS:
+            raise ValueError(f"timestamp format must be one of {TS_FORMATS}")
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of {LAYOUTS}")
+    rnd = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    names = file_names(files, prefix)
+    paths = [os.path.join(out_dir, n) for n in names]
+    outs = [open(p, 'w', encoding='utf-8', newline='\n') for p in paths]
+    limit = int(size_mb * (1 << 20)) if size_mb else None
+    per_file = None
+    if layout == 'rotate':
+        # oldest slice goes to the highest suffix, like logrotate leaves them
+        outs.reverse()
+        per_file = -(-events // files) if limit is None else -(-limit // files)
+    written = bytes_out = late = errors = 0
+    sizes = [0] * files
+    counts = [0] * files
+    try:
+        for ts, svc, rec in _events(rnd, services, fanout, concurrency, uncorrelated, error_rate, cascade,
+                                    gap_rate, gap_seconds, interval):
+            if (limit is None and written >= events) or (limit is not None and bytes_out >= limit):
+                break
+            if layout == 'interleave':
+                f = svc % files
+            else:
+                f = min(files - 1, (written if limit is None else bytes_out) // per_file)
+            stamp = ts
+            if disorder and rnd.random() < disorder:
+                stamp = ts - timedelta(seconds=rnd.uniform(0, max_lateness))
+                late += 1
+            rec["timestamp"] = _format_ts(stamp, ts_formats[f % len(ts_formats)], rnd)
+            line = json.dumps(rec, separators=(',', ':')) + "\n"
+            outs[f].write(line)
+            errors += rec["level"] == "ERROR"
+            written += 1
+            bytes_out += len(line)
+            sizes[f] += len(line)
+            counts[f] += 1
+    finally:
+        for out in outs:
+            out.close()
+    if layout == 'rotate':
+        sizes.reverse()
+        counts.reverse()
+    manifest = {
+        "files": {n: {"events": c, "bytes": s, "ts_format": ts_formats[(files - 1 - i if layout == 'rotate' else i)
+                                                                          % len(ts_formats)]}
+                  for i, (n, c, s) in enumerate(zip(names, counts, sizes))},
+        "events": written, "bytes": bytes_out, "errors": errors, "late_events": late,
+        "params": {"events": events, "size_mb": size_mb, "files": files, "services": services, "fanout": fanout,
+                   "concurrency": concurrency, "uncorrelated": uncorrelated, "error_rate": error_rate,
+                   "cascade": cascade, "gap_rate": gap_rate, "gap_seconds": gap_seconds, "interval": interval,
+                   "ts_formats": list(ts_formats), "disorder": disorder, "max_lateness": max_lateness,
+                   "layout": layout, "seed": seed},
+    }
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+if __name__ == '__main__':
+    import argparse
+    p = argparse.ArgumentParser(description='write deterministic synthetic events.log* files')
+    p.add_argument('out_dir')
+    p.add_argument('--events', type=int, default=100000)
+    p.add_argument('--size-mb', type=float, default=None, help='write about this much instead of --events')
+    p.add_argument('--files', type=int, default=3)
+    p.add_argument('--services', type=int, default=6)
+    p.add_argument('--fanout', type=int, default=5, help='events per correlation flow')
+    p.add_argument('--concurrency', type=int, default=50, help='correlation flows open at once')
+    p.add_argument('--uncorrelated', type=float, default=0.2, help='share of events without a correlation id')
+    p.add_argument('--error-rate', type=float, default=0.02)
+    p.add_argument('--cascade', type=float, default=0.5, help='chance a failed flow fails again')
+    p.add_argument('--gap-rate', type=float, default=0.0005)
+    p.add_argument('--ts-formats', default='iso_z', help=f"comma separated, from {','.join(TS_FORMATS)}")
+    p.add_argument('--disorder', type=float, default=0.0, help='share of events written late')
+    p.add_argument('--max-lateness', type=float, default=2.0)
+    p.add_argument('--layout', choices=LAYOUTS, default='interleave')
+    p.add_argument('--prefix', default='events.log')
+    p.add_argument('--seed', type=int, default=1)
+    a = p.parse_args()
+    m = generate(a.out_dir, a.events, a.size_mb, a.files, a.services, a.fanout, a.concurrency, a.uncorrelated,
+                 a.error_rate, a.cascade, a.gap_rate, ts_formats=tuple(a.ts_formats.split(',')),
+                 disorder=a.disorder, max_lateness=a.max_lateness, layout=a.layout, prefix=a.prefix, seed=a.seed)
+    print(f"[INFO] wrote {m['events']} events, {m['bytes'] / 1e6:.1f} MB in {len(m['files'])} files")
@@ -0,0 +1,94 @@
+"""Tests for BugDetector's bounded-memory mode"""
+import sys
+import os
+import json
+from datetime import datetime, timedelta, timezone
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bug_detector import BugDetector
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _events(n):
+    for i in range(n):
+        yield T0 + timedelta(seconds=i), {"source": f"svc{i % 3}", "level": "ERROR" if i % 4 == 0 else "INFO",
+                                          "message": f"m{i}", "correlationId": f"c{i % 50}"}
+
+
+def test_bounded_totals_match_unbounded(tmp_path):
+    full = BugDetector()
+    spill = str(tmp_path / "flows.jsonl")
+    small = BugDetector(max_flows=5, max_flow_events=2, max_bug_samples=3, spill_path=spill)
+    for ts, rec in _events(400):
+        full.analyze(ts, rec)
+        small.analyze(ts, rec)
+    small.close()
+    assert small.error_summary() == full.error_summary()
+    report = small.sampling_report()
+    assert report["sampled"] and report["bugs_total"] == len(full.get_detected_bugs())
+    assert len(small.get_detected_bugs()) == 3 * 3
+    assert len(small.correlation_report()) == 5
+    with open(spill) as f:
+        spilled = [json.loads(line) for line in f]
+    assert len(spilled) == report["flows_evicted"]
+    kept = sum(len(v) for v in small.correlation_report().values())
+    assert kept + sum(s["events"] for s in spilled) == report["correlated_events"] == 400
+
+
+def test_evicted_flows_are_summarised_without_a_spill_file():
+    d = BugDetector(max_flows=5, max_flow_events=2, max_bug_samples=3)
+    for ts, rec in _events(400):
+        d.analyze(ts, rec)
+    report = d.sampling_report()
+    ev = report["evicted_flows"]
+    kept = sum(len(v) for v in d.correlation_report().values())
+    assert kept + ev["events"] == report["correlated_events"] == 400
+    # ids come round every 50 events, so every flow is evicted after one event
+    assert ev["by_size"] == {"1": report["flows_evicted"]} and ev["max_seconds"] == 0.0
+    assert sum(ev["by_source"].values()) == report["flows_evicted"]
+    assert len(ev["largest"]) == 20 and "flow" not in ev["largest"][0]
+
+    # idle eviction keeps flows long enough to grow
+    d = BugDetector(flow_idle_timeout=30)
+    for i in range(200):
+        d.analyze(T0 + timedelta(seconds=i), {"source": "a", "correlationId": f"c{i // 40}"})
+    ev = d.sampling_report()["evicted_flows"]
+    assert ev["by_size"] == {"21-100": 4} and ev["max_seconds"] == 39.0
+    assert [s["correlation_id"] for s in ev["largest"]] == ["c0", "c1", "c2", "c3"]
+    assert report["bug_samples"] == "first 3 per kind and service"
+    assert BugDetector().sampling_report()["evicted_flows"] is None
+
+
+def test_idle_flows_are_evicted_in_event_time():
+    d = BugDetector(flow_idle_timeout=10)
+    d.analyze(T0, {"source": "a", "correlationId": "x"})
+    d.analyze(T0 + timedelta(seconds=5), {"source": "a", "correlationId": "y"})
+    d.analyze(T0 + timedelta(seconds=12), {"source": "a", "correlationId": "y"})
+    assert list(d.correlation_report()) == ["y"]
+    assert d.sampling_report()["flows_evicted"] == 1
+
+
+def test_root_cause_follows_first_failure_in_flow():
+    d = BugDetector()
+    seq = [("db", "r1"), ("api", "r1"), ("web", "r1"), ("db", "r2"), ("api", "r2"),
+           ("web", "r3"), ("web", None), ("web", None)]
+    for i, (svc, corr) in enumerate(seq):
+        d.analyze(T0 + timedelta(seconds=i), {"source": svc, "level": "ERROR", "correlationId": corr}, i)
+    report = d.root_cause_report()
+    assert report["root_service"] == "db"
+    assert report["ranking"][0]["downstream_failures"] == 3
+    assert report["ranking"][0]["affected_services"] == {"api": 2, "web": 1}
+    rec = d.get_bug_records()[0]
+    assert (rec["type"], rec["service"], rec["correlation_id"], rec["log_index"]) == ("ERROR", "db", "r1", 0)
+
+
+def test_find_root_cause_accepts_strings_and_records():
+    from root_cause_analyzer import find_root_cause
+    assert find_root_cause([]) == {"result": "no_root_found"}
+    old = find_root_cause(["[ERROR] api at t -> x", "[ERROR] api at t -> y", "[ERROR] db at t -> z"])
+    assert (old["root_service"], old["count"]) == ("api", 2)
+    recs = [{"type": "ERROR", "service": "db", "correlation_id": "c"},
+            {"type": "ERROR", "service": "api", "correlation_id": "c"},
+            {"type": "ERROR", "service": "api", "correlation_id": None}]
+    assert find_root_cause(recs)["root_service"] == "db"
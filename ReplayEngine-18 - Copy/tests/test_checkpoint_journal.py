@@ -0,0 +1,54 @@
+"""Tests for the append-only checkpoint journal"""
+import sys
+import os
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from checkpoint_journal import CheckpointJournal, load_state
+
+
+def test_state_is_rebuilt_from_journal(tmp_path):
+    path = str(tmp_path / "replay.checkpoint.json")
+    j = CheckpointJournal(path, fsync_every=1, compact_every=1000)
+    j.save({"a.log": 10})
+    j.save({"a.log": 20, "b.log": 5})
+    # no close(): as if the process had died
+    assert load_state(path) == {"a.log": 20, "b.log": 5}
+    assert not os.path.exists(path)
+
+
+def test_torn_final_record_is_ignored(tmp_path):
+    path = str(tmp_path / "replay.checkpoint.json")
+    j = CheckpointJournal(path, fsync_every=1)
+    j.save({"a.log": 10})
+    j.save({"a.log": 20})
+    with open(path + ".journal", "ab") as f:
+        f.write(b'0badc0de {"o":{"a.log":9')
+    assert load_state(path) == {"a.log": 20}
+    # reopening drops the torn tail and keeps appending cleanly
+    j2 = CheckpointJournal(path)
+    j2.save({"a.log": 30})
+    assert load_state(path) == {"a.log": 30}
+
+
+def test_reads_old_checkpoint_format(tmp_path):
+    path = str(tmp_path / "replay.checkpoint.json")
+    with open(path, "w") as f:
+        json.dump({"logs/events.log": 1216}, f, indent=2)
+    j = CheckpointJournal(path)
+    assert j.state == {"logs/events.log": 1216}
+    j.save({"logs/events.log": 2000})
+    j.close()
+    with open(path) as f:
+        assert json.load(f) == {"logs/events.log": 2000}
+    assert not os.path.exists(path + ".journal")
+
+
+def test_compaction_keeps_latest_state(tmp_path):
+    path = str(tmp_path / "replay.checkpoint.json")
+    j = CheckpointJournal(path, compact_every=3)
+    for i in range(10):
+        j.save({"a.log": i, "b.log": i * 2})
+    j.close()
+    assert load_state(path) == {"a.log": 9, "b.log": 18}
+    assert j.stats()["compactions"] >= 1
@@ -0,0 +1,91 @@
+"""Tests for streaming compressed input"""
+import sys
+import os
+import bz2
+import gzip
+import io
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from compressed_input import SeekIndex, compress_file, set_index_dir
+from log_reader import ReaderStats, iter_lines
+from replay_engine import load_logs
+from ReplayEnhanced import merged_stream
+
+
+def _write_plain(path, n=3000):
+    with open(path, "w") as f:
+        for i in range(n):
+            f.write(json.dumps({"timestamp": f"2025-10-04T00:{i // 60 % 60:02d}:{i % 60:02d}Z",
+                                "level": "INFO", "message": f"m{i}"}) + "\n")
+
+
+def test_compressed_lines_match_plain(tmp_path):
+    set_index_dir(None)
+    plain = str(tmp_path / "events.log")
+    _write_plain(plain)
+    with open(plain, "rb") as f:
+        data = f.read()
+    with gzip.open(str(tmp_path / "single.log.gz"), "wb") as f:
+        f.write(data)
+    with open(tmp_path / "padded.log.bz2", "wb") as f:
+        f.write(bz2.compress(data[:5000]) + bz2.compress(data[5000:]) + b"\0" * 512)
+    want = list(iter_lines(plain, 0, 4096))
+    middle = want[1234][1]
+    for name in ("single.log.gz", "padded.log.bz2"):
+        path = str(tmp_path / name)
+        assert list(iter_lines(path, 0, 4096)) == want
+        assert list(iter_lines(path, middle, 4096)) == want[1234:]
+        assert list(iter_lines(path, 0, 4096, stop=middle)) == want[:1234]
+
+
+def test_resume_uses_member_seek_points(tmp_path):
+    plain = str(tmp_path / "events.log")
+    _write_plain(plain)
+    path = str(tmp_path / "events.log.gz")
+    compress_file(plain, path, "gzip", member_bytes=8192)
+    index_dir = str(tmp_path / "idx")
+    set_index_dir(index_dir, min_spacing=8192)
+    try:
+        full = ReaderStats()
+        lines = list(iter_lines(path, 0, 4096, stats=full))
+        assert [l for l, _s, _e in lines] == [l for l, _s, _e in iter_lines(plain, 0, 4096)]
+        idx = SeekIndex.load(path, index_dir)
+        assert len(idx.points) > 5 and idx.size == os.path.getsize(plain)
+        resume_at = lines[-10][1]
+        part = ReaderStats()
+        assert list(iter_lines(path, resume_at, 4096, stats=part)) == lines[-10:]
+        assert part.compressed_bytes < full.compressed_bytes / 5
+    finally:
+        set_index_dir(None)
+
+
+def test_replay_engine_reads_compressed(tmp_path):
+    _write_plain(str(tmp_path / "a.jsonl"), 200)
+    _write_plain(str(tmp_path / "b.plain"), 300)
+    with open(tmp_path / "b.plain", "rb") as src, gzip.open(str(tmp_path / "b.jsonl.gz"), "wb") as dst:
+        dst.write(src.read())
+    df = load_logs(str(tmp_path), workers=1)
+    assert len(df) == 500
+
+
+def test_merged_stream_resumes_inside_a_compressed_file(tmp_path):
+    plain = str(tmp_path / "events.log")
+    _write_plain(plain)
+    compress_file(plain, str(tmp_path / "events.log.gz"), "gzip", member_bytes=8192)
+    os.remove(plain)
+    pattern = str(tmp_path / "events.log*")
+    set_index_dir(str(tmp_path / "idx"), min_spacing=8192)
+    try:
+        cp = {}
+        first = []
+        for _ts, _seq, rec, _f in merged_stream(pattern, cp, io.StringIO()):
+            first.append(rec["message"])
+            if len(first) == 2000:
+                break
+        # the offset counts decompressed bytes, far past the compressed size
+        assert cp[pattern[:-1] + ".gz"] > os.path.getsize(pattern[:-1] + ".gz")
+        rest = [rec["message"] for _ts, _seq, rec, _f in merged_stream(pattern, cp, io.StringIO())]
+        assert first + rest == [f"m{i}" for i in range(3000)]
+    finally:
+        set_index_dir(None)
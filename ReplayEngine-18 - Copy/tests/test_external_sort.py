@@ -0,0 +1,99 @@
+"""Tests for out-of-order input handling (scan, reorder buffer, external sort)"""
+import sys
+import os
+import io
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import external_sort
+from external_sort import Reorder, SortPlan, external_sort as sort_file, scan_order
+from ReplayEnhanced import file_iter
+
+
+def _line(sec, tag=""):
+    return json.dumps({"timestamp": f"2025-10-04T00:{sec // 60:02d}:{sec % 60:02d}Z", "message": f"{sec}{tag}"}) + "\n"
+
+
+def _write(path, secs):
+    with open(path, "w") as f:
+        f.write("".join(_line(s) for s in secs))
+
+
+def test_scan_order(tmp_path):
+    log = tmp_path / "a.log"
+    _write(log, [0, 1, 5, 3, 4, 10, 2])
+    scan = scan_order(str(log), window=3)
+    assert scan["records"] == 7 and scan["out_of_order"] == 3
+    assert scan["max_lateness_seconds"] == 8.0
+
+
+def test_external_sort_multi_pass(tmp_path, monkeypatch):
+    monkeypatch.setattr(external_sort, "MERGE_FAN_IN", 2)
+    log = tmp_path / "a.log"
+    secs = [(i * 37) % 50 for i in range(50)]
+    with open(log, "w") as f:
+        f.write("".join(_line(s) for s in secs))
+        f.write("not json\n")
+        f.write(_line(7, "b"))   # same time as an earlier line: stays after it
+    errlog = io.StringIO()
+    stats = sort_file(str(log), str(tmp_path / "a.sorted"), memory_bytes=1000, errlog=errlog)
+    assert stats["runs"] > 4 and stats["merge_passes"] > 1
+    out = [json.loads(l)["message"] for l in open(tmp_path / "a.sorted")]
+    assert out == [str(s) for s in range(7)] + ["7", "7b"] + [str(s) for s in range(8, 50)]
+    assert json.loads(errlog.getvalue())["err"] == "bad json"
+    assert not [n for n in os.listdir(tmp_path) if n.startswith("sort-")]
+
+
+def test_reorder_and_resume_offsets(tmp_path):
+    log = tmp_path / "a.log"
+    secs = [0, 2, 1, 3, 5, 4, 6, 9, 7, 8, 10]
+    _write(log, secs)
+    out = list(Reorder(window=3, max_records=100)(file_iter(str(log), 0, io.StringIO()), 0))
+    assert [rec["message"] for _ts, rec, _o in out] == [str(s) for s in range(11)]
+    # resuming at any checkpoint offset never misses a record not yet released
+    for i, (_ts, _rec, offset) in enumerate(out):
+        emitted = {r["message"] for _t, r, _o in out[:i + 1]}
+        rest = {r["message"] for _t, r, _e in file_iter(str(log), offset, io.StringIO())}
+        assert emitted | rest == {str(s) for s in secs}
+
+
+def test_sort_plan_decisions_and_reuse(tmp_path):
+    _write(tmp_path / "sorted.log", range(10))
+    _write(tmp_path / "jitter.log", [0, 2, 1, 3, 4, 6, 5, 7])
+    _write(tmp_path / "shuffled.log", [9, 0, 8, 1, 7, 2])
+    files = [str(tmp_path / n) for n in ("sorted.log", "jitter.log", "shuffled.log")]
+    plan = SortPlan("auto", str(tmp_path / "sort"), window=2, max_records=100)
+    paths = plan.prepare(files, {}, io.StringIO())
+    assert [plan.files[f]["decision"] for f in files] == ["sorted", "reorder", "external"]
+    assert paths[:2] == files[:2] and paths[2].endswith("shuffled.log.sorted")
+    again = SortPlan("auto", str(tmp_path / "sort"), window=2, max_records=100)
+    again.prepare(files, {}, io.StringIO())
+    assert again.files[files[2]]["sort"]["reused"] and again.files[files[2]]["scan_seconds"] is None
+
+
+def test_grown_file_extends_its_sorted_copy(tmp_path):
+    from ReplayEnhanced import build_parser, replay
+    log = tmp_path / "logs" / "events.log"
+    log.parent.mkdir()
+    _write(log, [9, 0, 8, 1, 7, 2])
+    args = lambda: build_parser().parse_args([
+        '-p', str(log), '-c', str(tmp_path / 'cp.json'), '--sort-mode', 'external',
+        '--sort-dir', str(tmp_path / 'sort'), '--index-dir', str(tmp_path / 'index'),
+        '-o', str(tmp_path / 'out.jsonl'), '--errlog', str(tmp_path / 'errors.log'),
+        '--summary-json', str(tmp_path / 'summary.json'), '--html-report', str(tmp_path / 'report.html'),
+        '--debug-json', str(tmp_path / 'debug.json'), '--debug-csv', str(tmp_path / 'debug.csv'),
+        '--timeline', str(tmp_path / 'timeline.jsonl'), '--no-live'])
+    replay(args())
+    copy = next(p for p in (tmp_path / "sort").iterdir() if p.name.endswith(".sorted"))
+    first = copy.read_bytes()
+    # appended while being replayed: a second run must only add the new lines, the partial one once completed
+    with open(log, "a") as f:
+        f.write(_line(5) + _line(3) + _line(20, "x")[:-10])
+    replay(args())
+    assert copy.read_bytes().startswith(first)
+    with open(log, "a") as f:
+        f.write(_line(20, "x")[-10:])
+    replay(args())
+    with open(tmp_path / "out.jsonl") as f:
+        got = [json.loads(l)["rec"]["message"] for l in f]
+    assert got == ["0", "1", "2", "7", "8", "9", "3", "5", "20x"]
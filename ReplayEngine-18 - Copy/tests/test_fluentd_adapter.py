@@ -0,0 +1,100 @@
+"""Tests for FluentdLogAdapter, against a stand-in for `docker logs`"""
+import sys
+import os
+import json
+ADAPTERS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'adapters')
+sys.path.insert(0, ADAPTERS)
+
+from fluentd_adapter import FluentdLogAdapter, parse_docker_ts
+
+# prints the lines of its log file like `docker logs <container> --timestamps [--since T | --tail N]`
+STAND_IN = r'''
+import sys
+sys.path.insert(0, %r)
+from fluentd_adapter import parse_docker_ts
+path, args = sys.argv[1], sys.argv[3:]
+lines = open(path, encoding='utf-8').read().splitlines()
+if '--since' in args:
+    since = parse_docker_ts(args[args.index('--since') + 1])
+    lines = [l for l in lines if parse_docker_ts(l.split(' ', 1)[0]) >= since]
+if '--tail' in args:
+    lines = lines[-int(args[args.index('--tail') + 1]):]
+for l in lines:
+    print(l if '--timestamps' in args else l.split(' ', 1)[1])
+'''
+
+
+def _log(path, *entries):
+    with open(path, 'a', encoding='utf-8') as f:
+        for ts, rec in entries:
+            f.write(f"2025-10-04T12:00:{ts}Z " + (json.dumps(rec) if isinstance(rec, dict) else rec) + "\n")
+
+
+def _adapter(tmp_path, **kw):
+    script = tmp_path / 'docker_logs.py'
+    script.write_text(STAND_IN % ADAPTERS)
+    return FluentdLogAdapter(container='fluentd', command=[sys.executable, str(script), str(tmp_path / 'c.log')], **kw)
+
+
+def test_parse_docker_ts():
+    assert parse_docker_ts("2025-10-04T12:00:01.5Z") - parse_docker_ts("2025-10-04T12:00:01Z") == 500_000_000
+    assert parse_docker_ts("2025-10-04T12:00:01.000000001Z") > parse_docker_ts("2025-10-04T12:00:01Z")
+
+
+def test_polls_only_return_new_records(tmp_path):
+    log = tmp_path / 'c.log'
+    _log(log, ('01.1', {"n": 1, "session_id": "s1", "source": "a"}), ('01.2', 'fluentd started'),
+         ('02', {"n": 2, "session_id": "s2", "source": "b"}), ('02', {"n": 3, "session_id": "s1", "source": "a"}))
+    a = _adapter(tmp_path)
+    assert [r["n"] for r in a.poll()] == [1, 2, 3]
+    assert a.stats()["skipped"] == 1
+
+    # --since repeats the lines at the cursor; only the new one at that timestamp comes back
+    _log(log, ('02', {"n": 4, "session_id": "s2", "source": "a"}), ('03.25', {"n": 5, "source": "b"}))
+    before = a.counters["lines_read"]
+    assert [r["n"] for r in a.poll()] == [4, 5]
+    assert a.counters["lines_read"] - before == 4 and a.counters["duplicates"] == 2
+    assert list(a.poll()) == []
+
+    assert [r["n"] for r in a.get_logs_by_session("s1")] == [1, 3]
+    assert [r["n"] for r in a.get_logs_by_source("a")] == [1, 3, 4]
+    assert a.get_logs_by_session("nope") == []
+
+
+def test_identical_lines_at_one_timestamp_are_all_kept(tmp_path):
+    log = tmp_path / 'c.log'
+    same = {"message": "retry", "source": "a"}
+    _log(log, ('01', {"n": 1}), ('02', same), ('02', same))
+    a = _adapter(tmp_path)
+    assert [r.get("n", "same") for r in a.poll()] == [1, "same", "same"]
+    # a third copy at the cursor timestamp, and one after it
+    _log(log, ('02', same), ('03', same))
+    assert [r["message"] for r in a.poll()] == ["retry", "retry"]
+    assert a.counters["duplicates"] == 2 and a.stats()["records"] == 5
+    assert list(a.poll()) == []
+
+
+def test_retention_evicts_from_indexes(tmp_path):
+    _log(tmp_path / 'c.log', *[(f"{i:02d}", {"n": i, "session_id": f"s{i % 2}", "source": "a"}) for i in range(10)])
+    a = _adapter(tmp_path, max_logs=4)
+    logs = a.fetch_logs(limit=8)
+    assert isinstance(logs, list) and [r["n"] for r in logs] == [6, 7, 8, 9]
+    assert [r["n"] for r in a.logs] == [6, 7, 8, 9]
+    assert [r["n"] for r in a.get_logs_by_session("s0")] == [6, 8]
+    assert [r["n"] for r in a.get_logs_by_source("a")] == [6, 7, 8, 9]
+    assert a.stats()["evicted"] == 4 and a.stats()["sessions"] == 2
+
+
+def test_stopping_early_keeps_the_rest(tmp_path):
+    _log(tmp_path / 'c.log', *[(f"{i:02d}", {"n": i}) for i in range(5)])
+    a = _adapter(tmp_path)
+    gen = a.poll()
+    assert next(gen)["n"] == 0 and next(gen)["n"] == 1
+    gen.close()
+    assert [r["n"] for r in a.poll()] == [2, 3, 4]
+
+
+def test_missing_command(tmp_path, capsys):
+    a = FluentdLogAdapter(command=[str(tmp_path / 'no-such-docker')])
+    assert len(a.fetch_logs()) == 0
+    assert "Error fetching logs" in capsys.readouterr().err
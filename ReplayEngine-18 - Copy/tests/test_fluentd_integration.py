@@ -0,0 +1,109 @@
+"""Tests for the batched ingest path"""
+import sys
+import os
+import json
+import glob
+import importlib
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _app(tmp_path, monkeypatch, **env):
+    monkeypatch.setenv('INGEST_OUT', str(tmp_path / 'logs' / 'events.log'))
+    for k, v in env.items():
+        monkeypatch.setenv(k, str(v))
+    import fluentd_integration
+    return importlib.reload(fluentd_integration)
+
+
+def test_single_bulk_and_ndjson(tmp_path, monkeypatch):
+    fi = _app(tmp_path, monkeypatch)
+    c = fi.app.test_client()
+    assert c.post('/ingest?wait=1', json={"message": "one"}).status_code == 201
+    r = c.post('/ingest/bulk?wait=1', json=[{"n": 1}, {"n": 2}, 3])
+    assert r.status_code == 201 and r.get_json()["accepted"] == 2 and r.get_json()["rejected"] == 1
+    r = c.post('/ingest/bulk?wait=1', data=b'{"n": 3}\n\nnot json\n{"n": 4}\n')
+    assert r.get_json()["accepted"] == 2
+    assert c.post('/ingest', data=b'garbage').status_code == 400
+    fi.writer.close()
+    with open(fi.OUT, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    recs = [json.loads(l) for l in lines]
+    assert [r.get("n") for r in recs] == [None, 1, 2, 3, 4]
+    assert all(r["_received_at"].endswith('Z') for r in recs)
+    stats = fi.writer.stats()
+    assert stats["written"] == stats["queued"] == 5 and stats["bytes"] > 0
+
+
+def test_rotates_to_increasing_numbers(tmp_path, monkeypatch):
+    fi = _app(tmp_path, monkeypatch, INGEST_MAX_BYTES=200)
+    open(fi.OUT + '.7', 'w').close()  # an older rotated file
+    fi.writer.close()
+    w = fi.IngestWriter(fi.OUT, max_bytes=200)
+    for i in range(20):
+        assert w.submit([json.dumps({"n": i, "pad": "x" * 40}) + "\n"], wait=True) == "written"
+    w.close()
+    rotated = sorted(glob.glob(fi.OUT + '.*'), key=lambda p: int(p.rsplit('.', 1)[1]))
+    assert rotated[0].endswith('.7') and rotated[1].endswith('.8')
+    assert w.stats()["rotations"] == len(rotated) - 1
+    total = 0
+    for p in rotated[1:] + [fi.OUT]:
+        with open(p) as f:
+            total += sum(1 for _ in f)
+    assert total == 20
+
+
+def test_failed_rotation_keeps_writing(tmp_path, monkeypatch):
+    fi = _app(tmp_path, monkeypatch)
+    fi.writer.close()
+    w = fi.IngestWriter(fi.OUT, max_bytes=100)
+
+    def no_rename(src, dst):
+        raise OSError("rename refused")
+    monkeypatch.setattr(fi.os, 'rename', no_rename)
+    for i in range(5):
+        assert w.submit([json.dumps({"n": i, "pad": "x" * 40}) + "\n"], wait=True) == "written"
+    monkeypatch.undo()
+    assert w.submit([json.dumps({"n": 5}) + "\n"], wait=True) == "written"
+    w.close()
+    st = w.stats()
+    assert st["failed"] == 0 and st["written"] == 6
+    assert st["rotation_failures"] == 4 and st["rotations"] == 1
+    with open(fi.OUT + '.1') as f:
+        assert [json.loads(l)["n"] for l in f] == list(range(6))
+
+
+def test_replay_resumes_across_rotation(tmp_path, monkeypatch):
+    from ReplayEnhanced import build_parser, replay
+    fi = _app(tmp_path, monkeypatch)
+    fi.writer.close()
+    w = fi.IngestWriter(fi.OUT, max_bytes=1 << 20)
+    run = lambda: replay(build_parser().parse_args([
+        '-p', fi.OUT + '*', '-c', str(tmp_path / 'cp.json'), '--index-dir', str(tmp_path / 'index'),
+        '-o', str(tmp_path / 'out.jsonl'), '--errlog', str(tmp_path / 'errors.log'),
+        '--summary-json', str(tmp_path / 'summary.json'), '--html-report', str(tmp_path / 'report.html'),
+        '--debug-json', str(tmp_path / 'debug.json'), '--debug-csv', str(tmp_path / 'debug.csv'),
+        '--timeline', str(tmp_path / 'timeline.jsonl'), '--no-live']))
+    line = lambda i: json.dumps({"timestamp": f"2025-10-04T00:00:{i:02d}Z", "level": "INFO", "n": i}) + "\n"
+    assert w.submit([line(i) for i in range(10)], wait=True) == "written"
+    run()
+    # events.log, half replayed, becomes events.log.1; the new events.log is shorter than the old offset
+    w.max_bytes = 1
+    assert w.submit([line(i) for i in range(10, 15)], wait=True) == "written"
+    w.max_bytes = 1 << 20
+    assert w.submit([line(i) for i in range(15, 20)], wait=True) == "written"
+    w.close()
+    assert sorted(os.path.basename(p) for p in glob.glob(fi.OUT + '*')) == ['events.log', 'events.log.1']
+    run()
+    with open(tmp_path / 'out.jsonl') as f:
+        assert [json.loads(l)["rec"]["n"] for l in f] == list(range(20))
+
+
+def test_full_queue_drops(tmp_path, monkeypatch):
+    fi = _app(tmp_path, monkeypatch)
+    fi.writer.close()
+    w = fi.IngestWriter(str(tmp_path / 'q.log'), max_queue=3)
+    with w._cond:  # hold the writer so nothing drains
+        assert w.submit(["a\n", "b\n"]) == "queued"
+        assert w.submit(["c\n", "d\n"]) == "dropped"
+    w.close()
+    assert w.stats()["dropped"] == 2 and w.stats()["written"] == 2
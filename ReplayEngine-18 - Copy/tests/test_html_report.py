@@ -0,0 +1,53 @@
+"""Tests for the aggregated html report"""
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from html_report_generator import TimelineAggregator, simple_html_report
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _events(n, step=1):
+    for i in range(n):
+        yield {"x": (T0 + timedelta(seconds=i * step)).isoformat(), "y": f"svc{i % 3}",
+               "level": "ERROR" if i % 100 == 0 else "INFO", "message": f"m{i}"}
+
+
+def test_buckets_and_sample_stay_bounded():
+    agg = TimelineAggregator(max_buckets=50, max_points=100)
+    for e in _events(20000, step=2):
+        agg.add(e)
+    r = agg.result()
+    assert len(r["buckets"]) <= 50 and r["bucket_seconds"] == 900
+    assert sum(sum(v) for v in r["series"].values()) == 20000
+    assert r["per_service"]["svc0"]["events"] == 6667
+    # every error point is kept, other points are sampled
+    assert r["error_points"] == r["total_errors"] == 200
+    assert len(r["points"]) == 300
+
+
+def test_report_size_does_not_grow_with_events(tmp_path):
+    sizes = []
+    for n in (2000, 40000):
+        out = str(tmp_path / f"r{n}.html")
+        bugs = [f"[ERROR] b{i}" for i in range(n // 100)]
+        corr = {f"c{i}": [{"ts": "t"}] * 50 for i in range(n // 10)}
+        simple_html_report(_events(n), bugs, {"total_events": n}, corr, out, max_points=500)
+        sizes.append(os.path.getsize(out))
+        with open(out, encoding='utf-8') as f:
+            assert f"Showing 100 of {n // 10} correlation flows" in f.read()
+    assert sizes[1] < sizes[0] * 1.5
+
+
+def test_capped_error_points_are_reported(tmp_path):
+    out = str(tmp_path / "r.html")
+    simple_html_report(_events(20000), [], {}, {}, out, max_error_points=50)
+    with open(out, encoding='utf-8') as f:
+        assert "150 error events are not plotted</b> (capped at 50)" in f.read()
+    agg = TimelineAggregator(max_error_points=50)
+    for e in _events(20000):
+        agg.add(e)
+    r = agg.result()
+    assert r["error_points"] == 50 and r["errors_not_plotted"] == 150 and r["total_errors"] == 200
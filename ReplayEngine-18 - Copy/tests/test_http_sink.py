@@ -0,0 +1,148 @@
+"""Tests for the asyncio HTTP replay sink"""
+import sys
+import os
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from http_sink import HttpSink
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        srv = self.server
+        with srv.lock:
+            srv.calls += 1
+            status = srv.statuses.pop(0) if srv.statuses else 201
+            if status < 300:
+                srv.records.extend(json.loads(l) for l in body.splitlines() if l.strip())
+        time.sleep(srv.delay)
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *a):
+        pass
+
+
+def _server(statuses=(), delay=0):
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    srv.lock = threading.Lock()
+    srv.delay = delay
+    srv.calls = 0
+    srv.statuses = list(statuses)
+    srv.records = []
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_address[1]}/ingest"
+
+
+def test_delivers_everything_and_runs_barriers():
+    srv, url = _server()
+    try:
+        sink = HttpSink(url, concurrency=4, batch_size=10, max_pending=50)
+        saved = []
+        for i in range(500):
+            sink.send(json.dumps({"n": i}))
+            if i % 100 == 99:
+                sink.barrier(lambda i=i: saved.append(i))
+        assert sink.close()
+        assert sorted(r["n"] for r in srv.records) == list(range(500))
+        st = sink.stats()
+        assert st["events_acked"] == 500 and st["ack_watermark"] == 500
+        assert st["connections"] <= 4 and st["requests"] < 500
+        assert saved == [99, 199, 299, 399, 499]
+    finally:
+        srv.shutdown()
+
+
+def test_retries_server_errors():
+    srv, url = _server(statuses=[503, 503])
+    try:
+        sink = HttpSink(url, concurrency=1, backoff=0.001)
+        sink.send('{"n": 1}')
+        assert sink.close()
+        assert srv.records == [{"n": 1}] and sink.stats()["retries"] == 2
+    finally:
+        srv.shutdown()
+
+
+def test_failed_record_holds_back_barriers():
+    srv, url = _server(statuses=[400], delay=0.2)
+    try:
+        sink = HttpSink(url, concurrency=1, backoff=0.001)
+        saved = []
+        sink.send('{"n": 1}')
+        sink.send('{"n": 2}')
+        sink.barrier(lambda: saved.append(True))
+        assert not sink.close()
+        assert saved == [] and sink.stats()["ack_watermark"] == 0
+        assert sink.stats()["events_failed"] == 1
+    finally:
+        srv.shutdown()
+
+
+def test_failed_record_stops_the_sink():
+    srv, url = _server(statuses=[400])
+    try:
+        sink = HttpSink(url, concurrency=1, backoff=0.001)
+        sink.send('{"n": 1}')
+        deadline = time.time() + 5
+        while sink.stats()["events_failed"] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        with pytest.raises(IOError):
+            sink.send('{"n": 2}')
+        with pytest.raises(IOError):
+            sink.barrier(lambda: None)
+        assert not sink.close()
+        assert sink.pending() == 0 and not sink._finished and not sink._barriers
+    finally:
+        srv.shutdown()
+
+
+def test_bodyless_and_chunked_responses_keep_the_connection():
+    # responses the sink must read to their end without waiting for more bytes
+    replies = [b"HTTP/1.1 204 No Content\r\n\r\n",
+               b"HTTP/1.1 100 Continue\r\n\r\nHTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}",
+               b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n2\r\n{}\r\n0\r\nX-Trailer: 1\r\n\r\n",
+               b"HTTP/1.1 304 Not Modified\r\nContent-Length: 10\r\n\r\n",
+               b"HTTP/1.1 202 Accepted\r\nTransfer-Encoding: chunked\r\n\r\n0\r\n\r\n"]
+    received = []
+    lsock = socket.create_server(('127.0.0.1', 0))
+
+    def serve():
+        conn, _ = lsock.accept()
+        f = conn.makefile('rb')
+        for reply in replies:
+            length = 0
+            while True:
+                line = f.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            received.append(json.loads(f.read(length)))
+            conn.sendall(reply)
+        f.close()
+        conn.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    try:
+        sink = HttpSink(f"http://127.0.0.1:{lsock.getsockname()[1]}/ingest", concurrency=1, timeout=2, retries=0)
+        for i in range(len(replies)):
+            sink.send(json.dumps({"n": i}))
+        assert not sink.close()  # the 304 is not an acknowledgement
+        assert received == [{"n": i} for i in range(len(replies))]
+        st = sink.stats()
+        assert st["connections"] == 1 and st["retries"] == 0
+        assert st["events_acked"] == len(replies) - 1 and st["events_failed"] == 1
+    finally:
+        lsock.close()
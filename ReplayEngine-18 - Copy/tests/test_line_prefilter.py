@@ -0,0 +1,20 @@
+"""Tests for the raw-line prefilter (LinePrefilter)"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from datetime import datetime, timezone
+from line_prefilter import LinePrefilter
+
+
+def test_prefilter_only_rejects_lines_that_cannot_match():
+    start = datetime(2025, 10, 4, 10, 0, 0, tzinfo=timezone.utc)
+    pf = LinePrefilter(level="error", source="auth-service", start=start)
+    assert pf.admits(b'{"timestamp":"2025-10-04T10:00:01Z","level":"ERROR","source":"auth-service"}')
+    assert not pf.admits(b'{"timestamp":"2025-10-04T10:00:01Z","level":"INFO","source":"auth-service"}')
+    assert not pf.admits(b'{"timestamp":"2025-10-04T09:59:59Z","level":"ERROR","source":"auth-service"}')
+    # escaped values and ambiguous timestamps are left to the full decode
+    assert pf.admits(b'{"timestamp":"2025-10-04T10:00:01Z","level":"\\u0045RROR","source":"auth-service"}')
+    assert pf.admits(b'{"time":"2025-10-04T09:00:00Z","timestamp":"2025-10-04T11:00:00Z",'
+                     b'"level":"error","source":"auth-service"}')
+    assert pf.stats() == {"checked": 5, "skipped": 2}
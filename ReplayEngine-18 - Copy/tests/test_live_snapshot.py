@@ -0,0 +1,71 @@
+"""Tests for the live replay state (LiveSnapshotWriter / LiveState)"""
+import sys
+import os
+import json
+from datetime import datetime, timedelta, timezone
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from live_snapshot import LiveSnapshotWriter, LiveState, deltas_path
+from ReplayEnhanced import build_parser, replay
+from synthetic_logs import generate
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _write(w, n, start=0):
+    for i in range(start, start + n):
+        rec = {"source": f"svc{i % 3}", "level": "ERROR" if i % 10 == 0 else "INFO"}
+        w.observe(T0 + timedelta(seconds=i), rec, ["[BUG] x"] if i % 10 == 0 else [], i)
+
+
+def test_reader_follows_deltas_incrementally(tmp_path):
+    path = str(tmp_path / "live.json")
+    w = LiveSnapshotWriter(path, max_bugs=5, snapshot_every=3)
+    reader = LiveState(path, min_interval=0, max_bugs=5)
+    assert reader.poll()["events"] == 0
+    for _ in range(4):
+        _write(w, 30, w.events + w._d_events)
+        w.publish()
+        s = reader.poll()
+        assert s["events"] == w.events and s["version"] == w.version
+    assert reader.bytes_read == os.path.getsize(deltas_path(path))
+    assert s["errors"] == 12 and (s["services"]["svc0"]["events"], s["services"]["svc0"]["errors"]) == (40, 4)
+    assert [b["log_index"] for b in s["bugs"]] == [70, 80, 90, 100, 110]
+
+    # a late reader starts from the last snapshot (version 3) and reads only the delta after it
+    late = LiveState(path, min_interval=0, max_bugs=5)
+    counts = lambda st: {k: v for k, v in st.items() if k not in ("events_per_sec", "services")}
+    assert counts(late.poll()) == counts(s) and late.services == reader.services
+    with open(deltas_path(path), 'rb') as f:
+        assert late.bytes_read == len(f.read().splitlines(True)[-1])
+
+    # cached between polls: nothing is read while min_interval has not passed
+    cached = LiveState(path, min_interval=3600)
+    first = cached.poll()
+    _write(w, 10, 120)
+    w.close()
+    assert cached.poll() == first and reader.poll()["state"] == "done"
+
+    # a new run in the same place replaces the state
+    w2 = LiveSnapshotWriter(path)
+    _write(w2, 5)
+    w2.close()
+    s = reader.poll()
+    assert s["run"] == w2.run and s["events"] == 5
+
+
+def test_replay_publishes_live_state(tmp_path):
+    manifest = generate(str(tmp_path / "logs"), events=2000, files=2)
+    out = lambda name: str(tmp_path / name)
+    args = build_parser().parse_args([
+        '-p', out('logs/events.log*'), '-c', out('cp.json'), '--no-index', '-o', out('o/out.jsonl'),
+        '--errlog', out('errors.log'), '--debug-json', out('r/debug.json'), '--debug-csv', out('r/debug.csv'),
+        '--html-report', out('r/report.html'), '--summary-json', out('r/summary.json'),
+        '--timeline', out('r/timeline.jsonl'), '--live-interval', '0.01'])
+    replay(args)
+    s = LiveState(out('r/replay_live.json'), min_interval=0).poll()
+    with open(out('r/summary.json')) as f:
+        summary = json.load(f)
+    assert s["state"] == "done" and s["events"] == 2000 and s["errors"] == manifest["errors"]
+    assert s["bugs_total"] == len(summary["bugs"])
+    assert s["version"] >= 1
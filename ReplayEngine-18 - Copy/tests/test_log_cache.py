@@ -0,0 +1,58 @@
+"""Tests for the columnar log cache"""
+import sys
+import os
+import json
+from datetime import datetime, timezone
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log_cache import LogColumns, FLAG_BAD_JSON, FLAG_BAD_TS, from_ns
+
+
+def _line(sec, level="INFO", source="api"):
+    return json.dumps({"timestamp": f"2025-10-04T00:00:{sec:02d}.250000Z", "level": level,
+                       "source": source, "message": "ok", "correlationId": f"r{sec % 3}"}) + "\n"
+
+
+def test_build_reuse_and_extend(tmp_path):
+    log = str(tmp_path / "events.log")
+    cache_dir = str(tmp_path / "cache")
+    with open(log, "w") as f:
+        f.write("".join(_line(s) for s in range(10)))
+        f.write(_line(10)[:-5])  # partial last line is not cached yet
+    c = LogColumns.open(log, cache_dir)
+    assert c.rows == 10 and c.built_rows == 10
+    assert from_ns(c.columns()["ts_ns"][3]) == datetime(2025, 10, 4, 0, 0, 3, 250000, tzinfo=timezone.utc)
+    with open(log, "a") as f:
+        f.write(_line(10)[-5:] + _line(11))
+    c2 = LogColumns.open(log, cache_dir)
+    assert (c2.reused_rows, c2.built_rows, c2.rows) == (10, 2, 12)
+    with open(log, "rb") as f:
+        cols = c2.columns()
+        assert c2.read_line(f, int(cols["offset"][10]), int(cols["end"][10])) == _line(10).encode()
+
+
+def test_rewritten_file_is_rebuilt(tmp_path):
+    log = str(tmp_path / "events.log")
+    cache_dir = str(tmp_path / "cache")
+    with open(log, "w") as f:
+        f.write("".join(_line(s) for s in range(10)))
+    LogColumns.open(log, cache_dir)
+    with open(log, "w") as f:
+        f.write(_line(30) + "not json\n" + json.dumps({"timestamp": "garbage"}) + "\n")
+    c = LogColumns.open(log, cache_dir)
+    assert c.rebuilt and c.rows == 3
+    assert list(c.columns()["flags"][1:] & (FLAG_BAD_JSON | FLAG_BAD_TS)) == [FLAG_BAD_JSON, FLAG_BAD_TS]
+
+
+def test_select_filters_on_columns(tmp_path):
+    log = str(tmp_path / "events.log")
+    with open(log, "w") as f:
+        for s in range(20):
+            f.write(_line(s, "ERROR" if s % 5 == 0 else "INFO", "db" if s % 2 else "api"))
+    c = LogColumns.open(log, str(tmp_path / "cache"))
+    start = datetime(2025, 10, 4, 0, 0, 4, tzinfo=timezone.utc)
+    end = datetime(2025, 10, 4, 0, 0, 16, tzinfo=timezone.utc)
+    assert list(c.select(0, start, end, level="error")) == [5, 10, 15]
+    assert list(c.select(0, start, end, level="error", source="DB")) == [5, 15]
+    offset = int(c.columns()["offset"][11])
+    assert list(c.select(offset, None, None, level="error")) == [15]
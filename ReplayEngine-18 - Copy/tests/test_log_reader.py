@@ -0,0 +1,47 @@
+"""Tests for the binary chunked line reader"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from log_reader import ReaderStats, iter_lines
+
+
+def _write(tmp_path, data):
+    p = tmp_path / "events.log"
+    p.write_bytes(data)
+    return str(p)
+
+
+def test_offsets_exact_across_chunk_boundaries(tmp_path):
+    lines = [b'{"i": %d, "pad": "%s"}' % (i, b"x" * (i * 37 % 5000)) for i in range(200)]
+    data = b"\n".join(lines) + b"\n"
+    path = _write(tmp_path, data)
+    for use_mmap in (False, True):
+        got = list(iter_lines(path, 0, chunk_size=4096, use_mmap=use_mmap))
+        assert [g[0] for g in got] == lines
+        for line, start, end in got:
+            assert data[start:end] == line + b"\n"
+        assert got[-1][2] == len(data)
+
+
+def test_resume_from_offset_and_partial_last_line(tmp_path):
+    data = b'{"a": 1}\n{"b": 2}\n{"c": 3}'
+    path = _write(tmp_path, data)
+    got = list(iter_lines(path, 9))
+    assert got == [(b'{"b": 2}', 9, 18), (b'{"c": 3}', 18, 26)]
+
+
+def test_invalid_utf8_keeps_byte_offsets(tmp_path):
+    data = b'{"m": "\xff\xfe"}\n{"m": "ok"}\n'
+    path = _write(tmp_path, data)
+    got = list(iter_lines(path))
+    assert got[1][1] == data.index(b'{"m": "ok"}')
+
+
+def test_stats_count_bytes(tmp_path):
+    data = b"line\n" * 1000
+    path = _write(tmp_path, data)
+    stats = ReaderStats()
+    assert len(list(iter_lines(path, stats=stats))) == 1000
+    assert stats.bytes_read == len(data) and stats.lines == 1000
+
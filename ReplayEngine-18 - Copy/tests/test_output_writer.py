@@ -0,0 +1,78 @@
+"""Tests for the group-commit output writer (BatchedWriter)"""
+import sys
+import os
+import time
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+import output_writer
+from output_writer import BatchedWriter
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("durability", ["none", "flush", "fsync"])
+def test_barrier_runs_after_output_is_on_disk(tmp_path, monkeypatch, durability):
+    events = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(output_writer.os, 'fsync', lambda fd: (events.append("fsync"), real_fsync(fd)))
+    path = str(tmp_path / "out.jsonl")
+    w = BatchedWriter(path, batch_lines=1000, flush_interval=60, durability=durability)
+    done = threading.Event()
+
+    def checkpoint():
+        # what a checkpoint saved now would cover is already in the file
+        events.append(("checkpoint", _read(path).count("\n")))
+        done.set()
+
+    for i in range(10):
+        w.write(f"{i}\n")
+    w.barrier(checkpoint)
+    assert done.wait(5)
+    assert events[-2:] == ["fsync", ("checkpoint", 10)]
+    w.close()
+
+
+def test_flushes_after_the_interval(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    w = BatchedWriter(path, batch_lines=1000, flush_interval=0.05)
+    for i in range(3):
+        w.write(f"{i}\n")
+    deadline = time.monotonic() + 5
+    while _read(path) != "0\n1\n2\n" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert _read(path) == "0\n1\n2\n" and w.stats()["batches"] == 1 and w.pending() == 0
+    w.close()
+
+
+def test_close_writes_everything_buffered(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    w = BatchedWriter(path, batch_lines=7, flush_interval=60, durability='none')
+    for i in range(100):
+        w.write(f"{i}\n")
+    w.close()
+    assert _read(path) == "".join(f"{i}\n" for i in range(100))
+    assert w.stats()["lines"] == 100
+
+
+def test_failed_write_stops_checkpoints(tmp_path, monkeypatch):
+    def broken(fd):
+        raise OSError("disk full")
+    monkeypatch.setattr(output_writer.os, 'fsync', broken)
+    w = BatchedWriter(str(tmp_path / "out.jsonl"), batch_lines=2, flush_interval=60, durability='fsync')
+    saved = []
+    w.write("a\n")
+    w.write("b\n")
+    w._thread.join(5)                 # the writer thread stops on the error
+    with pytest.raises(IOError):
+        w.barrier(lambda: saved.append(1))
+    with pytest.raises(IOError):
+        w.write("c\n")
+    with pytest.raises(IOError):
+        w.close()
+    assert saved == []
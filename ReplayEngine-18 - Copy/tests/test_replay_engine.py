@@ -0,0 +1,91 @@
+"""Tests for the chunked, typed replay_engine loader"""
+import sys
+import os
+import json
+import pandas as pd
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from replay_engine import load_logs, detect_bugs, group_by_correlation, attach_messages
+
+
+def _write_logs(d, files=3, lines=500):
+    for i in range(files):
+        with open(os.path.join(d, f"part{i}.jsonl"), "w") as f:
+            for j in range(lines):
+                n = i * lines + j
+                rec = {"timestamp": f"2025-10-04T00:{(n // 60) % 60:02d}:{n % 60:02d}Z",
+                       "level": "ERROR" if n % 7 == 0 else "INFO",
+                       "source": f"svc{n % 4}", "request_id": f"req-{n % 37}",
+                       "message": "Gateway Timeout" if n % 11 == 0 else "ok"}
+                f.write(json.dumps(rec) + "\n")
+            f.write("not json\n")
+
+
+def _naive(d):
+    rows = []
+    for name in sorted(os.listdir(d)):
+        with open(os.path.join(d, name)) as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass
+    df = pd.DataFrame(rows)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    bugs = df[(df['level'] == 'ERROR') | df['message'].str.contains('timeout', case=False, na=False)]
+    return df, bugs, df.groupby('request_id').size().to_dict()
+
+
+def test_matches_naive_reference(tmp_path):
+    _write_logs(str(tmp_path))
+    ref_df, ref_bugs, ref_groups = _naive(str(tmp_path))
+    for workers in (1, 2):
+        df = load_logs(str(tmp_path), workers=workers, chunk_lines=128)
+        assert len(df) == len(ref_df)
+        assert df['timestamp'].dt.tz is not None
+        assert all(isinstance(df[c].dtype, pd.CategoricalDtype) for c in ('level', 'source', 'request_id'))
+        bugs = detect_bugs(df)
+        assert len(bugs) == len(ref_bugs)
+        assert group_by_correlation(df).size().to_dict() == ref_groups
+
+
+def test_cached_load_matches(tmp_path):
+    _write_logs(str(tmp_path))
+    _ref_df, ref_bugs, ref_groups = _naive(str(tmp_path))
+    cache_dir = str(tmp_path / "cache")
+    for _ in range(2):  # build, then reuse
+        df = load_logs(str(tmp_path), workers=1, cache_dir=cache_dir)
+        bugs = detect_bugs(df)
+        assert len(bugs) == len(ref_bugs)
+        assert group_by_correlation(df).size().to_dict() == ref_groups
+    assert list(attach_messages(bugs.head(2))['message']) == list(ref_bugs['message'].head(2))
+
+
+def test_cached_and_uncached_frames_agree(tmp_path):
+    recs = [{"time": "2025-10-04T00:00:01Z", "level": "ERROR", "source": "a", "trace_id": "t1"},
+            {"@timestamp": "2025-10-04T02:00:02+02:00", "level": "INFO", "source": "b", "request_id": 7},
+            {"timestamp": "2025-10-04 00:00:03", "level": "WARN"},              # naive
+            {"timestamp": 1759536004.5, "source": "a"},                          # epoch seconds
+            {"timestamp": "2025-10-04T00:00:05.123456789Z", "level": "INFO", "correlation_id": "c"},
+            {"timestamp": "not a time", "level": "ERROR", "source": "b"},       # kept, no timestamp
+            {"level": "INFO"},                                                   # kept, no timestamp
+            ["not", "a", "record"]]
+    with open(tmp_path / "mixed.jsonl", "w") as f:
+        f.writelines(json.dumps(r) + "\n" for r in recs)
+        f.write("not json\n")
+    cols = ['timestamp', 'level', 'source', 'request_id']
+    plain = load_logs(str(tmp_path), workers=1)[cols]
+    cached = load_logs(str(tmp_path), workers=1, cache_dir=str(tmp_path / "cache"))[cols]
+    assert len(plain) == 7 and plain['timestamp'].isna().sum() == 2
+    pd.testing.assert_frame_equal(plain.astype(str), cached.astype(str))
+    assert plain['timestamp'].iloc[1] == pd.Timestamp("2025-10-04T00:00:02Z")
+
+
+def test_gap_detection(tmp_path):
+    with open(tmp_path / "a.jsonl", "w") as f:
+        for ts in ("00:00:00", "00:00:01", "00:00:30", "00:00:31"):
+            f.write(json.dumps({"timestamp": f"2025-10-04T{ts}Z", "level": "INFO", "message": "ok"}) + "\n")
+    df = load_logs(str(tmp_path))
+    bugs = detect_bugs(df, gap_threshold=5)
+    assert list(bugs['bug']) == ['GAP']
+    assert bugs['timestamp'].iloc[0] == pd.Timestamp("2025-10-04T00:00:30Z")
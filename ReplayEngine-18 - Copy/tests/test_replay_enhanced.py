@@ -0,0 +1,96 @@
+"""Tests for replay() end to end"""
+import sys
+import os
+import json
+import shutil
+from datetime import datetime, timezone
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from checkpoint_journal import load_state
+from log_follower import inode_key
+from ReplayEnhanced import build_parser, replay
+from synthetic_logs import generate
+from time_index import TimeIndex
+
+
+def _args(tmp_path, run, *extra):
+    out = lambda name: str(tmp_path / run / name)
+    return build_parser().parse_args([
+        '-p', str(tmp_path / 'logs' / 'events.log*'), '-c', out('cp.json'), '--index-dir', out('index'),
+        '-o', out('out.jsonl'), '--errlog', out('errors.log'), '--debug-json', out('debug.json'),
+        '--debug-csv', out('debug.csv'), '--html-report', out('report.html'), '--summary-json', out('summary.json'),
+        '--timeline', out('timeline.jsonl'), '--no-live', '--checkpoint-every', '7'] + list(extra))
+
+
+def _result(tmp_path, run):
+    with open(tmp_path / run / 'out.jsonl', 'rb') as f:
+        return f.read(), load_state(str(tmp_path / run / 'cp.json'))
+
+
+def test_parallel_decode_matches_serial(tmp_path):
+    logs = tmp_path / 'logs'
+    m = generate(str(logs), events=3000, files=4, ts_formats=("iso_z", "epoch_ms", "iso_offset"))
+    # a copy ties on every timestamp with events.log
+    shutil.copyfile(logs / 'events.log', logs / 'events.log.9')
+    assert replay(_args(tmp_path, 'serial', '--workers', '1'))["events"] == 3000 + m["files"]["events.log"]["events"]
+    serial = _result(tmp_path, 'serial')
+    for workers in ('2', '3'):
+        replay(_args(tmp_path, 'w' + workers, '--workers', workers, '--batch-size', '50'))
+        assert _result(tmp_path, 'w' + workers) == serial
+    done = {str(p): os.path.getsize(p) for p in logs.glob('events.log*')}
+    done.update({inode_key(os.stat(p)): os.path.getsize(p) for p in logs.glob('events.log*')})
+    assert {k: v for k, v in serial[1].items() if not k.startswith('head:')} == done
+
+
+def test_time_index_keeps_the_prefilter(tmp_path):
+    m = generate(str(tmp_path / 'logs'), events=4000, files=1, error_rate=0.05)
+    first = _args(tmp_path, 'indexed', '--level', 'error', '--index-every', '50')
+    replay(first)
+    with open(first.summary_json) as f:
+        pf = json.load(f)["prefilter"]
+    assert pf["checked"] == 4000 and pf["skipped"] == 4000 - m["errors"]
+    replay(_args(tmp_path, 'plain', '--level', 'error', '--no-index'))
+    assert _result(tmp_path, 'indexed') == _result(tmp_path, 'plain')
+
+    # the index was built over the skipped lines too: --start seeks into the file
+    index = TimeIndex.load(str(tmp_path / 'logs' / 'events.log'), first.index_dir)
+    assert index.usable() and index.indexed_upto == m["bytes"] and len(index.ts) >= 4000 // 50
+    start = datetime.fromtimestamp(index.ts[len(index.ts) // 2], timezone.utc).isoformat()
+    seeked = _args(tmp_path, 'indexed', '--level', 'error', '--start', start, '--no-checkpoint')
+    replay(seeked)
+    with open(seeked.summary_json) as f:
+        pf = json.load(f)["prefilter"]
+    assert 0 < pf["checked"] < 4000 and pf["skipped"] > 0
+    replay(_args(tmp_path, 'plain', '--level', 'error', '--start', start, '--no-checkpoint', '--no-index'))
+    assert _result(tmp_path, 'indexed')[0] == _result(tmp_path, 'plain')[0]
+
+
+def test_cancelled_replay_resumes_without_gaps_or_duplicates(tmp_path):
+    generate(str(tmp_path / 'logs'), events=3000, files=2)
+    args = _args(tmp_path, 'run', '--output-batch', '64')
+    # cancel part way; the final checkpoint must cover exactly what reached the output
+    assert replay(args, progress=lambda p: p["events"] >= 1000, progress_interval=0)["cancelled"]
+    with open(args.output) as f:
+        first = f.read().splitlines()
+    assert 1000 <= len(first) < 3000
+    replay(_args(tmp_path, 'run', '--output-batch', '64'))
+    with open(args.output) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == len(set(lines)) == 3000 and lines[:len(first)] == first
+
+
+def test_non_object_lines_are_bad_ts(tmp_path):
+    os.makedirs(tmp_path / 'logs')
+    with open(tmp_path / 'logs' / 'events.log', 'w') as f:
+        f.write('{"timestamp": "2024-01-01T00:00:00Z", "n": 1}\n[1, 2]\n"x"\n42\n'
+                '{"timestamp": "2024-01-01T00:00:01Z", "n": 2}\n')
+    args = _args(tmp_path, 'plain')
+    assert replay(args)["events"] == 2
+    with open(args.errlog) as f:
+        errs = [json.loads(l) for l in f]
+    assert [e["err"] for e in errs] == ["bad ts"] * 3 and [e["raw"] for e in errs] == [[1, 2], "x", 42]
+    # the column cache flags them when it is built; they are skipped there too
+    args = _args(tmp_path, 'cached', '--cache-dir', str(tmp_path / 'cache'))
+    assert replay(args)["events"] == 2
+    with open(args.errlog) as f:
+        assert sum(1 for _ in f) == 3
@@ -0,0 +1,112 @@
+"""Tests for the replay job manager"""
+import sys
+import os
+import json
+import queue
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+
+from replay_jobs import ReplayJobManager, options_to_argv
+
+
+def _write_log(path, n):
+    with open(path, "w") as f:
+        for i in range(n):
+            f.write(json.dumps({"timestamp": f"2025-10-04T00:{i // 60 % 60:02d}:{i % 60:02d}Z", "level": "INFO",
+                                "source": "api", "message": "ok", "correlationId": f"r{i % 7}"}) + "\n")
+
+
+def _options(tmp_path, name, **extra):
+    opts = {"pattern": str(tmp_path / "events.log"), "checkpoint": str(tmp_path / f"{name}.checkpoint.json"),
+            "output": str(tmp_path / f"{name}.out.jsonl"), "index_dir": str(tmp_path / "index")}
+    opts.update(extra)
+    return opts
+
+
+def _wait(manager, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job["state"] in ("done", "failed", "cancelled"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_options_to_argv():
+    assert options_to_argv({"pattern": "a*", "max_rate": 10, "real_time": True, "level": None,
+                            "mmap": False}) == ["--pattern", "a*", "--max-rate", "10", "--real-time"]
+
+
+def test_jobs_run_queue_and_cancel(tmp_path):
+    _write_log(tmp_path / "events.log", 300)
+    manager = ReplayJobManager(max_jobs=1, max_queued=1, job_root=str(tmp_path / "jobs"), progress_interval=0.05,
+                               data_root=str(tmp_path))
+    try:
+        with pytest.raises(ValueError):
+            manager.submit({"no_such_option": 1})
+        with pytest.raises(ValueError):
+            manager.submit({"max_rate": "fast"})
+
+        slow = manager.submit(_options(tmp_path, "slow", max_rate=50))
+        assert slow["state"] == "running"
+        quick = manager.submit(_options(tmp_path, "quick"))
+        assert quick["state"] == "queued" and quick["queue_position"] == 1
+        with pytest.raises(queue.Full):
+            manager.submit(_options(tmp_path, "third"))
+
+        deadline = time.monotonic() + 60
+        while not (manager.get(slow["id"])["progress"] or {}).get("events"):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        manager.cancel(slow["id"])
+        slow = _wait(manager, slow["id"])
+        assert slow["state"] == "cancelled" and 0 < slow["result"]["events"] < 300
+
+        quick = _wait(manager, quick["id"])
+        assert quick["state"] == "done", quick["error"]
+        assert quick["result"]["events"] == 300
+        p = quick["progress"]
+        assert p["state"] == "done" and p["events"] == 300 and p["fraction"] == 1.0
+        assert p["watermark"].startswith("2025-10-04T00:04:59")
+        with open(tmp_path / "quick.out.jsonl") as f:
+            assert sum(1 for _ in f) == 300
+        assert os.path.exists(os.path.join(quick["dir"], "replay_summary.json"))
+        assert manager.overview()["running"] is False
+    finally:
+        manager.close()
+
+
+def test_options_are_allowlisted_and_confined(tmp_path):
+    root = tmp_path / "root"
+    (root / "logs").mkdir(parents=True)
+    _write_log(root / "logs" / "events.log", 10)
+    _write_log(tmp_path / "secret.log", 1)
+    os.symlink(str(tmp_path), str(root / "logs" / "outside"))
+    manager = ReplayJobManager(max_jobs=1, job_root=str(root / "jobs"), data_root=str(root),
+                               sink_hosts=["collector:8080"])
+    try:
+        bad = [{"profile": "p.json"},                                  # known to the parser, not allowed for jobs
+               {"output": "/etc/replay.out"},
+               {"summary_json": "../summary.json"},
+               {"errlog": "logs/outside/errors.log"},                 # through a symlink
+               {"pattern": "logs/*/*"},                               # matches files outside through the symlink
+               {"sink_url": "http://169.254.169.254/latest"},
+               {"sink_url": "http://collector:9090/ingest"},
+               {"sink_url": "file:///etc/passwd"}]
+        for options in bad:
+            with pytest.raises(ValueError):
+                manager.submit(dict(options, pattern=options.get("pattern", "logs/events.log")))
+        job = manager.submit({"pattern": "logs/events.log", "output": "out/run.jsonl",
+                              "sink_url": "http://collector:8080/ingest", "no_checkpoint": True})
+        manager.cancel(job["id"])
+        # relative and defaulted paths land under the data root
+        opts = job["options"]
+        assert opts["output"] == str(root / "out" / "run.jsonl")
+        assert opts["checkpoint"] == str(root / "logs" / "replay.checkpoint.json")
+        assert opts["index_dir"] == str(root / "logs" / ".replay_index")
+        assert opts["html_report"].startswith(str(root / "jobs"))
+    finally:
+        manager.close()
@@ -0,0 +1,68 @@
+"""Tests for replay stage metrics, the Prometheus text and the sampling profiler"""
+import sys
+import os
+import json
+import re
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from replay_metrics import BUCKETS, ReplayMetrics, Stage, prometheus_text
+from ReplayEnhanced import build_parser, replay
+from synthetic_logs import generate
+
+
+def test_stage_estimates_and_quantiles():
+    st = Stage()
+    for _ in range(90):
+        st.observe(2e-6, 16)
+    for _ in range(10):
+        st.observe(0.02, 16)
+    assert st.count == 1600 and st.sampled == 100
+    assert abs(st.seconds() - (90 * 2e-6 + 10 * 0.02) * 16) < 1e-9
+    assert st.quantile(0.5) == 2.5e-6 and st.quantile(0.99) == 0.025
+    other = Stage()
+    other.observe(1.0)
+    st.merge(other)
+    assert st.count == 1601 and st.max_seconds == 1.0
+
+
+def test_prometheus_text():
+    m = ReplayMetrics()
+    m.stage("detect").observe(3e-6, 16)
+    m.stage("detect").observe(3e-4, 16)
+    m.watch("output_lines", lambda: 7)
+    m.sample_gauges()
+    progress = {"events": 32, "events_per_sec": 10.0, "bytes_read": 100, "fraction": 0.5, "metrics": m.snapshot()}
+    text = prometheus_text([("job-1", progress), ("job-2", None)],
+                           {"replay_jobs": ("Jobs.", {(("state", "running"),): 1})})
+    assert 'replay_stage_items_total{job="job-1",stage="detect"} 32' in text
+    buckets = re.findall(r'replay_stage_latency_seconds_bucket\{job="job-1",stage="detect",le="([^"]+)"\} (\d+)', text)
+    assert len(buckets) == len(BUCKETS) + 1 and buckets[-1] == ("+Inf", "2")
+    assert [int(n) for _le, n in buckets] == sorted(int(n) for _le, n in buckets)
+    assert 'replay_queue_depth{job="job-1",queue="output_lines"} 7' in text
+    assert 'replay_jobs{state="running"} 1' in text and "job-2" not in text
+    for line in text.splitlines():
+        assert line.startswith("#") or re.match(r'^[a-z_]+(\{.*\})? [0-9.e+-]+$', line), line
+
+
+def test_replay_writes_metrics_and_profile(tmp_path):
+    generate(str(tmp_path / "logs"), events=3000, files=2)
+    out = lambda name: str(tmp_path / name)
+    args = build_parser().parse_args([
+        '-p', out('logs/events.log*'), '-c', out('cp.json'), '--no-index', '-o', out('o/out.jsonl'),
+        '--errlog', out('errors.log'), '--debug-json', out('r/debug.json'), '--debug-csv', out('r/debug.csv'),
+        '--html-report', out('r/report.html'), '--summary-json', out('r/summary.json'),
+        '--timeline', out('r/timeline.jsonl'), '--metrics-sample', '4',
+        '--profile', out('r/replay.folded'), '--profile-interval', '0.5'])
+    assert replay(args)["events"] == 3000
+    with open(out('r/summary.json')) as f:
+        summary = json.load(f)
+    stages = summary["metrics"]["stages"]
+    assert stages["decode"]["count"] == stages["read"]["count"] == 3000
+    assert stages["detect"]["count"] == stages["output"]["count"] == 3000
+    assert stages["detect"]["sampled"] == 750 and stages["checkpoint"]["count"] == 30
+    assert "merge" in stages and summary["metrics"]["gauges"]["output_lines"]["max"] >= 0
+    prof = summary["profile"]
+    with open(prof["file"]) as f:
+        lines = f.read().splitlines()
+    assert prof["samples"] > 0 and sum(int(l.rsplit(" ", 1)[1]) for l in lines) == prof["samples"]
+    assert any("replay (ReplayEnhanced.py" in l for l in lines)
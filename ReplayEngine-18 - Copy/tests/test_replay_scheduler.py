@@ -0,0 +1,79 @@
+"""Tests for the drift-free replay scheduler"""
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from replay_scheduler import ReplayScheduler, percentiles
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeClock:
+    """Clock that only moves when slept on or advanced by hand (a tick per read)."""
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        self.now += 1e-6
+        return self.now
+
+    def sleep(self, s):
+        self.sleeps.append(s)
+        self.now += s
+
+
+def _sched(clock, **kw):
+    return ReplayScheduler(clock=clock, sleep=clock.sleep, spin=0.0, **kw)
+
+
+def test_real_time_is_anchored_not_cumulative():
+    clock = FakeClock()
+    s = _sched(clock, real_time=True, speed=2.0)
+    start = clock.now
+    for i in range(10):
+        s.wait(T0 + timedelta(seconds=i))
+        clock.now += 0.1  # processing time does not push the schedule back
+    # 9 seconds of event time at 2x plus the last event's processing
+    assert abs(clock.now - start - 4.6) < 0.01
+
+
+def test_equal_timestamps_are_one_batch():
+    clock = FakeClock()
+    s = _sched(clock, real_time=True)
+    for sec in (0, 1, 1, 1, 2):
+        s.wait(T0 + timedelta(seconds=sec))
+    st = s.stats()
+    assert (st["events"], st["batches"]) == (5, 3)
+    assert len(clock.sleeps) == 2
+
+
+def test_catches_up_after_stall_and_caps_gaps():
+    clock = FakeClock()
+    s = _sched(clock, real_time=True, max_sleep=5.0)
+    s.wait(T0)
+    clock.now += 3.0  # stall
+    for sec in (1, 2, 3):
+        s.wait(T0 + timedelta(seconds=sec))
+    assert clock.sleeps == []  # behind schedule: no waiting until caught up
+    s.wait(T0 + timedelta(seconds=60))  # 57s gap is cut to max_sleep
+    assert abs(clock.sleeps[-1] - 5.0) < 0.01
+    assert s.stats()["capped_gaps"] == 1
+
+
+def test_max_rate_and_max_lag():
+    clock = FakeClock()
+    s = _sched(clock, max_rate=100, max_lag=0.5)
+    start = clock.now
+    for i in range(50):
+        s.wait(T0)
+    assert abs(clock.now - start - 0.49) < 0.01
+    clock.now += 2.0
+    s.wait(T0)
+    assert s.stats()["reanchors"] == 1
+
+
+def test_percentiles():
+    p = percentiles([i / 1000 for i in range(1001)])
+    assert p["p50"] == 0.5 and p["p99"] == 0.99 and p["max"] == 1.0
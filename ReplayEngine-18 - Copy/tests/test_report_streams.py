@@ -0,0 +1,54 @@
+"""Tests for the streamed report writers"""
+import sys
+import os
+import csv
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from report_streams import DebugReportWriter, TimelineWriter, StreamedTimeline
+
+
+def _entries(n):
+    return [{"log_index": i, "file": "a.log", "original": {"message": f"m{i}"}, "issues": [f"[ERROR] x{i}"]}
+            for i in range(n)]
+
+
+def test_debug_report_array_and_csv(tmp_path):
+    jp, cp = str(tmp_path / "r" / "debug.json"), str(tmp_path / "r" / "debug.csv")
+    w = DebugReportWriter(jp, cp, buffer_lines=3)
+    for e in _entries(7):
+        w.write(e)
+    w.close()
+    with open(jp) as f:
+        assert json.load(f) == _entries(7)
+    with open(cp, newline='') as f:
+        rows = list(csv.reader(f))
+    assert len(rows) == 8 and rows[1][3] == "[ERROR] x0"
+
+
+def test_empty_debug_report_is_valid_json(tmp_path):
+    w = DebugReportWriter(str(tmp_path / "d.json"), str(tmp_path / "d.csv"))
+    w.close()
+    with open(tmp_path / "d.json") as f:
+        assert json.load(f) == []
+
+
+def test_jsonl_report_survives_without_close(tmp_path):
+    jp = str(tmp_path / "debug.jsonl")
+    w = DebugReportWriter(jp, str(tmp_path / "d.csv"), buffer_lines=2)
+    for e in _entries(5):
+        w.write(e)
+    # not closed: only the flushed entries are on disk, all of them readable
+    with open(jp) as f:
+        assert [json.loads(line) for line in f] == _entries(4)
+
+
+def test_timeline_is_reiterable(tmp_path):
+    path = str(tmp_path / "timeline.jsonl")
+    w = TimelineWriter(path, buffer_lines=2)
+    for i in range(5):
+        w.write({"x": i, "y": "svc"})
+    w.close()
+    t = w.timeline()
+    assert len(t) == 5
+    assert [e["x"] for e in t] == [e["x"] for e in StreamedTimeline(path)] == list(range(5))
@@ -0,0 +1,59 @@
+"""Tests for the synthetic log generator and the benchmark regression check"""
+import sys
+import os
+import io
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from synthetic_logs import generate
+from external_sort import scan_order
+from ReplayEnhanced import file_iter, merged_stream
+from bench_replay import compare
+
+
+def _read(d):
+    return {n: open(os.path.join(d, n), 'rb').read() for n in sorted(os.listdir(d))}
+
+
+def test_same_seed_same_bytes(tmp_path):
+    a = generate(str(tmp_path / "a"), events=2000, files=3, ts_formats=("iso_z", "epoch_ms", "mixed"), seed=5)
+    generate(str(tmp_path / "b"), events=2000, files=3, ts_formats=("iso_z", "epoch_ms", "mixed"), seed=5)
+    generate(str(tmp_path / "c"), events=2000, files=3, ts_formats=("iso_z", "epoch_ms", "mixed"), seed=6)
+    assert _read(tmp_path / "a") == _read(tmp_path / "b") != _read(tmp_path / "c")
+    assert a["events"] == 2000 and sorted(a["files"]) == ["events.log", "events.log.1", "events.log.2"]
+    # every format parses, and the merged stream is in time order
+    got = list(merged_stream(str(tmp_path / "a" / "events.log*"), {}, io.StringIO()))
+    assert len(got) == 2000
+    assert all(x[0] <= y[0] for x, y in zip(got, got[1:]))
+
+
+def test_shape_knobs(tmp_path):
+    m = generate(str(tmp_path), events=5000, files=2, error_rate=0.1, uncorrelated=0.0, fanout=4,
+                 disorder=0.05, max_lateness=1.0, layout="rotate")
+    recs = [json.loads(l) for n in m["files"] for l in open(tmp_path / n)]
+    assert len(recs) == 5000 and all("correlationId" in r for r in recs)
+    errors = sum(r["level"] == "ERROR" for r in recs)
+    assert errors == m["errors"] and 0.1 * 5000 < errors < 0.3 * 5000   # cascades add to error_rate
+    assert max(sum(1 for r in recs if r["correlationId"] == c) for c in {r["correlationId"] for r in recs}) == 4
+    scan = scan_order(str(tmp_path / "events.log.1"), window=1.0)
+    assert scan["out_of_order"] > 0 and scan["max_lateness_seconds"] <= 1.0
+    # rotate: the oldest slice is the highest suffix
+    first_new = next(file_iter(str(tmp_path / "events.log"), 0, io.StringIO()))[0]
+    last_old = list(file_iter(str(tmp_path / "events.log.1"), 0, io.StringIO()))[-1][0]
+    assert last_old < first_new
+
+
+def test_compare_flags_regressions():
+    base = {"benchmarks": {"a": {"events_per_sec": 1000, "peak_mb": 10.0},
+                           "b": {"events_per_sec": 1000, "peak_mb": 0.5}}}
+    ok = {"benchmarks": {"a": {"events_per_sec": 850, "peak_mb": 12.0}, "b": {"events_per_sec": 990, "peak_mb": 1.2}}}
+    assert compare(ok, base) == []
+    bad = {"benchmarks": {"a": {"events_per_sec": 700, "peak_mb": 14.0}, "new": {"events_per_sec": 1, "peak_mb": 1}}}
+    msgs = compare(bad, base)
+    assert len(msgs) == 2 and all(m.startswith("a: ") for m in msgs)
+    # a drop within the run-to-run spread of either measurement is noise
+    noisy = {"benchmarks": {"a": {"events_per_sec": 700, "peak_mb": 10.0, "spread": 0.35}}}
+    assert compare(noisy, base) == []
+    base["benchmarks"]["a"]["spread"] = 0.4
+    assert compare(bad, base) == ["a: peak 14.0 MB, baseline 10.0 MB"]
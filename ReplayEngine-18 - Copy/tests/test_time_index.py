@@ -0,0 +1,89 @@
+"""Tests for the sparse time index sidecars (TimeIndex)"""
+import sys
+import os
+import io
+import json
+from datetime import datetime, timedelta, timezone
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from time_index import TimeIndex
+from ReplayEnhanced import file_iter
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _lines(start, n):
+    return [json.dumps({"timestamp": (T0 + timedelta(seconds=i)).isoformat(), "n": i}) + "\n"
+            for i in range(start, start + n)]
+
+
+def _index(path, index_dir, every=10):
+    """Load the index and run file_iter over the file so it is built or extended."""
+    idx = TimeIndex.load(path, index_dir, every_records=every)
+    list(file_iter(path, idx.indexed_upto, io.StringIO(), index=idx))
+    return TimeIndex.load(path, index_dir, every_records=every)
+
+
+def test_plan_selects_segments(tmp_path):
+    path = str(tmp_path / "events.log")
+    with open(path, 'w') as f:
+        f.writelines(_lines(0, 100))
+    idx = _index(path, str(tmp_path / "idx"))
+    assert len(idx.ts) == 10 and idx.indexed_upto == os.path.getsize(path)
+    assert idx.plan(0) == [(0, None)]
+    # --start: the last entry before the window
+    seek = idx.offsets[4]
+    assert idx.plan(0, start=T0 + timedelta(seconds=45)) == [(seek, None)]
+    assert idx.plan(seek + 1, start=T0 + timedelta(seconds=45)) == [(seek + 1, None)]   # never backwards
+    # --end: read up to the first entry past it, then only the unindexed tail
+    assert idx.plan(0, end=T0 + timedelta(seconds=35)) == [(0, idx.offsets[4]), (idx.indexed_upto, None)]
+    assert idx.plan(0, T0 + timedelta(seconds=45), T0 + timedelta(seconds=65)) == [(seek, idx.offsets[7]),
+                                                                                  (idx.indexed_upto, None)]
+    assert idx.plan(0, start=T0 + timedelta(hours=1)) == [(idx.offsets[-1], None)]
+    # the segments cover the window, from the entry before it to the entry after it
+    got = [rec["n"] for s, e in idx.plan(0, T0 + timedelta(seconds=45), T0 + timedelta(seconds=65))
+           for _ts, rec, end in file_iter(path, s, io.StringIO()) if e is None or end <= e]
+    assert got == list(range(40, 70))
+
+
+def test_unsorted_file_is_not_used(tmp_path):
+    path = str(tmp_path / "events.log")
+    lines = _lines(0, 50)
+    lines[20], lines[30] = lines[30], lines[20]
+    with open(path, 'w') as f:
+        f.writelines(lines)
+    idx = _index(path, str(tmp_path / "idx"))
+    assert not idx.sorted and idx.plan(0, start=T0 + timedelta(seconds=40)) == [(0, None)]
+
+
+def test_grown_file_extends_the_index(tmp_path):
+    path = str(tmp_path / "events.log")
+    with open(path, 'w') as f:
+        f.writelines(_lines(0, 50))
+    idx = _index(path, str(tmp_path / "idx"))
+    entries, upto = list(idx.offsets), idx.indexed_upto
+    with open(path, 'a') as f:
+        f.writelines(_lines(50, 50))
+    idx = TimeIndex.load(path, str(tmp_path / "idx"), every_records=10)
+    assert not idx.rebuilt and idx.offsets == entries and idx.indexed_upto == upto
+    idx = _index(path, str(tmp_path / "idx"))
+    assert idx.offsets[:len(entries)] == entries and len(idx.offsets) == 10
+    assert idx.indexed_upto == os.path.getsize(path)
+
+
+def test_truncated_or_rewritten_file_gets_a_fresh_index(tmp_path):
+    path = str(tmp_path / "events.log")
+    with open(path, 'w') as f:
+        f.writelines(_lines(0, 50))
+    _index(path, str(tmp_path / "idx"))
+    # truncated: shorter than what was indexed
+    with open(path, 'w') as f:
+        f.writelines(_lines(0, 20))
+    idx = TimeIndex.load(path, str(tmp_path / "idx"))
+    assert idx.rebuilt and idx.ts == [] and idx.indexed_upto == 0
+    # rewritten with other content, longer than before
+    _index(path, str(tmp_path / "idx"))
+    with open(path, 'w') as f:
+        f.writelines(_lines(1000, 60))
+    idx = TimeIndex.load(path, str(tmp_path / "idx"))
+    assert idx.rebuilt and idx.ts == []
@@ -0,0 +1,59 @@
+"""Tests for the format-sniffing timestamp parser"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from datetime import datetime, timezone
+from timestamp_parser import TimestampParser, fallback_parse, parse_any
+
+
+def test_fast_path_matches_dateutil():
+    values = [
+        "2025-10-04T10:00:00Z",
+        "2025-10-04T10:00:00.123456Z",
+        "2025-10-04T12:00:00+02:00",
+        "2025-10-04T10:00:00-0530",
+        "2025-10-04 10:00:00",
+    ]
+    for v in values:
+        assert parse_any(v) == fallback_parse(v), v
+
+
+def test_sniff_locks_format_and_counts_fallbacks():
+    p = TimestampParser(sniff=3)
+    for i in range(10):
+        assert p.parse(f"2025-10-04T10:00:0{i}Z") == datetime(2025, 10, 4, 10, 0, i, tzinfo=timezone.utc)
+    assert p.format == "iso_z"
+    # an outlier in another format still parses, through the fallback
+    assert p.parse("Oct 4 2025 10:00:00 UTC") == datetime(2025, 10, 4, 10, 0, 0, tzinfo=timezone.utc)
+    s = p.stats()
+    assert s["fast_hits"] == 10 and s["fallbacks"] == 1 and s["failures"] == 0
+
+
+def test_epoch_seconds_and_millis():
+    expected = datetime(2023, 10, 4, 10, 0, 0, tzinfo=timezone.utc)
+    assert parse_any(1696413600) == expected
+    assert parse_any("1696413600000") == expected
+    assert parse_any(1696413600.5).microsecond == 500000
+    # a file locked on one unit still reads the other correctly
+    p = TimestampParser(sniff=2)
+    p.parse(1696413600000)
+    p.parse(1696413600000)
+    assert p.parse(1696413600) == expected and p.parse(1696413600000) == expected
+
+
+def test_resniff_after_format_change():
+    p = TimestampParser(sniff=2)
+    p.parse("2025-10-04T10:00:00Z")
+    p.parse("2025-10-04T10:00:01Z")
+    for i in range(4):
+        p.parse(1696413600 + i)
+    assert p.stats()["resniffs"] == 1
+    assert p.format == "epoch_s"
+
+
+def test_bad_values():
+    p = TimestampParser()
+    assert p.parse(None) is None
+    assert p.parse("not a time") is None
+    assert p.stats()["failures"] == 2
@@ -0,0 +1,153 @@
+# app/time_index.py
+"""
+Sparse timestamp -> byte offset index, kept as a sidecar file per log file.
+
+An entry (epoch seconds, line start offset) is recorded every `every_records`
+records or `every_bytes` bytes while a file is replayed. With --start the
+reader seeks straight to the last entry before the window, and with --end it
+jumps over the indexed part of the file that lies after the window.
+
+The sidecar remembers size, mtime and a checksum of the first bytes of the
+file. A file that shrank or whose head changed gets a fresh index; a file that
+only grew keeps its index, which is extended from where it stopped.
+"""
+import bisect
+import hashlib
+import json
+import os
+import sys
+import zlib
+
+INDEX_VERSION = 1
+HEAD_BYTES = 4096
+
+
+def _head_crc(path, n=HEAD_BYTES):
+    with open(path, 'rb') as f:
+        return zlib.crc32(f.read(n))
+
+
+def sidecar_path(index_dir, path):
+    key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(index_dir, f"{key}-{os.path.basename(path)}.tsidx.json")
+
+
+class TimeIndex:
+    def __init__(self, path, index_file, every_records=1000, every_bytes=1 << 20):
+        self.path = path
+        self.index_file = index_file
+        self.every_records = max(1, int(every_records))
+        self.every_bytes = max(1, int(every_bytes))
+        self.ts = []            # epoch seconds, parallel to offsets
+        self.offsets = []
+        self.indexed_upto = 0   # every complete line before this offset has been seen
+        self.sorted = True
+        self.last_ts = None
+        self.rebuilt = False
+        self._since = 0
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path, index_dir, every_records=1000, every_bytes=1 << 20):
+        """Load the sidecar for `path`, or start a new one if it is missing or stale."""
+        idx = cls(path, sidecar_path(index_dir, path), every_records, every_bytes)
+        try:
+            with open(idx.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return idx
+        try:
+            st = os.stat(path)
+            stale = (data.get("version") != INDEX_VERSION
+                     or st.st_size < data["indexed_upto"]
+                     or (st.st_size == data["size"] and st.st_mtime_ns != data["mtime_ns"])
+                     or _head_crc(path, data["head_len"]) != data["head_crc"])
+        except (OSError, KeyError):
+            stale = True
+        if stale:
+            idx.rebuilt = True
+            print(f"[INFO] time index for {path} is stale, rebuilding", file=sys.stderr)
+            return idx
+        idx.ts = [e[0] for e in data["entries"]]
+        idx.offsets = [e[1] for e in data["entries"]]
+        idx.indexed_upto = data["indexed_upto"]
+        idx.sorted = data["sorted"]
+        idx.last_ts = data.get("last_ts")
+        return idx
+
+    def usable(self):
+        return self.sorted and bool(self.ts)
+
+    def plan(self, offset, start=None, end=None):
+        """
+        Byte ranges to read for a replay resuming at `offset` with window [start, end].
+        Returns a list of (from, stop) pairs; stop None means read to EOF.
+        """
+        if not self.usable() or not (start or end):
+            return [(offset, None)]
+        seek = offset
+        if start:
+            i = bisect.bisect_left(self.ts, start.timestamp()) - 1
+            if i >= 0:
+                seek = max(seek, self.offsets[i])
+        if end:
+            j = bisect.bisect_right(self.ts, end.timestamp())
+            if j < len(self.ts):
+                stop = self.offsets[j]
+                # everything from `stop` up to indexed_upto is past the window;
+                # the unindexed tail is still read so it gets indexed too
+                tail = max(self.indexed_upto, seek)
+                if stop > seek:
+                    return [(seek, stop), (tail, None)]
+                return [(tail, None)]
+        return [(seek, None)]
+
+    def begin(self, offset):
+        """True if reading from `offset` continues the index (no gap)."""
+        self._since = 0
+        return offset == self.indexed_upto
+
+    def observe(self, ts, offset):
+        t = ts.timestamp()
+        if self.last_ts is not None and t < self.last_ts:
+            self.sorted = False
+        self.last_ts = t
+        self._since += 1
+        if (not self.offsets or self._since >= self.every_records
+                or offset - self.offsets[-1] >= self.every_bytes):
+            self.ts.append(t)
+            self.offsets.append(offset)
+            self._since = 0
+        self._dirty = True
+
+    def advance(self, offset):
+        """Mark every complete line before `offset` as seen."""
+        if offset > self.indexed_upto:
+            self.indexed_upto = offset
+            self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            st = os.stat(self.path)
+            data = {
+                "version": INDEX_VERSION,
+                "path": self.path,
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "head_len": min(st.st_size, HEAD_BYTES),
+                "head_crc": _head_crc(self.path, min(st.st_size, HEAD_BYTES)),
+                "indexed_upto": self.indexed_upto,
+                "sorted": self.sorted,
+                "last_ts": self.last_ts,
+                "entries": [[t, o] for t, o in zip(self.ts, self.offsets)],
+            }
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            tmp = self.index_file + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp, self.index_file)
+            self._dirty = False
+        except (IOError, OSError) as e:
+            print(f"[ERROR] Failed to save time index for {self.path}: {e}", file=sys.stderr)
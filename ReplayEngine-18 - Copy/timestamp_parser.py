@@ -0,0 +1,208 @@
+# app/timestamp_parser.py
+"""
+Per-file timestamp parsing.
+
+A TimestampParser looks at the first few timestamp values of a file, decides
+which format the file uses (ISO-8601 with Z / offset / no zone, epoch seconds
+or epoch millis) and from then on parses with a dedicated fast function.
+Values the fast function can't handle fall back to dateutil.
+"""
+import re
+from collections import Counter
+from datetime import datetime, timezone
+from dateutil.parser import parse as parse_date
+
+TS_FIELDS = ("time", "timestamp", "@timestamp")
+
+_EPOCH_RE = re.compile(r"^-?\d+(\.\d+)?$")
+_ISO_RE = re.compile(r"^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?$")
+# anything at or above this is treated as milliseconds (year ~5138 in seconds)
+_EPOCH_MS_MIN = 1e11
+
+
+def record_ts_value(rec):
+    """Return the raw timestamp value of a record, same field order file_iter always used."""
+    return rec.get("time") or rec.get("timestamp") or rec.get("@timestamp")
+
+
+def fallback_parse(value):
+    """The original dateutil path. Returns an aware UTC datetime or None."""
+    if not value:
+        return None
+    try:
+        return parse_date(value).astimezone(timezone.utc)
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def _iso_z(value):
+    if value[-1:] == "Z":
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value).astimezone(timezone.utc)
+
+
+def _iso(value):
+    # naive values keep dateutil's behaviour: interpreted as local time
+    return datetime.fromisoformat(value).astimezone(timezone.utc)
+
+
+def _epoch_s(value):
+    v = float(value)
+    if abs(v) >= _EPOCH_MS_MIN:
+        raise ValueError("epoch millis")   # a file that mixes units: let classify() decide
+    return datetime.fromtimestamp(v, tz=timezone.utc)
+
+
+def _epoch_ms(value):
+    v = float(value)
+    if abs(v) < _EPOCH_MS_MIN:
+        raise ValueError("epoch seconds")
+    return datetime.fromtimestamp(v / 1000.0, tz=timezone.utc)
+
+
+FAST_PARSERS = {
+    "iso_z": _iso_z,
+    "iso_offset": _iso,
+    "iso_naive": _iso,
+    "epoch_s": _epoch_s,
+    "epoch_ms": _epoch_ms,
+}
+
+
+def classify(value):
+    """Return the format name of a single timestamp value, or None if unknown."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return "epoch_ms" if abs(value) >= _EPOCH_MS_MIN else "epoch_s"
+    if not isinstance(value, str):
+        return None
+    s = value.strip()
+    if _EPOCH_RE.match(s):
+        return "epoch_ms" if abs(float(s)) >= _EPOCH_MS_MIN else "epoch_s"
+    m = _ISO_RE.match(s)
+    if m:
+        zone = m.group(3)
+        if zone == "Z":
+            return "iso_z"
+        return "iso_offset" if zone else "iso_naive"
+    return None
+
+
+def parse_any(value):
+    """Parse a single value without per-file state (used for --start/--end etc)."""
+    if value is None or value == "":
+        return None
+    fmt = classify(value)
+    if fmt:
+        try:
+            return FAST_PARSERS[fmt](value.strip() if isinstance(value, str) else value)
+        except (ValueError, TypeError, OverflowError, OSError):
+            pass
+    return fallback_parse(value)
+
+
+class TimestampParser:
+    """
+    Format-sniffing parser for the timestamps of one file.
+
+    The first `sniff` values are classified one by one; after that the most
+    common format is locked in. If the locked format keeps missing (a run of
+    `sniff` consecutive fallbacks) the parser re-sniffs, so a source that
+    changes format recovers the fast path.
+    """
+    def __init__(self, sniff=20):
+        self.sniff = max(1, int(sniff))
+        self.format = None
+        self._fast = None
+        self._seen = Counter()
+        self._miss_run = 0
+        self.parsed = 0
+        self.fast_hits = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.resniffs = 0
+
+    def parse(self, value):
+        """Return an aware UTC datetime, or None when the value can't be parsed."""
+        if value is None or value == "":
+            self.failures += 1
+            return None
+        self.parsed += 1
+        fast = self._fast
+        if fast is None:
+            fmt = classify(value)
+            if fmt:
+                self._seen[fmt] += 1
+                if sum(self._seen.values()) >= self.sniff:
+                    self._lock()
+                fast = FAST_PARSERS[fmt]
+        if fast is not None:
+            try:
+                ts = fast(value)
+                self.fast_hits += 1
+                self._miss_run = 0
+                return ts
+            except (ValueError, TypeError, OverflowError, OSError, AttributeError):
+                pass
+        ts = parse_any(value)
+        if ts is None:
+            self.failures += 1
+        else:
+            self.fallbacks += 1
+        if self._fast is not None:
+            self._miss_run += 1
+            if self._miss_run >= self.sniff:
+                self._resniff()
+        return ts
+
+    def parse_record(self, rec):
+        return self.parse(record_ts_value(rec))
+
+    def _lock(self):
+        self.format = self._seen.most_common(1)[0][0]
+        self._fast = FAST_PARSERS[self.format]
+
+    def _resniff(self):
+        self.resniffs += 1
+        self.format = None
+        self._fast = None
+        self._seen.clear()
+        self._miss_run = 0
+
+    def stats(self):
+        return {
+            "format": self.format or (self._seen.most_common(1)[0][0] if self._seen else None),
+            "parsed": self.parsed,
+            "fast_hits": self.fast_hits,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+            "resniffs": self.resniffs,
+            "fast_hit_rate": round(self.fast_hits / self.parsed, 4) if self.parsed else 0.0,
+        }
+
+
+_parsers = {}
+
+
+def parser_for(path, sniff=20):
+    """Cached parser per file path, so the sniffed format survives across iterators."""
+    p = _parsers.get(path)
+    if p is None:
+        p = _parsers[path] = TimestampParser(sniff=sniff)
+    return p
+
+
+def register_parser(path, parser):
+    """Adopt a parser built elsewhere (e.g. in a decode worker) so its stats are reported."""
+    _parsers[path] = parser
+
+
+def parser_stats():
+    """Parse statistics of every file seen in this process, keyed by path."""
+    return {path: p.stats() for path, p in _parsers.items()}
+
+
+def reset_parsers():
+    """Forget all parsers, e.g. between replays run by one long-lived process."""
+    _parsers.clear()